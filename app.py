@@ -1,30 +1,6 @@
 import streamlit as st
-import json
-from main import process_with_gemini, text_to_speech, translate_tamil_to_english
-import google.generativeai as genai
-
-# Configure Gemini
-gemini_api_key = "xxx"
-genai.configure(api_key=gemini_api_key)
-model = genai.GenerativeModel('gemini-1.5-pro')
-
-def parse_medical_report(text):
-    """Parse medical report text into a list of key-value pairs"""
-    try:
-        # Try to parse as JSON first
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # If not JSON, parse as text
-        lines = text.strip().split('\n')
-        report = []
-        for line in lines:
-            if ':' in line:
-                key, value = line.split(':', 1)
-                report.append({
-                    'test': key.strip(),
-                    'value': value.strip()
-                })
-        return report
+# Parsing, Gemini, translation and speech run on the processing server
+from client import get_client
 
 st.title("Medical Report Analysis System")
 
@@ -36,8 +12,12 @@ report_input = st.text_area("Enter medical report (JSON or text format):", heigh
 if st.button("Process Report"):
     if report_input:
         try:
+            client = get_client()
+            if 'session_id' not in st.session_state:
+                st.session_state.session_id = client.create_session()
+            
             # Parse the report
-            medical_report = parse_medical_report(report_input)
+            medical_report = client.upload_report(st.session_state.session_id, report_input)['report']
             
             # Display parsed report
             st.subheader("Parsed Medical Report")
@@ -47,19 +27,26 @@ if st.button("Process Report"):
             question = st.text_input("Ask a question about the report (in Tamil):")
             
             if question:
-                # Translate question to English
-                english_question = translate_tamil_to_english(question)
-                
-                # Process with Gemini
-                response = process_with_gemini(english_question, medical_report)
+                # Translate the question to English and answer it, without speech
+                done = None
+                for event in client.ask(st.session_state.session_id, question, language='ta', speak=False):
+                    if event['type'] == 'error':
+                        raise RuntimeError(event['error'])
+                    if event['type'] == 'done':
+                        done = event
+                response = done['english']
                 
                 # Display response
                 st.subheader("Response")
                 st.write(response)
                 
+                # Where the time went for this question
+                with st.expander("Timing breakdown"):
+                    st.dataframe(done['timing'], use_container_width=True)
+                
                 # Play audio
                 if st.button("Play Response"):
-                    text_to_speech(response)
+                    st.audio(b"".join(client.speak(response)), format="audio/mp3", autoplay=True)
         except Exception as e:
             st.error(f"Error processing report: {str(e)}")
     else:
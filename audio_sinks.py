@@ -0,0 +1,180 @@
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracing
+
+
+class AudioSink:
+    """Destination for MP3 audio that arrives in chunks"""
+
+    def write(self, chunk):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NullSink(AudioSink):
+    """Discard audio, counting the bytes (for tests and benchmarks)"""
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, chunk):
+        self.bytes_written += len(chunk)
+
+
+class BufferSink(AudioSink):
+    """Collect audio in memory"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, chunk):
+        self.buffer.write(chunk)
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+
+class FileSink(AudioSink):
+    """Write audio to a file as it arrives"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def close(self):
+        self._file.close()
+
+
+class StreamlitSink(BufferSink):
+    """Collect audio for the Streamlit player
+
+    Streamlit elements can only be created from the script thread, so call
+    render() there once playback has finished streaming into the sink.
+    """
+
+    def render(self, autoplay=True):
+        import streamlit as st
+        st.audio(self.getvalue(), format="audio/mp3", autoplay=autoplay)
+
+
+class PlayerSink(AudioSink):
+    """Pipe audio into a command-line player that starts playing immediately"""
+
+    def __init__(self, command):
+        self.command = command
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def write(self, chunk):
+        self._process.stdin.write(chunk)
+        self._process.stdin.flush()
+
+    def close(self):
+        self._process.stdin.close()
+        self._process.wait()
+
+
+class FilePlayerSink(AudioSink):
+    """Save audio to a temporary file and play it when complete
+
+    Fallback for players such as macOS afplay that cannot read from a pipe.
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self._file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def close(self):
+        self._file.close()
+        try:
+            subprocess.run(self.command + [self._file.name],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        finally:
+            os.remove(self._file.name)
+
+
+# Players that read MP3 from stdin, in order of preference
+STREAMING_PLAYERS = [
+    ['mpg123', '-q', '-'],
+    ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet', '-'],
+]
+
+
+def speaker_sink():
+    """Sink for the local speaker using the best player on this machine"""
+    for command in STREAMING_PLAYERS:
+        if shutil.which(command[0]):
+            return PlayerSink(command)
+    if sys.platform == 'darwin':
+        return FilePlayerSink(['afplay'])
+    print("No audio player found (install mpg123 or ffmpeg); audio will not be played")
+    return NullSink()
+
+
+class Playback:
+    """Audio streaming into a sink on a background thread
+
+    ttfb is the time until the first audio byte arrived from the source and
+    ttfa the time until it was handed to the sink, both in seconds from start.
+    """
+
+    def __init__(self, chunks, sink):
+        self.sink = sink
+        self.ttfb = None
+        self.ttfa = None
+        self.error = None
+        self._chunks = chunks
+        self._buffer = io.BytesIO()
+        self._start = time.perf_counter()
+        # Spans recorded during playback belong to the caller's trace
+        self._thread = threading.Thread(target=tracing.in_context(self._run), daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        with tracing.span('playback', sink=type(self.sink).__name__) as span:
+            try:
+                for chunk in self._chunks:
+                    if not chunk:
+                        continue
+                    if self.ttfb is None:
+                        self.ttfb = time.perf_counter() - self._start
+                    self._buffer.write(chunk)
+                    self.sink.write(chunk)
+                    if self.ttfa is None:
+                        self.ttfa = time.perf_counter() - self._start
+            except Exception as e:
+                self.error = e
+                span.set(error=repr(e))
+                print(f"Audio playback error: {e}")
+            finally:
+                self.sink.close()
+                span.set(bytes=self._buffer.tell(),
+                         ttfb_ms=round(self.ttfb * 1000, 1) if self.ttfb is not None else None,
+                         ttfa_ms=round(self.ttfa * 1000, 1) if self.ttfa is not None else None)
+
+    def join(self, timeout=None):
+        """Wait for playback to finish; returns the full audio bytes"""
+        self._thread.join(timeout)
+        return self._buffer.getvalue()
+
+    def done(self):
+        return not self._thread.is_alive()
+
+
+def play_stream(chunks, sink=None):
+    """Start playing audio chunks off the main thread and return the Playback"""
+    return Playback(chunks, sink if sink is not None else speaker_sink())
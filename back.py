@@ -1,227 +1,110 @@
-from elevenlabs.client import ElevenLabs
-import os
-import speech_recognition as sr
-from translate import Translator
-import google.generativeai as genai
 import streamlit as st
-import PyPDF2
-import io
-import json
+import hashlib
+import time
+# Speech is captured and played on this machine; everything else runs on the processing server
+from main import listen_tamil, play_audio
+from client import ServerError, get_client
 
-# Get API keys from environment variables
-api_key = os.getenv('ELEVENLABS_API_KEY')
-gemini_api_key = "xxx"
+# Captions for answers that did not need Gemini
+SOURCES = {
+    'cache': "Answered from cache",
+    'speculation': "Answered from a precomputed follow-up",
+    'rules': "Answered from the report's reference ranges",
+    'unavailable': "Gemini could not answer; please ask again",
+    'incomplete': "The answer was cut short; please ask again",
+}
 
-if not api_key:
-    raise ValueError("Please set the ELEVENLABS_API_KEY environment variable")
-if not gemini_api_key:
-    raise ValueError("Please set the GEMINI_API_KEY environment variable")
+def play_in_browser(audio_bytes):
+    """Serve MP3 bytes straight to the browser's audio player"""
+    st.audio(audio_bytes, format="audio/mp3", autoplay=True)
 
-# Initialize ElevenLabs client
-client = ElevenLabs(api_key=api_key)
+def speak(tamil_text):
+    """MP3 bytes for the text, synthesized on the server"""
+    return b"".join(get_client().speak(tamil_text))
 
-# Configure Gemini
-genai.configure(api_key=gemini_api_key)
-model = genai.GenerativeModel('gemini-1.5-pro')
+def get_session():
+    """This browser session's id on the processing server"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = get_client().create_session()
+    return st.session_state.session_id
 
-def listen_tamil():
-    """Listen to Tamil speech and convert to text"""
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening for Tamil speech...")
-        audio = recognizer.listen(source)
-    
-    try:
-        # Using Google's speech recognition with Tamil language
-        tamil_text = recognizer.recognize_google(audio, language='ta-IN')
-        print(f"Recognized Tamil text: {tamil_text}")
-        return tamil_text
-    except sr.UnknownValueError:
-        print("Could not understand audio")
-        return None
-    except sr.RequestError as e:
-        print(f"Could not request results; {e}")
-        return None
+def forget_session():
+    """Start over with a new server session, e.g. after the server dropped this one"""
+    for key in ('session_id', 'report_hash', 'medical_report'):
+        st.session_state.pop(key, None)
 
-def translate_tamil_to_english(tamil_text):
-    """Translate Tamil text to English while preserving numbers"""
-    # Extract numbers from the text
-    import re
-    numbers = re.findall(r'\d+\.?\d*', tamil_text)
-    
-    # Replace numbers with placeholders
-    for i, num in enumerate(numbers):
-        tamil_text = tamil_text.replace(num, f'__NUM_{i}__')
-    
-    # Split text into chunks of 400 characters (leaving room for placeholders)
-    chunk_size = 400
-    chunks = [tamil_text[i:i+chunk_size] for i in range(0, len(tamil_text), chunk_size)]
-    
-    # Translate each chunk
-    translator = Translator(to_lang="en", from_lang="ta")
-    translated_chunks = []
-    for chunk in chunks:
-        try:
-            # Clean up the chunk before translation
-            chunk = chunk.strip()
-            if not chunk:
-                continue
-                
-            translation = translator.translate(chunk)
-            # Clean up the translation
-            translation = translation.strip()
-            translated_chunks.append(translation)
-        except Exception as e:
-            print(f"Translation error: {e}")
-            translated_chunks.append(chunk)  # Keep original if translation fails
-    
-    # Join translated chunks with proper spacing
-    translation = ' '.join(filter(None, translated_chunks))
-    
-    # Restore numbers
-    for i, num in enumerate(numbers):
-        translation = translation.replace(f'__NUM_{i}__', num)
-    
-    # Clean up any double spaces
-    translation = re.sub(r'\s+', ' ', translation)
-    
-    return translation.strip()
+def answer(question, stream_mode, language='en'):
+    """Ask the server and show the answer while it streams in
 
-def translate_english_to_tamil(english_text):
-    """Translate English text to Tamil while preserving numbers"""
-    # Extract numbers from the text
-    import re
-    numbers = re.findall(r'\d+\.?\d*', english_text)
-    
-    # Replace numbers with placeholders
-    for i, num in enumerate(numbers):
-        english_text = english_text.replace(num, f'__NUM_{i}__')
-    
-    # Split text into chunks of 400 characters (leaving room for placeholders)
-    chunk_size = 400
-    chunks = [english_text[i:i+chunk_size] for i in range(0, len(english_text), chunk_size)]
-    
-    # Translate each chunk
-    translator = Translator(to_lang="ta", from_lang="en")
-    translated_chunks = []
-    for chunk in chunks:
-        try:
-            # Clean up the chunk before translation
-            chunk = chunk.strip()
-            if not chunk:
-                continue
-                
-            translation = translator.translate(chunk)
-            # Clean up the translation
-            translation = translation.strip()
-            translated_chunks.append(translation)
-        except Exception as e:
-            print(f"Translation error: {e}")
-            translated_chunks.append(chunk)  # Keep original if translation fails
-    
-    # Join translated chunks with proper spacing
-    translation = ' '.join(filter(None, translated_chunks))
-    
-    # Restore numbers
-    for i, num in enumerate(numbers):
-        translation = translation.replace(f'__NUM_{i}__', num)
-    
-    # Clean up any double spaces
-    translation = re.sub(r'\s+', ' ', translation)
-    
-    return translation.strip()
-
-def process_with_gemini(english_text, medical_report, conversation_history=None):
-    """Process medical report with Gemini model"""
-    # Prepare the conversation history
-    history_text = ""
-    if conversation_history:
-        history_text = "\nPrevious conversation:\n" + "\n".join(conversation_history)
-    
-    prompt = f"""You are a medical assistant. Analyze the medical report and respond to the user's question in Tamil.
-
-    User's question: {english_text}
-    {history_text}
-    
-    Requirements:
-    1. Respond only if the question relates to the medical report
-    2. Keep the response under 500 words
-    3. Use simple, non-medical language
-    4. Focus on answering the specific question
-    5. Avoid greetings, signatures, and repetitive headers
-    6. respond in tamil
-    
-    Medical Report:
-    {medical_report}
+    The text appears sentence by sentence. In stream mode each sentence is
+    spoken as soon as its audio arrives; otherwise the whole answer plays in
+    the browser once it is complete. Returns the server's 'done' event, or
+    None if the question could not be answered.
     """
-    
+    placeholder = st.empty()
+    spoken = []
+    audio_parts = []
+    done = None
+    started = time.perf_counter()
+    ttfa = None
     try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"Error processing with Gemini: {e}")
-        return english_text  # Fallback to original text if there's an error
-
-def text_to_speech(tamil_text):
-    """Convert Tamil text to speech using ElevenLabs"""
-    audio = client.generate(
-        text=tamil_text,
-        voice="Kathiravan - Social Media Voice - Youthful & Pleasant",
-        model="eleven_multilingual_v2",
-        voice_settings={
-            "stability": 0.5,
-            "similarity_boost": 0.75
-        }
-    )
-    
-    # Save audio to file
-    with open("output.mp3", "wb") as f:
-        for chunk in audio:
-            f.write(chunk)
-    print("Audio saved as output.mp3")
+        with st.spinner('Answering...'):
+            for event in get_client().ask(get_session(), question, language):
+                if event['type'] == 'question':
+                    st.write(f"Your question: {event['english']}")
+                elif event['type'] == 'text':
+                    spoken.append(event['tamil'])
+                    placeholder.write(f"Answer: {' '.join(spoken)}")
+                elif event['type'] == 'audio':
+                    if ttfa is None:
+                        ttfa = time.perf_counter() - started
+                    audio_parts.append(event['data'])
+                    if stream_mode:
+                        play_audio(event['data'])
+                elif event['type'] == 'error':
+                    st.error(f"Error answering the question: {event['error']}")
+                elif event['type'] == 'done':
+                    done = event
+    except ServerError as e:
+        if e.status == 404:
+            forget_session()
+            st.error("The session expired. Please upload the report again.")
+        elif e.status == 503:
+            st.error("The server is busy. Please try again in a moment.")
+        else:
+            st.error(f"Error answering the question: {e}")
+        return None
     
-    # Play the generated audio
-    print("Playing audio...")
-    os.system("afplay output.mp3")  # Using afplay for macOS
+    if audio_parts and not stream_mode:
+        play_in_browser(b"".join(audio_parts))
+    if done is not None:
+        if done['source'] in SOURCES:
+            st.caption(SOURCES[done['source']])
+        elif ttfa is not None:
+            st.caption(f"Time to first audio: {ttfa:.2f}s")
+        remember(done)
+    return done
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_file.read()))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+def pdf_fingerprint(uploaded_file):
+    """Content hash of an upload, computed once per uploaded file"""
+    hashes = st.session_state.setdefault('pdf_hashes', {})
+    file_id = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    if file_id not in hashes:
+        hashes[file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return hashes[file_id]
 
-def parse_medical_report(text):
-    """Parse medical report text into a list of key-value pairs"""
-    # Split text into lines
-    lines = text.strip().split('\n')
-    report = []
-    
-    for line in lines:
-        # Look for patterns like "Test: Value" or "Test - Value"
-        if ':' in line or '-' in line:
-            separator = ':' if ':' in line else '-'
-            parts = line.split(separator, 1)
-            if len(parts) == 2:
-                test = parts[0].strip()
-                value = parts[1].strip()
-                
-                # Extract reference range if present
-                reference = None
-                if '(' in value and ')' in value:
-                    ref_start = value.find('(')
-                    ref_end = value.find(')')
-                    reference = value[ref_start+1:ref_end]
-                    value = value[:ref_start].strip()
-                
-                report.append({
-                    'test': test,
-                    'value': value,
-                    'reference': reference
-                })
-    
-    return report
+def load_medical_report(uploaded_file):
+    """Send a PDF to the server once per content hash; reruns reuse the parsed rows
+
+    The server keeps parsed reports by content hash too, so a report uploaded
+    again later is not re-extracted.
+    """
+    pdf_hash = pdf_fingerprint(uploaded_file)
+    if st.session_state.get('report_hash') != pdf_hash:
+        uploaded = get_client().upload_report(get_session(), uploaded_file.getvalue(), 'application/pdf')
+        st.session_state.medical_report = uploaded['report']
+        st.session_state.report_hash = pdf_hash
+    return st.session_state.medical_report
 
 def get_medical_report():
     """Get the medical report from the user using Streamlit file upload"""
@@ -230,11 +113,8 @@ def get_medical_report():
     
     if uploaded_file is not None:
         try:
-            # Extract text from PDF
-            pdf_text = extract_text_from_pdf(uploaded_file)
-            
-            # Parse the medical report
-            medical_report = parse_medical_report(pdf_text)
+            # Extract and parse the PDF on the server, or reuse the result for the same file
+            medical_report = load_medical_report(uploaded_file)
             
             # Show success message without displaying the data
             st.success("Medical report successfully processed!")
@@ -248,18 +128,85 @@ def get_medical_report():
         st.info("Please upload a PDF file containing the medical report")
         return None
 
+def remember(done):
+    """Show the prompt size a turn used; the server keeps the conversation history
+
+    With SPECULATE=1 on the server the likely next questions start being
+    answered in the background while this answer plays.
+    """
+    st.session_state.setdefault('prompt_sizes', []).append(done['prompt_tokens'])
+    st.caption(f"Prompt size: {done['prompt_tokens']} tokens "
+               f"(question and history: {done['question_tokens']} tokens)")
+
+def show_partial_transcript():
+    """Callback showing the words heard so far in one placeholder"""
+    placeholder = st.empty()
+    return lambda text: placeholder.caption(f"Hearing: {text}")
+
+def show_timing(done):
+    """Per-request timing breakdown from the server in an expandable panel"""
+    if done is not None:
+        with st.expander("Timing breakdown"):
+            st.dataframe(done['timing'], use_container_width=True)
+
+def show_server_stats():
+    """Local answers, precomputed follow-ups and p50/p95/p99 per stage on the server"""
+    try:
+        stats = get_client().stats()
+    except (ServerError, OSError):
+        return
+    
+    # How often questions were answered without calling Gemini
+    rule_stats = stats['rules']
+    if rule_stats['questions']:
+        st.sidebar.caption(
+            f"Answered locally: {rule_stats['hits']}/{rule_stats['questions']} questions "
+            f"({rule_stats['hit_rate']:.0%}), about {rule_stats['seconds_saved']:.1f}s saved"
+        )
+    
+    # How often a follow-up had already been answered in the background
+    speculation = stats['speculation']
+    if speculation['lookups']:
+        st.sidebar.caption(
+            f"Precomputed follow-ups used: {speculation['hits']}/{speculation['lookups']} questions "
+            f"({speculation['hit_rate']:.0%}), {speculation['calls']} speculative answers"
+        )
+    
+    st.sidebar.caption(f"Server: {stats['sessions']} sessions, {stats['jobs']['running']} questions running, "
+                       f"{stats['jobs']['waiting']} waiting")
+    if stats['latency']:
+        with st.sidebar.expander("Stage latency (p50 / p95 / p99)"):
+            st.dataframe([
+                {'stage': stage, 'count': row['count'], 'p50_ms': round(row['p50'] * 1000),
+                 'p95_ms': round(row['p95'] * 1000), 'p99_ms': round(row['p99'] * 1000)}
+                for stage, row in stats['latency'].items()
+            ], use_container_width=True)
+
+def voice_question(prompt, stream_mode):
+    """Listen for a Tamil question and answer it on the server"""
+    st.write(prompt)
+    
+    with st.spinner('Listening for speech...'):
+        # Listen to Tamil speech, showing partial transcripts
+        tamil_text = listen_tamil(on_partial=show_partial_transcript())
+        if not tamil_text:
+            st.error("Could not understand the speech. Please try again.")
+            return None
+    
+    # Translate, answer, translate back and speak, all on the server
+    return answer(tamil_text, stream_mode, language='ta')
+
 def main():
     # Initialize Streamlit
     st.title("Medical Report Analysis System")
     
-    # Initialize session state for conversation history
-    if 'conversation_history' not in st.session_state:
-        st.session_state.conversation_history = []
-    
     # Get the medical report
     medical_report = get_medical_report()
     
     if medical_report:
+        # Speak each sentence as soon as it is ready instead of the whole answer at the end
+        stream_mode = st.checkbox("Speak answers while they are being generated")
+        
         # Create two columns for input methods
         col1, col2 = st.columns(2)
         
@@ -268,105 +215,44 @@ def main():
             # Text input for English questions
             english_question = st.text_input("Enter your question in English:")
             if english_question:
-                with st.spinner('Processing your question...'):
-                    # Process the English question
-                    processed_english = process_with_gemini(english_question, medical_report, st.session_state.conversation_history)
-                    
-                    with st.spinner('Translating response...'):
-                        # Translate response to Tamil
-                        tamil_response = translate_english_to_tamil(processed_english)
-                        st.write(f"Answer: {tamil_response}")
-                        
-                        with st.spinner('Converting to speech...'):
-                            # Convert to speech
-                            text_to_speech(tamil_response)
-                            
-                            # Store the conversation in history
-                            st.session_state.conversation_history.append(f"Q: {english_question}")
-                            st.session_state.conversation_history.append(f"A: {processed_english}")
-                            
-                            # Add a button to replay the answer
-                            if st.button("Replay Answer"):
-                                with st.spinner('Converting to speech...'):
-                                    text_to_speech(tamil_response)
+                # Answer the English question
+                done = answer(english_question, stream_mode)
+                show_timing(done)
+                
+                # Add a button to replay the answer
+                if done is not None and st.button("Replay Answer"):
+                    with st.spinner('Converting to speech...'):
+                        play_in_browser(speak(done['tamil']))
         
         with col2:
             st.subheader("Voice Input")
             # Add a button for voice interaction
             if st.button("Interact"):
-                st.write("Listening... Please speak your question in Tamil")
-                
-                with st.spinner('Listening for speech...'):
-                    # Step 1: Listen to Tamil speech
-                    tamil_text = listen_tamil()
-                    if not tamil_text:
-                        st.error("Could not understand the speech. Please try again.")
-                        return
-                
-                with st.spinner('Translating speech to text...'):
-                    # Step 2: Translate Tamil to English
-                    english_text = translate_tamil_to_english(tamil_text)
-                    st.write(f"Your question: {english_text}")
-                
-                with st.spinner('Processing with AI...'):
-                    # Step 3: Process with Gemini
-                    processed_english = process_with_gemini(english_text, medical_report, st.session_state.conversation_history)
+                done = voice_question("Listening... Please speak your question in Tamil", stream_mode)
+                show_timing(done)
                 
-                with st.spinner('Translating response...'):
-                    # Step 4: Translate back to Tamil
-                    final_tamil = translate_english_to_tamil(processed_english)
-                    st.write(f"Answer: {final_tamil}")
-                
-                with st.spinner('Converting to speech...'):
-                    # Step 5: Convert to speech
-                    text_to_speech(final_tamil)
-                    
-                    # Store the conversation in history
-                    st.session_state.conversation_history.append(f"Q: {english_text}")
-                    st.session_state.conversation_history.append(f"A: {processed_english}")
-                    
-                    # Add a button to replay the answer
-                    if st.button("Replay Voice Answer"):
-                        with st.spinner('Converting to speech...'):
-                            text_to_speech(final_tamil)
+                # Add a button to replay the answer
+                if done is not None and st.button("Replay Voice Answer"):
+                    with st.spinner('Converting to speech...'):
+                        play_in_browser(speak(done['tamil']))
+        
+        show_server_stats()
+        
+        # Prompt size per turn should stay flat as the conversation grows
+        if st.session_state.get('prompt_sizes'):
+            with st.expander("Prompt size per turn"):
+                st.line_chart(st.session_state.prompt_sizes)
         
         # Add a button for follow-up question
         if st.button("Ask Follow-up Question"):
-            st.write("Listening... Please speak your follow-up question in Tamil")
-            
-            with st.spinner('Listening for speech...'):
-                # Listen for follow-up question
-                followup_tamil = listen_tamil()
-                if not followup_tamil:
-                    st.error("Could not understand the speech. Please try again.")
-                    return
-            
-            with st.spinner('Translating speech to text...'):
-                # Translate follow-up question
-                followup_english = translate_tamil_to_english(followup_tamil)
-                st.write(f"Your follow-up question: {followup_english}")
-            
-            with st.spinner('Processing with AI...'):
-                # Process follow-up with conversation history
-                followup_response = process_with_gemini(followup_english, medical_report, st.session_state.conversation_history)
-            
-            with st.spinner('Translating response...'):
-                # Translate response
-                followup_tamil_response = translate_english_to_tamil(followup_response)
-                st.write(f"Answer: {followup_tamil_response}")
+            # The server answers the follow-up with this session's conversation history
+            done = voice_question("Listening... Please speak your follow-up question in Tamil", stream_mode)
+            show_timing(done)
             
-            with st.spinner('Converting to speech...'):
-                # Convert to speech
-                text_to_speech(followup_tamil_response)
-                
-                # Store the follow-up in history
-                st.session_state.conversation_history.append(f"Q: {followup_english}")
-                st.session_state.conversation_history.append(f"A: {followup_response}")
-                
-                # Add a button to replay the follow-up answer
-                if st.button("Replay Follow-up Answer"):
-                    with st.spinner('Converting to speech...'):
-                        text_to_speech(followup_tamil_response)
+            # Add a button to replay the follow-up answer
+            if done is not None and st.button("Replay Follow-up Answer"):
+                with st.spinner('Converting to speech...'):
+                    play_in_browser(speak(done['tamil']))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pdf_text import iter_pdf_pages
+from report_parser import parse_medical_report
+from lab_results import LabReport
+from rules import RuleEngine
+from services import Services
+
+# Simple range questions are answered from the report without Gemini
+rule_engine = RuleEngine()
+
+# Asked about every report when no question file is given
+DEFAULT_QUESTIONS = [
+    "Which results are outside the normal range?",
+    "Explain the abnormal results in simple language.",
+    "What lifestyle changes would help with these results?",
+]
+
+
+class RateLimiter:
+    """Spaces calls shared by all workers to at most per_minute calls a minute"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def load_items(path):
+    """Reports to process: every PDF in a directory, or one per line of a JSONL file
+
+    JSONL lines may hold a 'pdf' path, a parsed 'report' (rows or text), or
+    report text under 'text' or 'body'; 'id' (or 'request_id') names the
+    line and an optional 'questions' list replaces the question set.
+    """
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith('.pdf'):
+                yield {'id': name, 'pdf': os.path.join(path, name)}
+        return
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item['id'] = str(item.get('id') or item.get('request_id') or number)
+            if 'pdf' in item and not os.path.isabs(item['pdf']):
+                item['pdf'] = os.path.join(os.path.dirname(path), item['pdf'])
+            yield item
+
+
+def load_questions(path):
+    """One question per line, or a JSON list of questions"""
+    if not path:
+        return DEFAULT_QUESTIONS
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def read_checkpoint(output_path):
+    """Ids already written to the output without an error"""
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut off by an interrupted run
+                if 'error' not in record:
+                    done.add(record['id'])
+    return done
+
+
+def read_report(item):
+    """Parsed report rows for an item"""
+    if 'pdf' in item:
+        with open(item['pdf'], 'rb') as f:
+            text = "\n".join(iter_pdf_pages(f.read()))
+    elif 'report' in item:
+        if not isinstance(item['report'], str):
+            return item['report']
+        text = item['report']
+    else:
+        text = item.get('text') or item.get('body') or ''
+    return parse_medical_report(text)
+
+
+async def answer(question, report, services, limiter, audio_path=None):
+    """English and Tamil answer (and optionally audio) for one question"""
+    local = rule_engine.answer(question, report)
+    if local is not None:
+        english, tamil = local
+    else:
+        await limiter.acquire()
+        english = await services.ask_async(question, report)
+        tamil = await services.translate_async(english, 'en', 'ta')
+    result = {'question': question, 'english': english, 'tamil': tamil, 'local': local is not None}
+    if audio_path:
+        audio = await services.synthesize_async(tamil)
+        with open(audio_path, 'wb') as f:
+            f.write(audio)
+        result['audio'] = audio_path
+    return result
+
+
+async def process_item(item, questions, services, limiter, audio_dir=None):
+    """Extract, parse and answer every question about one report"""
+    started = time.perf_counter()
+    report = await asyncio.to_thread(read_report, item)
+    if not report:
+        raise ValueError("no results found in the report")
+    questions = item.get('questions') or questions
+    answers = await asyncio.gather(*[
+        answer(question, report, services, limiter,
+               os.path.join(audio_dir, f"{item['id']}-{i + 1}.mp3") if audio_dir else None)
+        for i, question in enumerate(questions)
+    ])
+    rows = [row for row in report if isinstance(row, dict)]
+    return {
+        'id': item['id'],
+        'rows': len(report),
+        'abnormal': [result.test for result in LabReport.from_dicts(rows).abnormal()],
+        'answers': answers,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+async def run_batch(items, questions, output_path, services, workers=4, per_minute=60, audio_dir=None):
+    """Process items on a bounded pool of workers, appending one JSONL record per report
+
+    Reports already in the output are skipped, so an interrupted run resumes
+    where it stopped. Returns the number of reports processed, failed and
+    skipped, and the throughput in reports per minute.
+    """
+    done = read_checkpoint(output_path)
+    queue = asyncio.Queue(maxsize=workers * 2)
+    limiter = RateLimiter(per_minute)
+    write_lock = asyncio.Lock()
+    counts = {'processed': 0, 'failed': 0, 'skipped': 0}
+    if audio_dir:
+        os.makedirs(audio_dir, exist_ok=True)
+
+    async def worker(output):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            try:
+                record = await process_item(item, questions, services, limiter, audio_dir)
+                counts['processed'] += 1
+            except Exception as e:
+                record = {'id': item['id'], 'error': repr(e)}
+                counts['failed'] += 1
+            async with write_lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                # Flushed per report so the checkpoint survives an interruption
+                output.flush()
+            status = f"error: {record['error']}" if 'error' in record else f"{record['seconds']:.1f}s"
+            print(f"[{counts['processed'] + counts['failed']}] {item['id']} {status}")
+
+    started = time.perf_counter()
+    with open(output_path, 'a', encoding='utf-8') as output:
+        tasks = [asyncio.create_task(worker(output)) for _ in range(workers)]
+        for item in items:
+            if item['id'] in done:
+                counts['skipped'] += 1
+                continue
+            await queue.put(item)
+        for _ in tasks:
+            await queue.put(None)
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    finished = counts['processed'] + counts['failed']
+    counts['seconds'] = elapsed
+    counts['reports_per_minute'] = finished / elapsed * 60 if elapsed else 0.0
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a question set about many medical reports offline")
+    parser.add_argument('input', help="directory of PDF reports or a JSONL file of reports")
+    parser.add_argument('-q', '--questions', help="file with one question per line (or a JSON list)")
+    parser.add_argument('-o', '--output', default='batch_results.jsonl', help="JSONL output, also the checkpoint")
+    parser.add_argument('-w', '--workers', type=int, default=4, help="reports processed concurrently")
+    parser.add_argument('--rate', type=float, default=60, help="Gemini calls per minute across all workers (0: unlimited)")
+    parser.add_argument('--tts', metavar='DIR', help="also synthesize Tamil audio into DIR")
+    parser.add_argument('--mock', action='store_true', help="use offline fake services")
+    parser.add_argument('--mock-latency', type=float, default=0.2, help="seconds per fake remote call")
+    args = parser.parse_args(argv)
+
+    if args.mock:
+        # A throwaway cache directory, so fake translations, speech and answers
+        # never reach the shared cache; the caches open on first use, after this
+        os.environ['HEALTHASSIST_CACHE_DIR'] = tempfile.mkdtemp(prefix='healthassist-mock-')
+    services = Services.fake(args.mock_latency) if args.mock else Services.live()
+
+    counts = asyncio.run(run_batch(
+        load_items(args.input), load_questions(args.questions), args.output, services,
+        workers=args.workers, per_minute=args.rate, audio_dir=args.tts,
+    ))
+    print(f"Processed {counts['processed']}, failed {counts['failed']}, skipped {counts['skipped']} "
+          f"in {counts['seconds']:.1f}s ({counts['reports_per_minute']:.1f} reports/min)")
+    return 0 if not counts['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
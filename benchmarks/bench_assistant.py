@@ -0,0 +1,331 @@
+"""End-to-end latency, throughput and memory of the assistant, fully offline
+
+Drives main.main() (blocking and --stream), the back.py Streamlit app and
+the app.py script with Tamil/English question fixtures against synthetic
+reports of several sizes, then N concurrent voice sessions. Speech
+recognition, translation, Gemini and ElevenLabs are replaced by the
+deterministic fakes in fakes.py, each with a seeded latency and jitter,
+and the Streamlit apps run against FakeStreamlit, as clients of a server
+started in-process. Reports p50/p95/p99 per traced stage, questions per second and the memory high-water mark per
+scenario. Run from the repository root:
+python benchmarks/bench_assistant.py [--save-baseline FILE] [--baseline FILE]
+
+With --baseline the exit status is 1 when a stage, the throughput or the
+peak memory of any scenario is more than --threshold worse than the saved
+run.
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import runpy
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Caches start empty and are thrown away with the run
+os.environ['HEALTHASSIST_CACHE_DIR'] = tempfile.mkdtemp(prefix='healthassist-bench-')
+os.environ.setdefault('REPORT_DISK_CACHE', '0')
+
+from fakes import FakeListener, FakeStreamlit
+
+# The apps import streamlit at module level
+sys.modules['streamlit'] = FakeStreamlit()
+
+import audio_sinks
+import back
+import main
+import server
+import tracing
+from audio_sinks import NullSink
+from response_cache import ResponseCache
+from services import Services, set_services
+
+# Test names, reference ranges and typical values the synthetic reports draw from
+PANEL = [
+    ('TOTAL CHOLESTEROL', '< 200 mg/dL', 120, 300),
+    ('LDL CHOLESTEROL - DIRECT', '< 100 mg/dL', 60, 200),
+    ('HDL CHOLESTEROL - DIRECT', '40-60 mg/dL', 25, 75),
+    ('TRIGLYCERIDES', '< 150 mg/dL', 70, 260),
+    ('NON-HDL CHOLESTEROL', '< 160 mg/dL', 90, 230),
+    ('HIGH SENSITIVITY C-REACTIVE PROTEIN (HS-CRP)', '< 3 mg/L', 0.2, 6),
+    ('HOMOCYSTEINE', '<15 µmol/L', 6, 22),
+    ('25-OH VITAMIN D (TOTAL)', '30-100 ng/mL', 12, 80),
+    ('VITAMIN B12', '211-911 pg/mL', 150, 1100),
+    ('FASTING BLOOD GLUCOSE', '70-100 mg/dL', 65, 160),
+    ('HBA1C', '4-5.6 %', 4.5, 8.5),
+    ('HEMOGLOBIN', '13-17 g/dL', 10, 18),
+    ('PLATELET COUNT', '150-410 10^3/µL', 120, 450),
+    ('ERYTHROCYTE SEDIMENTATION RATE (ESR)', '0 - 15 mm/hr', 2, 40),
+    ('SERUM CREATININE', '0.7-1.3 mg/dL', 0.5, 1.9),
+    ('BLOOD UREA NITROGEN (BUN)', '7.94 - 20.07 mg/dL', 5, 28),
+    ('URIC ACID', '3.5-7.2 mg/dL', 2.5, 9.5),
+    ('ASPARTATE AMINOTRANSFERASE (SGOT )', '< 35 U/L', 15, 70),
+    ('ALANINE TRANSAMINASE (SGPT)', '< 45 U/L', 12, 90),
+    ('SERUM GLOBULIN', '2.5-3.4 gm/dL', 2.1, 4.0),
+    ('TSH', '0.55-4.78 µIU/mL', 0.3, 7.5),
+    ('SERUM IRON', '65-175 µg/dL', 40, 210),
+]
+
+# Spoken Tamil questions (voice fixtures) and typed English ones, mixing
+# questions the rule engine answers with ones that need Gemini
+TAMIL_QUESTIONS = [
+    "என் கொலஸ்ட்ரால் அதிகமாக உள்ளதா?",
+    "நான் என்ன சாப்பிட வேண்டும்?",
+    "என் சர்க்கரை அளவு சரியா?",
+    "இது ஆபத்தானதா?",
+    "என் சிறுநீரகம் எப்படி இருக்கிறது?",
+    "நான் மருத்துவரை பார்க்க வேண்டுமா?",
+]
+ENGLISH_QUESTIONS = [
+    "Is my LDL cholesterol normal?",
+    "What should I eat to reduce my cholesterol?",
+    "Why is my vitamin D low?",
+    "Which results are abnormal?",
+    "How can I improve my kidney function?",
+    "Is my hemoglobin okay?",
+]
+
+
+def synthetic_report(rows, seed=0):
+    """A report with the given number of rows; panels repeat as later visits beyond the first"""
+    rng = random.Random(seed)
+    report = []
+    while len(report) < rows:
+        visit = len(report) // len(PANEL)
+        for test, reference, low, high in PANEL[:rows - len(report)]:
+            name = test if not visit else f"{test} - VISIT {visit + 1}"
+            report.append({'test': name, 'value': f"{rng.uniform(low, high):.2f}", 'reference': reference})
+    return report
+
+
+def fake_reply(prompt):
+    """A short answer that differs per prompt, so translation and speech are not all cache hits"""
+    note = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:6]
+    return (f"I reviewed these results (ref {note}). Some values are outside the reference range. "
+            "Regular exercise and a balanced diet help. Please discuss them with your doctor.")
+
+
+class Run:
+    """Shared state for one benchmark run: settings, the current report and the fakes"""
+
+    def __init__(self, args):
+        self.args = args
+        self.report = synthetic_report(20)
+        options = dict(latency=args.latency, jitter=args.jitter, seed=args.seed)
+        self.listener = FakeListener(TAMIL_QUESTIONS, **options)
+        set_services(Services.fake(reply=fake_reply, **options))
+        # Speakers, report loading and listening are the parts swapped out
+        audio_sinks.speaker_sink = NullSink
+        main.speaker_sink = NullSink
+        main.listen_tamil = back.listen_tamil = self.listener
+        main.get_medical_report = lambda: self.report
+        back.get_medical_report = self.upload_report
+
+    def upload_report(self):
+        """back.get_medical_report: the current report, sent once to the app session's server session"""
+        state = back.st.session_state
+        if state.get('medical_report') is not self.report:
+            back.get_client().upload_report(back.get_session(), json.dumps(self.report), 'application/json')
+            state.medical_report = self.report
+        return self.report
+
+    def fresh_caches(self):
+        """Start each scenario without answers cached by earlier ones"""
+        main.response_cache = server.response_cache = ResponseCache()
+
+
+def run_main(run, questions, stream):
+    for _ in range(questions):
+        main.main(stream=stream)
+    return questions
+
+
+def run_back(run, questions):
+    st = FakeStreamlit()
+    sys.modules['streamlit'] = back.st = st
+    for i in range(questions):
+        # Alternate typed English questions with the voice button; each is one script rerun
+        if i % 2:
+            st.inputs, st.buttons = {}, {"Interact"}
+        else:
+            question = ENGLISH_QUESTIONS[i % len(ENGLISH_QUESTIONS)]
+            st.inputs, st.buttons = {"Enter your question in English:": question}, set()
+        back.main()
+    return questions
+
+
+def run_app(run, questions):
+    for i in range(questions):
+        sys.modules['streamlit'] = FakeStreamlit(
+            inputs={
+                "Enter medical report (JSON or text format):": json.dumps(run.report, ensure_ascii=False),
+                "Ask a question about the report (in Tamil):": TAMIL_QUESTIONS[i % len(TAMIL_QUESTIONS)],
+            },
+            buttons={"Process Report", "Play Response"},
+        )
+        runpy.run_path(os.path.join(ROOT, 'app.py'))
+    return questions
+
+
+def run_sessions(run, sessions, questions):
+    """sessions voice sessions at once, each with its own report"""
+    errors = []
+
+    def session(number):
+        report = synthetic_report(run.args.sizes[0], seed=number)
+        try:
+            for _ in range(questions):
+                with tracing.trace('session_question'):
+                    english = main.translate_tamil_to_english(run.listener())
+                    main.answer_question(english, report, sink=NullSink())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return sessions * questions
+
+
+def measure(run, scenario, *args):
+    """Run a scenario with empty caches and metrics; its timings, throughput and peak memory"""
+    run.fresh_caches()
+    tracing.metrics.clear()
+    tracemalloc.reset_peak()
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if run.args.verbose else output):
+        questions = scenario(run, *args)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    return {
+        'questions': questions,
+        'seconds': round(seconds, 3),
+        'throughput': round(questions / seconds, 3),
+        'peak_mb': round(peak / 2 ** 20, 2),
+        'stages': {stage: {key: row[key] for key in ('count', 'errors', 'p50', 'p95', 'p99')}
+                   for stage, row in tracing.metrics.percentiles().items()},
+    }
+
+
+def print_result(name, result):
+    print(f"\n{name}: {result['questions']} questions in {result['seconds']:.2f}s, "
+          f"{result['throughput']:.2f} questions/s, peak {result['peak_mb']:.1f} MB")
+    print(f"  {'stage':<18} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for stage, row in result['stages'].items():
+        print(f"  {stage:<18} {row['count']:>6} {row['p50'] * 1000:>6.1f}ms "
+              f"{row['p95'] * 1000:>6.1f}ms {row['p99'] * 1000:>6.1f}ms")
+
+
+def compare(results, baseline, threshold, slack_ms):
+    """Regressions against a saved run, as printable lines
+
+    A stage regresses when its p50 or p95 grew by more than threshold and by
+    more than slack_ms; throughput when it fell by more than threshold; peak
+    memory when it grew by more than threshold and by more than a megabyte.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        if result['throughput'] < before['throughput'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput']:.2f} -> {result['throughput']:.2f} q/s")
+        if result['peak_mb'] > max(before['peak_mb'] * (1 + threshold), before['peak_mb'] + 1):
+            regressions.append(f"{name}: peak memory {before['peak_mb']:.1f} -> {result['peak_mb']:.1f} MB")
+        for stage, row in result['stages'].items():
+            old = before['stages'].get(stage)
+            if old is None:
+                continue
+            for key in ('p50', 'p95'):
+                if row[key] > old[key] * (1 + threshold) and (row[key] - old[key]) * 1000 > slack_ms:
+                    regressions.append(f"{name}: {stage} {key} {old[key] * 1000:.1f} -> {row[key] * 1000:.1f}ms")
+    return regressions
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process, where the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=lambda text: [int(n) for n in text.split(',')], default=[20, 80, 200],
+                        help="report sizes in rows (default 20,80,200)")
+    parser.add_argument('--questions', type=int, default=4, help="questions per scenario (default 4)")
+    parser.add_argument('--sessions', type=lambda text: [int(n) for n in text.split(',')], default=[1, 4, 16],
+                        help="concurrent session counts (default 1,4,16)")
+    parser.add_argument('--latency', type=float, default=0.05, help="fake latency per remote call in seconds")
+    parser.add_argument('--jitter', type=float, default=0.01, help="fake latency jitter in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help="compare against this saved run")
+    parser.add_argument('--save-baseline', help="save this run here")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown (default 0.2 = 20%%)")
+    parser.add_argument('--slack-ms', type=float, default=2.0,
+                        help="ignore stage slowdowns smaller than this (default 2ms)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the apps' own output")
+    return parser.parse_args(argv)
+
+
+def main_benchmark(argv=None):
+    args = parse_args(argv)
+    run = Run(args)
+    tracemalloc.start()
+    results = {}
+    for size in args.sizes:
+        run.report = synthetic_report(size, seed=args.seed)
+        results[f"main/{size}"] = measure(run, run_main, args.questions, False)
+        results[f"main-stream/{size}"] = measure(run, run_main, args.questions, True)
+        results[f"back/{size}"] = measure(run, run_back, args.questions)
+        results[f"app/{size}"] = measure(run, run_app, args.questions)
+    for sessions in args.sessions:
+        results[f"sessions/{sessions}"] = measure(run, run_sessions, sessions, args.questions)
+    tracemalloc.stop()
+
+    for name, result in results.items():
+        print_result(name, result)
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"\nProcess peak RSS: {rss:.1f} MB")
+
+    settings = {key: getattr(args, key) for key in ('sizes', 'questions', 'sessions', 'latency', 'jitter', 'seed')}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'scenarios': results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print("Warning: the baseline was recorded with different settings")
+        regressions = compare(results, baseline, args.threshold, args.slack_ms)
+        if regressions:
+            print(f"\nRegressions against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
@@ -0,0 +1,83 @@
+"""Time from the end of speech to the transcript, with and without streaming recognition
+
+Plays a synthetic utterance from a WAV file in real time through
+CaptureSession with a FakeRecognizer (fixed round trip plus a cost per
+second of audio). "record first" only recognizes once the endpoint is
+confirmed, like recognizer.listen() followed by recognize_google();
+"streaming" starts recognizing as soon as speech pauses and shows partial
+transcripts. Also checks that a failed request is retried. Run from the
+repository root:
+python benchmarks/bench_capture.py
+"""
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeRecognizer
+from speech_capture import CaptureSession, WavSource
+
+SAMPLE_RATE = 16000
+LEADING_SILENCE = 0.6
+SPEECH = 1.8
+TRAILING_SILENCE = 1.2
+TRANSCRIPT = "என் கொலஸ்ட்ரால் அதிகமாக உள்ளதா"
+
+
+def write_utterance(path, seed=0):
+    """Background noise, then syllable-like tone bursts, then noise again"""
+    rng = random.Random(seed)
+    samples = []
+    for i in range(int(LEADING_SILENCE * SAMPLE_RATE)):
+        samples.append(rng.randint(-80, 80))
+    for i in range(int(SPEECH * SAMPLE_RATE)):
+        # 250 ms syllables with a short dip between them
+        envelope = 0.15 if (i % 4000) > 3600 else 1.0
+        samples.append(int(6000 * envelope * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)) + rng.randint(-80, 80))
+    for i in range(int(TRAILING_SILENCE * SAMPLE_RATE)):
+        samples.append(rng.randint(-80, 80))
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(struct.pack(f'<{len(samples)}h', *samples))
+
+
+def run(path, **recognizer_options):
+    """Seconds from the end of speech to the transcript, the partials shown and the text"""
+    partials = []
+    session = CaptureSession(lambda: WavSource(path, realtime=True),
+                             lambda: FakeRecognizer(TRANSCRIPT, latency=0.4, per_second=0.1, **recognizer_options))
+    started = time.perf_counter()
+    text = session.listen(on_partial=partials.append)
+    return time.perf_counter() - started - LEADING_SILENCE - SPEECH, partials, text
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'utterance.wav')
+    write_utterance(path)
+    scenarios = [
+        ("record first", dict(partial_interval=0, pause=60.0)),
+        ("streaming", {}),
+        ("retried", dict(partial_interval=0, failures=1, backoff=0.1)),
+    ]
+    for label, options in scenarios:
+        # The capture session's own progress messages are left out
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            after_speech, partials, text = run(path, **options)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        print(f"{label:<14} transcript {after_speech * 1000:>5.0f}ms after speech ended, "
+              f"{len(partials)} partials, correct: {text == TRANSCRIPT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Chunking throughput on long answers: fixed 400-char slicing vs sentence packing
+
+Run from the repository root: python benchmarks/bench_chunking.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import PLACEHOLDER, chunk_text
+
+SENTENCES = [
+    "Your LDL cholesterol is __NUM_{}__ mg/dL, which is above the normal limit.",
+    "HDL, the good cholesterol, is low at __NUM_{}__ mg/dL.",
+    "உங்கள் கொலஸ்ட்ரால் அளவு __NUM_{}__ ஆக உள்ளது.",
+    "Eat more vegetables and fruits, and reduce fried food.",
+    "உடற்பயிற்சி தினமும் செய்யுங்கள்!",
+    "Is your vitamin D level of __NUM_{}__ ng/mL enough? It is just inside the range.",
+    "Please talk to your doctor about these results.",
+]
+
+
+def make_answer(words, seed):
+    """Synthetic answer of roughly the given number of words"""
+    rng = random.Random(seed)
+    parts = []
+    count = 0
+    index = 0
+    while count < words:
+        sentence = rng.choice(SENTENCES).format(index)
+        index += 1
+        parts.append(sentence)
+        count += len(sentence.split())
+    return ' '.join(parts)
+
+
+def fixed_slices(text, chunk_size=400):
+    """The previous chunker: fixed-width slicing"""
+    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def broken_placeholders(chunks):
+    """Count placeholders that did not survive chunking intact"""
+    expected = sum(len(PLACEHOLDER.findall(chunk)) for chunk in chunks)
+    partial = sum(len(re.findall(r'__NUM_\d*_?$|^_?\d*__', chunk)) for chunk in chunks)
+    return partial, expected
+
+
+def bench(name, chunker, answers, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        results = [chunker(answer) for answer in answers]
+    elapsed = time.perf_counter() - started
+    total_chars = sum(len(answer) for answer in answers) * repeat
+    chunks = sum(len(result) for result in results)
+    broken = sum(broken_placeholders(result)[0] for result in results)
+    print(f"{name:<16} {total_chars / elapsed / 1e6:8.2f} MB/s  "
+          f"{chunks:6d} chunks  {broken:4d} split placeholders")
+
+
+def main():
+    for words in (500, 2000, 8000):
+        answers = [make_answer(words, seed) for seed in range(50)]
+        print(f"\n50 answers of ~{words} words")
+        bench("fixed slicing", fixed_slices, answers)
+        bench("sentence packing", chunk_text, answers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Report parser benchmark over a corpus of synthetic multi-page lab reports
+
+Compares the original line-by-line parser with report_parser.parse_report on
+throughput and on how many rows match the known ground truth.
+Run from the repository root: python benchmarks/bench_parser.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_parser import parse_report
+
+# (test, unit, low, high) in the style of the sample report in main.py
+TESTS = [
+    ('HDL CHOLESTEROL - DIRECT', 'mg/dL', 40, 60),
+    ('LDL CHOLESTEROL - DIRECT', 'mg/dL', None, 100),
+    ('TOTAL CHOLESTEROL', 'mg/dL', None, 200),
+    ('TRIGLYCERIDES', 'mg/dL', None, 150),
+    ('25-OH VITAMIN D (TOTAL)', 'ng/mL', 30, 100),
+    ('PLATELET DISTRIBUTION WIDTH(PDW)', 'fL', 9.6, 15.2),
+    ('SERUM GLOBULIN', 'gm/dL', 2.5, 3.4),
+    ('BLOOD UREA NITROGEN (BUN)', 'mg/dL', 7.94, 20.07),
+    ('HOMOCYSTEINE', 'µmol/L', None, 15),
+    ('HAEMOGLOBIN', 'g/dL', 13, 17),
+]
+
+HEADER = """CITY DIAGNOSTICS LABORATORY
+Patient Name : Mr. Kumar        Age : 52 Years       Sex : Male
+Sample Collected : 12-03-2024 08:15     Reported : 12-03-2024 14:20
+Page {page} of {pages}
+TEST NAME                    RESULT    UNITS    REFERENCE RANGE
+"""
+
+
+def reference_text(low, high):
+    return f"{low}-{high}" if low is not None else f"< {high}"
+
+
+def make_row(rng, test, unit, low, high):
+    value = round(rng.uniform((low or 0) * 0.6, high * 1.4), 2)
+    reference = reference_text(low, high)
+    layout = rng.randrange(4)
+    if layout == 0:
+        line = f"{test}: {value} ({reference} {unit})"
+    elif layout == 1:
+        line = f"{test}    {value}    {unit}    {reference}"
+    elif layout == 2:
+        line = f"{test} {value} {reference} {unit}"
+    else:
+        # Summary tables as in MR Report.pdf print the unit first
+        line = f"{unit} {value} {test} {reference}"
+    return line, (test, str(value))
+
+
+def make_report(pages, seed):
+    """Synthetic report text and its ground truth (test, value) pairs"""
+    rng = random.Random(seed)
+    lines, truth = [], []
+    for page in range(1, pages + 1):
+        lines.append(HEADER.format(page=page, pages=pages))
+        for _ in range(25):
+            line, expected = make_row(rng, *rng.choice(TESTS))
+            lines.append(line)
+            truth.append(expected)
+    return '\n'.join(lines), truth
+
+
+def original_parser(text):
+    """The line-by-line parser previously in back.py"""
+    lines = text.strip().split('\n')
+    report = []
+    for line in lines:
+        if ':' in line or '-' in line:
+            separator = ':' if ':' in line else '-'
+            parts = line.split(separator, 1)
+            if len(parts) == 2:
+                test = parts[0].strip()
+                value = parts[1].strip()
+                reference = None
+                if '(' in value and ')' in value:
+                    ref_start = value.find('(')
+                    ref_end = value.find(')')
+                    reference = value[ref_start+1:ref_end]
+                    value = value[:ref_start].strip()
+                report.append({'test': test, 'value': value, 'reference': reference})
+    return report
+
+
+def bench(name, parser, corpus):
+    started = time.perf_counter()
+    results = [parser(text) for text, _ in corpus]
+    elapsed = time.perf_counter() - started
+    size = sum(len(text) for text, _ in corpus)
+    rows = sum(len(result) for result in results)
+    expected = sum(len(truth) for _, truth in corpus)
+    correct = 0
+    for (_, truth), result in zip(corpus, results):
+        truth = set(truth)
+        correct += sum((row['test'], row['value']) in truth for row in result)
+    print(f"{name:<20} {size / elapsed / 1e6:6.2f} MB/s  {rows:7d} rows  "
+          f"{correct}/{expected} correct  {rows - correct} noisy")
+
+
+def main():
+    for pages in (1, 10, 80):
+        corpus = [make_report(pages, seed) for seed in range(20)]
+        print(f"\n20 reports of {pages} pages")
+        bench("original parser", original_parser, corpus)
+        bench("report_parser", parse_report, corpus)
+
+
+if __name__ == "__main__":
+    main()
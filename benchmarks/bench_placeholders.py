@@ -0,0 +1,63 @@
+"""Number protection micro-benchmark: per-number str.replace vs single-pass re.sub
+
+Run from the repository root: python benchmarks/bench_placeholders.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from placeholders import protect_numbers, restore_numbers
+
+# Rows in the style of the sample report in main.get_medical_report
+ROWS = [
+    "LDL CHOLESTEROL - DIRECT 176 (< 100 mg/dL)",
+    "HDL CHOLESTEROL - DIRECT 35 (40-60 mg/dL)",
+    "PLATELET DISTRIBUTION WIDTH(PDW) 9.9 (9.6-15.2 fL)",
+    "BUN / SR.CREATININE RATIO 8.15 (9:1-23:1 Ratio)",
+    "ERYTHROCYTE SEDIMENTATION RATE (ESR) 28 (0 - 15 mm/hr)",
+    "25-OH VITAMIN D (TOTAL) 30.5 (30-100 ng/mL)",
+    "TOTAL CHOLESTEROL 250 (< 200 mg/dL)",
+    "HOMOCYSTEINE 14.38 (<15 µmol/L)",
+]
+
+
+def make_report(rows):
+    return '\n'.join(ROWS[i % len(ROWS)] for i in range(rows))
+
+
+def old_protect(text):
+    numbers = re.findall(r'\d+\.?\d*', text)
+    for i, num in enumerate(numbers):
+        text = text.replace(num, f'__NUM_{i}__')
+    return text, numbers
+
+
+def old_restore(text, numbers):
+    for i, num in enumerate(numbers):
+        text = text.replace(f'__NUM_{i}__', num)
+    return text
+
+
+def round_trip(protect, restore, text):
+    protected, numbers = protect(text)
+    return restore(protected, numbers)
+
+
+def main():
+    for rows in (20, 100, 500):
+        text = make_report(rows)
+        number = max(1, 2000 // rows)
+        old = timeit.timeit(lambda: round_trip(old_protect, old_restore, text), number=number) / number
+        new = timeit.timeit(lambda: round_trip(protect_numbers, restore_numbers, text), number=number) / number
+        old_ok = round_trip(old_protect, old_restore, text) == text
+        new_ok = round_trip(protect_numbers, restore_numbers, text) == text
+        print(f"{rows:4d} rows  replace loop {old * 1e3:8.3f} ms (round trip ok: {old_ok})  "
+              f"single pass {new * 1e3:8.3f} ms (round trip ok: {new_ok})  "
+              f"speedup {old / new:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
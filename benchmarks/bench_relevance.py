@@ -0,0 +1,90 @@
+"""Prompt tokens per question with and without relevance filtering
+
+Sends every question through PrefixCache with the FakeGenai mock, once with
+the whole report inline and once with only the relevant and abnormal rows,
+and checks the rows each question needs are among those selected.
+Run from the repository root:
+python benchmarks/bench_relevance.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeGenai
+from prompts import PrefixCache
+from report_index import ReportIndex
+
+NORMAL_PANEL = [
+    ('HAEMOGLOBIN', '14.1', '13-17 g/dL'),
+    ('TOTAL LEUCOCYTE COUNT', '7.2', '4-10 10^3/µL'),
+    ('PLATELET COUNT', '250', '150-410 10^3/µL'),
+    ('RED BLOOD CELL COUNT', '5.1', '4.5-5.5 mill/cu.mm'),
+    ('HEMATOCRIT', '44', '40-50 %'),
+    ('MEAN CORPUSCULAR VOLUME (MCV)', '88', '83-101 fL'),
+    ('FASTING BLOOD GLUCOSE', '92', '70-100 mg/dL'),
+    ('SERUM CREATININE', '0.9', '0.7-1.3 mg/dL'),
+    ('URIC ACID', '5.6', '3.5-7.2 mg/dL'),
+    ('SERUM CALCIUM', '9.4', '8.6-10.3 mg/dL'),
+    ('SERUM SODIUM', '139', '136-145 mmol/L'),
+    ('SERUM POTASSIUM', '4.2', '3.5-5.1 mmol/L'),
+    ('SERUM CHLORIDE', '102', '98-107 mmol/L'),
+    ('TOTAL BILIRUBIN', '0.8', '0.3-1.2 mg/dL'),
+    ('ALANINE TRANSAMINASE (SGPT)', '28', '< 45 U/L'),
+    ('SERUM ALBUMIN', '4.3', '3.5-5.2 gm/dL'),
+    ('THYROID STIMULATING HORMONE (TSH)', '2.1', '0.4-4.2 µIU/mL'),
+    ('VITAMIN B12', '410', '211-911 pg/mL'),
+    ('SERUM IRON', '95', '65-175 µg/dL'),
+    ('TOTAL CHOLESTEROL', '186', '< 200 mg/dL'),
+    ('HDL CHOLESTEROL - DIRECT', '48', '40-60 mg/dL'),
+    ('LDL CHOLESTEROL - DIRECT', '96', '< 100 mg/dL'),
+]
+ABNORMAL_PANEL = [
+    ('TRIGLYCERIDES', '182', '< 150 mg/dL'),
+    ('25-OH VITAMIN D (TOTAL)', '18.5', '30-100 ng/mL'),
+    ('ASPARTATE AMINOTRANSFERASE (SGOT )', '41', '< 35 U/L'),
+]
+REPORT = [{'test': test, 'value': value, 'reference': reference}
+          for test, value, reference in NORMAL_PANEL + ABNORMAL_PANEL]
+
+# Question, and words one of the selected test names must contain
+QUESTIONS = [
+    ("Is my cholesterol high?", ['CHOLESTEROL']),
+    ("என் கொலஸ்ட்ரால் அளவு சரியா?", ['CHOLESTEROL']),
+    ("How are my kidneys doing?", ['CREATININE']),
+    ("Is my sugar under control?", ['GLUCOSE']),
+    ("What does my liver test say?", ['BILIRUBIN', 'SGPT']),
+    ("Is my thyroid normal?", ['TSH']),
+    ("Why is my haemoglobin like this?", ['HAEMOGLOBIN']),
+]
+
+
+def run(report_rows_for, label):
+    genai = FakeGenai(min_cache_tokens=10 ** 9)
+    cache = PrefixCache(genai)
+    for question, _ in QUESTIONS:
+        cache.generate_content(REPORT, question, report_rows=report_rows_for(question))
+    total = genai.tokens_sent()
+    print(f"{label:<20} tokens per call {[call['tokens_sent'] for call in genai.calls]}  total {total}")
+    return total
+
+
+def main():
+    index = ReportIndex(REPORT)
+    print(f"Report rows: {len(REPORT)}")
+    baseline = run(lambda question: None, "whole report")
+    filtered = run(lambda question: index.select(question), "relevant rows")
+    print(f"Token reduction: {1 - filtered / baseline:.0%}")
+
+    found = 0
+    for question, needed in QUESTIONS:
+        rows = index.select(question) or REPORT
+        tests = [row['test'] for row in rows]
+        ok = all(any(word in test for test in tests) for word in needed)
+        found += ok
+        print(f"  {'ok  ' if ok else 'MISS'} {len(rows):>2} rows  {question}")
+    print(f"Needed rows selected for {found}/{len(QUESTIONS)} questions")
+
+
+if __name__ == "__main__":
+    main()
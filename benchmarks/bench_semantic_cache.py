@@ -0,0 +1,103 @@
+"""Paraphrase matching quality and speed of the question index
+
+Counts how many paraphrases of past questions are matched (and would skip
+Gemini) and how many different questions are wrongly matched, then times
+insertion and search with a full template and checks that the index
+reloads from disk. Run from the repository root:
+python benchmarks/bench_semantic_cache.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import SQLiteCache
+from question_index import QuestionIndex
+from response_cache import normalize_question
+
+PAST = [
+    "Is my cholesterol high?",
+    "What should I eat?",
+    "Is my LDL cholesterol high?",
+    "Is my HDL low?",
+    "Is it dangerous?",
+    "How can I reduce my sugar?",
+    "What does my vitamin D result mean?",
+    "Should I see a doctor?",
+    "Is my LDL/HDL ratio ok?",
+    "Is my vitamin B12 low?",
+]
+# Asked later, with the past question that should answer them (None: must not match)
+LATER = [
+    ("Is my cholesterol too high?", "Is my cholesterol high?"),
+    ("is my cholesterol very high", "Is my cholesterol high?"),
+    ("What food should I eat?", "What should I eat?"),
+    ("Is this dangerous?", "Is it dangerous?"),
+    ("Is it dangerous for me?", "Is it dangerous?"),
+    ("Is my LDL cholesterol really high?", "Is my LDL cholesterol high?"),
+    ("How do I reduce my sugar?", "How can I reduce my sugar?"),
+    ("Should I see the doctor?", "Should I see a doctor?"),
+    ("Is my LDL / HDL ratio ok?", "Is my LDL/HDL ratio ok?"),
+    ("Is my vitamin B12 too low?", "Is my vitamin B12 low?"),
+    ("Is my cholesterol low?", None),
+    ("Is my HDL high?", None),
+    ("Is my LDL low?", None),
+    ("What should I not eat?", None),
+    ("Is my sugar high?", None),
+    ("Why is my vitamin D low?", None),
+    # Near misses: the same words about another test
+    ("is my hdl/ldl ratio ok", None),
+    ("Is my non HDL low?", None),
+    ("Is my non-HDL low?", None),
+    ("Is my vitamin B6 low?", None),
+]
+
+
+def main():
+    index = QuestionIndex()
+    for question in PAST:
+        index.add('template', normalize_question(question))
+    matched = wrong = missed = 0
+    for question, expected in LATER:
+        found = index.search('template', normalize_question(question), k=1)
+        found = found[0][0] if found else None
+        expected = normalize_question(expected) if expected else None
+        if found == expected and expected is not None:
+            matched += 1
+        elif found is not None:
+            wrong += 1
+            print(f"  wrong match: {question!r} -> {found!r}")
+        elif expected is not None:
+            missed += 1
+            print(f"  missed: {question!r}")
+    paraphrases = sum(1 for _, expected in LATER if expected)
+    print(f"paraphrases matched {matched}/{paraphrases}, wrong matches {wrong}, missed {missed}")
+
+    # Speed with a full template
+    index = QuestionIndex()
+    questions = [f"question number {i} about test {i % 37} and result {i % 11}" for i in range(256)]
+    started = time.perf_counter()
+    for question in questions:
+        index.add('template', question)
+    insert_ms = (time.perf_counter() - started) * 1000 / len(questions)
+    started = time.perf_counter()
+    for question in questions[:100]:
+        index.search('template', question + " please")
+    search_ms = (time.perf_counter() - started) * 1000 / 100
+    print(f"256 questions: insert {insert_ms:.2f}ms, search {search_ms:.2f}ms per question")
+
+    # Persistence
+    path = os.path.join(tempfile.mkdtemp(), 'questions.sqlite3')
+    saved = QuestionIndex(SQLiteCache(path))
+    for question in PAST:
+        saved.add('template', normalize_question(question))
+    reloaded = QuestionIndex(SQLiteCache(path))
+    same = all(saved.search('template', q) == reloaded.search('template', q) for q, _ in LATER)
+    print(f"reloaded from disk: {len(reloaded.search('template', 'what food should i eat'))} match, "
+          f"same results: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""How many concurrent sessions one server node sustains, with fake backends
+
+Starts the processing server in-process with Services.fake() (a fixed
+latency plus jitter per remote call) and runs N client sessions at once for
+--duration seconds per level. Each session uploads its own report, then
+asks a question, reads the streamed text and audio, waits --think seconds
+(listening to the answer and speaking the next question) and asks again.
+Reports time to first text and first audio, questions per second and 503s
+per level, and the most sessions whose p95 time to first audio stays within
+--slo with no failures. Finishes with one question over the WebSocket
+endpoint. Run from the repository root:
+python benchmarks/bench_server.py [--levels 8 16 32 64 128] [--backend-concurrency 16]
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['HEALTHASSIST_CACHE_DIR'] = tempfile.mkdtemp(prefix='healthassist-bench-')
+os.environ.setdefault('REPORT_DISK_CACHE', '0')
+
+QUESTIONS = [
+    "Explain my cholesterol results in simple words.",
+    "What food should I eat?",
+    "What lifestyle changes would help with these results?",
+    "Should I see a doctor about my liver test?",
+]
+
+
+# Numbers every answer, so no sentence is translated or spoken from a cache
+_answers = itertools.count()
+
+
+def reply(prompt):
+    """A three-sentence answer that differs on every call"""
+    n = next(_answers)
+    return (f"Your results were reviewed (answer {n}). Some values are outside the reference range ({n}). "
+            f"Please discuss them with your doctor ({n}).")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_level(url, report, sessions, duration, think, seed):
+    """Run sessions clients until duration has passed; per-question timings and failure counts"""
+    from client import AssistantClient, ServerError
+    timings = []
+    counts = {'busy': 0, 'failed': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def session(number):
+        rng = random.Random(seed * 1000 + number)
+        client = AssistantClient(url)
+        try:
+            session_id = client.create_session()
+            # Each session's report differs, so answers are never shared between sessions
+            rows = report + [{'test': f'SESSION MARKER {sessions}-{number}', 'value': '1', 'reference': '0-2'}]
+            client.upload_report(session_id, json.dumps(rows), 'application/json')
+        except (ServerError, OSError) as e:
+            with lock:
+                counts['busy' if getattr(e, 'status', None) == 503 else 'failed'] += 1
+            return
+        # Users do not all start talking at the same moment
+        time.sleep(rng.uniform(0, think))
+        turn = 0
+        while time.perf_counter() < deadline:
+            question = QUESTIONS[(number + turn) % len(QUESTIONS)]
+            started = time.perf_counter()
+            first_text = first_audio = None
+            try:
+                for event in client.ask(session_id, question):
+                    now = time.perf_counter() - started
+                    if event['type'] == 'text' and first_text is None:
+                        first_text = now
+                    elif event['type'] == 'audio' and first_audio is None:
+                        first_audio = now
+                    elif event['type'] == 'error':
+                        raise ServerError(500, event['error'])
+            except ServerError as e:
+                with lock:
+                    counts['busy' if e.status == 503 else 'failed'] += 1
+                time.sleep(1.0)
+                continue
+            except OSError:
+                with lock:
+                    counts['failed'] += 1
+                time.sleep(1.0)
+                continue
+            with lock:
+                timings.append((first_text, first_audio, time.perf_counter() - started))
+            turn += 1
+            time.sleep(think * rng.uniform(0.75, 1.25))
+        client.end_session(session_id)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, counts, time.perf_counter() - started
+
+
+async def ask_over_websocket(url, session_id, question):
+    """Text events and audio bytes received for one question over the WebSocket endpoint"""
+    from server import OP_BINARY, OP_TEXT, read_frame, write_frame
+    address = urlsplit(url)
+    reader, writer = await asyncio.open_connection(address.hostname, address.port)
+    key = base64.b64encode(os.urandom(16)).decode('ascii')
+    writer.write((f"GET /sessions/{session_id}/ws HTTP/1.1\r\nHost: {address.netloc}\r\nUpgrade: websocket\r\n"
+                  f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n")
+                 .encode('latin-1'))
+    await reader.readuntil(b"\r\n\r\n")
+    write_frame(writer, OP_TEXT, json.dumps({'question': question}).encode('utf-8'), mask=True)
+    events, audio = [], 0
+    while True:
+        opcode, payload = await read_frame(reader)
+        if opcode == OP_BINARY:
+            audio += len(payload)
+        elif opcode == OP_TEXT:
+            events.append(json.loads(payload))
+            if events[-1]['type'] in ('done', 'error'):
+                break
+    writer.close()
+    return events, audio
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', type=int, nargs='+', default=[8, 16, 32, 64, 128],
+                        help="concurrent sessions to try, in order")
+    parser.add_argument('--duration', type=float, default=8.0, help="seconds per level")
+    parser.add_argument('--think', type=float, default=2.0, help="seconds between a session's questions")
+    parser.add_argument('--latency', type=float, default=0.1, help="seconds per fake remote call")
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--slo', type=float, default=1.0, help="p95 time to first audio to sustain, in seconds")
+    parser.add_argument('--workers', type=int, default=None, help="server worker threads (default SERVER_WORKERS)")
+    parser.add_argument('--backend-concurrency', type=int, default=None,
+                        help="requests in flight per fake backend (default: the services' own limits)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Backend pool sizes are read when the services are created
+    if args.backend_concurrency:
+        for name in ('GEMINI', 'TRANSLATOR', 'TTS'):
+            os.environ[f'{name}_CONCURRENCY'] = str(args.backend_concurrency)
+    import main as assistant
+    import tracing
+    from server import WORKERS, start_in_thread
+    from services import Services, get_services, set_services
+
+    set_services(Services.fake(args.latency, reply=reply, jitter=args.jitter, seed=args.seed))
+    workers = args.workers or WORKERS
+    with contextlib.redirect_stdout(io.StringIO()):
+        server, url = start_in_thread(workers=workers)
+    report = assistant.get_medical_report()
+    limits = {name: backend.concurrency for name, backend in
+              (('gemini', get_services().gemini), ('translator', get_services().translator),
+               ('tts', get_services().speech))}
+    print(f"{workers} server workers, backend concurrency {limits}, {args.latency * 1000:.0f}ms per call, "
+          f"{args.think:.1f}s between questions")
+    print(f"{'sessions':>8} {'questions':>9} {'q/s':>6} {'text p50':>9} {'audio p50':>9} {'audio p95':>9} "
+          f"{'total p95':>9} {'queue p95':>9} {'503s':>5} {'failed':>6}")
+
+    sustained = 0
+    for sessions in args.levels:
+        tracing.metrics.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            timings, counts, seconds = run_level(url, report, sessions, args.duration, args.think, args.seed)
+        first_text = [t for t, _, _ in timings if t is not None]
+        first_audio = [a for _, a, _ in timings if a is not None]
+        totals = [total for _, _, total in timings]
+        queue = tracing.metrics.percentiles().get('queue_wait')
+
+        def ms(value):
+            return f"{value * 1000:>7.0f}ms" if value is not None else f"{'-':>9}"
+
+        print(f"{sessions:>8} {len(timings):>9} {len(timings) / seconds:>6.1f} "
+              f"{ms(statistics.median(first_text) if first_text else None)} "
+              f"{ms(statistics.median(first_audio) if first_audio else None)} "
+              f"{ms(percentile(first_audio, 0.95))} {ms(percentile(totals, 0.95))} "
+              f"{ms(queue['p95'] if queue else None)} {counts['busy']:>5} {counts['failed']:>6}")
+        p95 = percentile(first_audio, 0.95)
+        if p95 is not None and p95 <= args.slo and not counts['busy'] and not counts['failed']:
+            sustained = sessions
+        else:
+            break
+
+    print(f"\nOne node sustains {sustained} concurrent sessions "
+          f"(p95 time to first audio within {args.slo:.1f}s, no 503s or failures)")
+    slowest = sorted(tracing.metrics.percentiles().items(), key=lambda item: -item[1]['p95'])[:4]
+    print("Slowest stages at the last level: " +
+          ", ".join(f"{stage} p95 {row['p95'] * 1000:.0f}ms" for stage, row in slowest))
+
+    # The WebSocket endpoint carries the same answers, with audio as binary messages
+    from client import AssistantClient
+    client = AssistantClient(url)
+    session_id = client.create_session()
+    client.upload_report(session_id, json.dumps(report), 'application/json')
+    with contextlib.redirect_stdout(io.StringIO()):
+        events, audio = asyncio.run(ask_over_websocket(url, session_id, QUESTIONS[0]))
+    sentences = sum(1 for event in events if event['type'] == 'text')
+    print(f"WebSocket: {sentences} sentences, {audio} audio bytes, ended with '{events[-1]['type']}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Follow-up latency with and without speculative answers, and the speculation hit rate
+
+Each session asks a first question about a report with abnormal results,
+listens to the answer for LISTEN seconds, then asks a follow-up worded the
+way users word them. With speculation on, likely follow-ups are answered
+while the first answer plays. Uses Services.fake() with a fixed latency
+per remote call. Run from the repository root:
+python benchmarks/bench_speculation.py
+"""
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['HEALTHASSIST_CACHE_DIR'] = tempfile.mkdtemp(prefix='healthassist-bench-')
+
+import main
+from history import ConversationHistory
+from response_cache import ResponseCache
+from services import Services, set_services
+from speculative import Speculator
+
+LATENCY = 0.15
+LISTEN = 1.5
+
+FIRST_QUESTION = "Is my cholesterol report bad? Explain it."
+FOLLOWUPS = [
+    "What food should I eat?",
+    "Is this dangerous?",
+    "What should I eat to lower my LDL cholesterol?",
+    "Is my high LDL dangerous?",
+    "Why is my vitamin D low?",
+    "Should I take medicine for my ESR?",
+]
+
+
+def reply(prompt):
+    """A different answer per prompt, so translation and speech are not served from their caches"""
+    return f"Answer {zlib.crc32(prompt.encode())}. Please discuss your results with your doctor."
+
+
+def run(speculate):
+    main.response_cache = ResponseCache()
+    main.speculator = Speculator(enabled=speculate)
+    report = main.get_medical_report()
+    latencies = []
+    for i, followup in enumerate(FOLLOWUPS):
+        # A different report per session, so no answers carry over between sessions
+        session_report = report + [{'test': f'SESSION MARKER {i}', 'value': '1', 'reference': '0-2'}]
+        history = ConversationHistory()
+        first = main.answer_question(FIRST_QUESTION, session_report)
+        history.add(FIRST_QUESTION, first['english'], session_report)
+        main.speculator.speculate(session_report, history.lines())
+        time.sleep(LISTEN)
+        started = time.perf_counter()
+        main.answer_question(followup, session_report, history.lines())
+        latencies.append(time.perf_counter() - started)
+    return latencies, main.speculator.stats()
+
+
+def main_benchmark():
+    set_services(Services.fake(LATENCY, reply=reply))
+    for speculate in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, stats = run(speculate)
+        print(f"speculation {'on ' if speculate else 'off'}  "
+              f"follow-up median {statistics.median(latencies) * 1000:>5.0f}ms  "
+              f"per follow-up {[round(latency * 1000) for latency in latencies]}")
+        if speculate:
+            # Lookups include the first questions, which are never predicted
+            print(f"hit rate {stats['hits']}/{stats['lookups']} lookups ({stats['hit_rate']:.0%}), "
+                  f"{stats['speculated']} answers precomputed ({stats['unused']} unused), "
+                  f"{stats['calls']} Gemini calls, {stats['tts_chars']} TTS characters")
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,49 @@
+"""Import time of the entry modules, and which heavy dependencies they load
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each module (best of three) and lists the heavy packages found in
+sys.modules afterwards. A text-only session should load none of the speech,
+PDF or SDK stacks. Run from the repository root:
+python benchmarks/bench_startup.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['main', 'services', 'batch', 'rules']
+HEAVY = ['speech_recognition', 'elevenlabs', 'google.generativeai', 'translate', 'PyPDF2',
+         'numpy', 'streamlit', 'httpx']
+REPEATS = 3
+
+
+def import_time(module):
+    """Cumulative import time in ms and the heavy modules loaded"""
+    code = (f"import sys; import {module}; "
+            f"print(','.join(name for name in {HEAVY!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    total = 0
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if line.startswith('import time:') and line.rstrip().endswith(f'| {module}'):
+            total = int(line.split('|')[1])
+    return total / 1000, result.stdout.strip()
+
+
+def main():
+    print(f"{'module':<10} {'import ms':>10}  heavy modules loaded")
+    for module in MODULES:
+        runs = [import_time(module) for _ in range(REPEATS)]
+        if runs[0][0] is None:
+            print(f"{module:<10} {'failed':>10}  {runs[0][1]}")
+            continue
+        best = min(ms for ms, _ in runs)
+        print(f"{module:<10} {best:>10.1f}  {runs[0][1] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
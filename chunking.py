@@ -0,0 +1,70 @@
+import re
+
+# Sentence boundaries for English and Tamil text: Latin end punctuation (which
+# Tamil also uses), the danda some models emit, or a line break
+SENTENCE_END = re.compile(r'(?<=[.!?।])\s+|\n+')
+
+# Number placeholders must never be cut in half
+PLACEHOLDER = re.compile(r'(__NUM_\d+__)')
+
+
+def split_sentences(text):
+    """Split text into sentences on English and Tamil punctuation"""
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _split_long(piece, max_chars):
+    """Break a piece longer than max_chars at word boundaries"""
+    parts = []
+    current = ""
+    for word in piece.split():
+        if len(word) > max_chars:
+            # A single unbreakable word starts a part of its own, so it is never
+            # glued to the word before it; cut it, but keep placeholders whole
+            if current:
+                parts.append(current)
+                current = ""
+            for token in PLACEHOLDER.split(word):
+                while len(token) > max_chars and not PLACEHOLDER.fullmatch(token):
+                    if current:
+                        parts.append(current)
+                        current = ""
+                    parts.append(token[:max_chars])
+                    token = token[max_chars:]
+                if len(current) + len(token) > max_chars and current:
+                    parts.append(current)
+                    current = ""
+                current += token
+            continue
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_text(text, max_chars=400):
+    """Pack whole sentences into as few chunks of at most max_chars as possible
+
+    Sentences are packed greedily in order, which gives the fewest chunks for
+    an order-preserving split. Only a sentence longer than max_chars is broken
+    up, at word boundaries, and a __NUM_i__ placeholder is never split.
+    """
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        pieces = [sentence] if len(sentence) <= max_chars else _split_long(sentence, max_chars)
+        for piece in pieces:
+            candidate = f"{current} {piece}" if current else piece
+            if len(candidate) > max_chars and current:
+                chunks.append(current)
+                current = piece
+            else:
+                current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,113 @@
+import base64
+import json
+import os
+import urllib.error
+import urllib.request
+import providers
+
+# Processing server used by the Streamlit apps; without one a server is started in-process
+SERVER_URL = os.getenv('HEALTHASSIST_SERVER', '')
+TIMEOUT = float(os.getenv('SERVER_TIMEOUT', '120'))
+
+
+class ServerError(RuntimeError):
+    """A request the processing server refused or failed; status is the HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AssistantClient:
+    """Blocking client for the processing server in server.py
+
+    Everything the apps need goes through a session: upload a report, then
+    ask questions whose answers stream back as events. Speech for any text
+    streams from speak().
+    """
+
+    def __init__(self, base_url, timeout=TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, content_type='application/json'):
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(self.base_url + path, data=body, method=method,
+                                         headers={'Content-Type': content_type} if body is not None else {})
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error') or e.reason
+            except ValueError:
+                message = e.reason
+            raise ServerError(e.code, message) from None
+
+    def _json(self, method, path, body=None, content_type='application/json'):
+        with self._request(method, path, body, content_type) as response:
+            return json.loads(response.read())
+
+    def create_session(self):
+        """Id of a new session on the server"""
+        return self._json('POST', '/sessions')['session']
+
+    def end_session(self, session_id):
+        self._json('DELETE', f'/sessions/{session_id}')
+
+    def upload_report(self, session_id, data, content_type='application/pdf'):
+        """Make a PDF (or report text) the session's report; returns the parsed 'report' rows,
+        their count ('rows') and the 'abnormal' test names"""
+        if isinstance(data, str):
+            data, content_type = data.encode('utf-8'), 'text/plain; charset=utf-8'
+        return self._json('POST', f'/sessions/{session_id}/report', data, content_type)
+
+    def ask(self, session_id, question, language='en', speak=True):
+        """Yield the answer's events as they arrive
+
+        'question' (the English question, for Tamil questions), 'text' per
+        sentence, 'audio' with the MP3 bytes of each sentence when speak is
+        set, then 'done' with the full answer, its 'source' and 'timing'.
+        A failure on the server arrives as an 'error' event.
+        """
+        payload = {'question': question, 'language': language, 'speak': speak}
+        with self._request('POST', f'/sessions/{session_id}/ask', payload) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event['type'] == 'audio':
+                    event['data'] = base64.b64decode(event['data'])
+                yield event
+
+    def speak(self, text, chunk_size=16 * 1024):
+        """Yield MP3 chunks for the text as they are synthesized"""
+        with self._request('POST', '/speak', {'text': text}) as response:
+            while True:
+                chunk = response.read1(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def stats(self):
+        """Sessions, job queue, cache and per-stage latency figures of the server"""
+        return self._json('GET', '/stats')
+
+
+def connect_server():
+    """Client for HEALTHASSIST_SERVER, or for a server started on a thread of this process"""
+    if SERVER_URL:
+        return AssistantClient(SERVER_URL)
+    # Imported here so clients of a remote server never load the processing stack
+    from server import start_in_thread
+    _, url = start_in_thread()
+    print(f"Started an in-process server at {url}; set HEALTHASSIST_SERVER to use a shared one")
+    return AssistantClient(url)
+
+
+providers.register('server', connect_server)
+
+
+def get_client():
+    """The shared client, connected on first use"""
+    return providers.get('server')
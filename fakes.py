@@ -0,0 +1,261 @@
+import hashlib
+import math
+import random
+import threading
+import time
+import types
+from chunking import split_sentences
+from prompts import count_tokens
+from speech_capture import Recognizer
+import tracing
+
+
+class FakeLatency:
+    """Deterministic delay for fakes: latency seconds plus seeded uniform jitter"""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, scale=1.0):
+        if not self.latency and not self.jitter:
+            return
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, delay * scale))
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeCachedContent:
+    def __init__(self, model, contents, display_name=None, ttl=None, **kwargs):
+        self.model = model
+        self.contents = contents
+        self.display_name = display_name
+        self.ttl = ttl
+        self.tokens = sum(count_tokens(content) for content in contents)
+
+
+class FakeGenai:
+    """Mock of the google.generativeai module that records the tokens sent per call
+
+    Every generate_content call appends a dict to calls with the tokens sent
+    and, for models bound to cached content, the tokens served from the cache.
+    Set min_cache_tokens to mimic Gemini's minimum cacheable prompt size, and
+    latency and jitter for a seeded random delay per call. reply may be a
+    function of the prompt.
+    """
+
+    def __init__(self, reply="Your LDL cholesterol is high. Eat less fried food.", min_cache_tokens=0,
+                 latency=0.0, jitter=0.0, seed=0):
+        self.reply = reply
+        self.min_cache_tokens = min_cache_tokens
+        self.delay = FakeLatency(latency, jitter, seed)
+        self.calls = []
+        self.cached_contents = []
+        fake = self
+
+        class GenerativeModel:
+            def __init__(self, model_name='gemini-1.5-pro', cached_content=None, **kwargs):
+                self.model_name = model_name
+                self.cached_content = cached_content
+
+            @classmethod
+            def from_cached_content(cls, cached_content, **kwargs):
+                return cls(cached_content.model, cached_content)
+
+            def generate_content(self, prompt, stream=False, **kwargs):
+                return fake._generate(self, prompt, stream)
+
+        self.GenerativeModel = GenerativeModel
+        self.caching = types.SimpleNamespace(
+            CachedContent=types.SimpleNamespace(create=self._create_cached_content)
+        )
+
+    def configure(self, **kwargs):
+        pass
+
+    def _create_cached_content(self, model, contents, **kwargs):
+        cached = FakeCachedContent(model, contents, **kwargs)
+        if cached.tokens < self.min_cache_tokens:
+            raise ValueError(f"Cached content is too small ({cached.tokens} tokens)")
+        self.cached_contents.append(cached)
+        return cached
+
+    def _generate(self, model, prompt, stream):
+        cached = model.cached_content
+        self.calls.append({
+            'tokens_sent': count_tokens(prompt),
+            'cached_tokens': cached.tokens if cached else 0,
+        })
+        self.delay.sleep()
+        reply = self.reply(prompt) if callable(self.reply) else self.reply
+        if stream:
+            return [FakeResponse(sentence + ' ') for sentence in split_sentences(reply)]
+        return FakeResponse(reply)
+
+    def tokens_sent(self):
+        """Total tokens sent over every recorded call"""
+        return sum(call['tokens_sent'] for call in self.calls)
+
+
+class FakeSpeechClient:
+    """Mock of the ElevenLabs client whose generate() returns deterministic fake MP3 bytes
+
+    latency and jitter set a seeded random delay per call; chunk_size sets
+    the size of the streamed chunks.
+    """
+
+    def __init__(self, latency=0.0, chunk_size=1024, jitter=0.0, seed=0):
+        self.delay = FakeLatency(latency, jitter, seed)
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def generate(self, text, voice=None, model=None, voice_settings=None, stream=False, **kwargs):
+        self.calls += 1
+        self.delay.sleep()
+        # Roughly eight bytes of "audio" per character of text
+        seed = hashlib.sha256(text.encode('utf-8')).digest()
+        audio = b"ID3" + seed * (len(text) // 4 + 1)
+        return iter([audio[i:i + self.chunk_size] for i in range(0, len(audio), self.chunk_size)])
+
+
+class FakeListener:
+    """Stand-in for main.listen_tamil that hears the given Tamil phrases in turn
+
+    latency and jitter set a seeded random delay for recognizing each
+    phrase, the way recognize_google would for recorded audio.
+    """
+
+    def __init__(self, phrases, latency=0.0, jitter=0.0, seed=0):
+        self.phrases = list(phrases)
+        self.delay = FakeLatency(latency, jitter, seed)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, on_partial=None):
+        with self._lock:
+            phrase = self.phrases[self.calls % len(self.phrases)]
+            self.calls += 1
+        if on_partial:
+            words = phrase.split()
+            for count in range(1, len(words)):
+                on_partial(' '.join(words[:count]))
+        with tracing.span('listen') as span:
+            # About 16 kHz 16-bit mono audio for a second per ten characters
+            span.set(audio_bytes=len(phrase) * 3200)
+        with tracing.span('recognize') as span:
+            self.delay.sleep()
+            span.set(chars=len(phrase))
+        return phrase
+
+
+class FakeRecognizer(Recognizer):
+    """Speech recognizer for WAV fixtures that "hears" a known transcript
+
+    Recognizing audio reveals words_per_second words per second of it and
+    takes latency seconds plus per_second seconds per second of audio. The
+    first failures calls raise ConnectionError, to exercise retries.
+    """
+
+    def __init__(self, transcript, latency=0.0, per_second=0.0, words_per_second=3.0, failures=0, **kwargs):
+        super().__init__(**kwargs)
+        self.transcript = transcript
+        self.latency = latency
+        self.per_second = per_second
+        self.words_per_second = words_per_second
+        self.failures = failures
+        self.calls = 0
+
+    def recognize(self, audio):
+        self.calls += 1
+        seconds = self.seconds(len(audio))
+        time.sleep(self.latency + self.per_second * seconds)
+        if self.calls <= self.failures:
+            raise ConnectionError("recognition service unavailable")
+        words = self.transcript.split()
+        return ' '.join(words[:max(1, math.ceil(seconds * self.words_per_second))])
+
+
+class SessionState(dict):
+    """st.session_state: a dict whose keys can also be read and set as attributes"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class FakeElement:
+    """What FakeStreamlit calls return; works as a context manager like st.columns or st.spinner"""
+
+    def __init__(self, app):
+        self._app = app
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+
+class FakeStreamlit(types.ModuleType):
+    """Scripted stand-in for the streamlit module, to run the apps without a browser
+
+    inputs maps widget labels to what text_input, text_area and
+    file_uploader return; buttons and checkboxes are the labels that read as
+    clicked or ticked. Every other call is recorded in outputs as
+    (name, args). Put it in sys.modules['streamlit'] before importing an app.
+    """
+
+    def __init__(self, inputs=None, buttons=(), checkboxes=()):
+        super().__init__('streamlit')
+        self.inputs = dict(inputs or {})
+        self.buttons = set(buttons)
+        self.checkboxes = set(checkboxes)
+        self.session_state = SessionState()
+        self.outputs = []
+        self.sidebar = FakeElement(self)
+
+    def text_input(self, label, *args, **kwargs):
+        return self.inputs.get(label, '')
+
+    def text_area(self, label, *args, **kwargs):
+        return self.inputs.get(label, '')
+
+    def file_uploader(self, label, *args, **kwargs):
+        return self.inputs.get(label)
+
+    def button(self, label, *args, **kwargs):
+        return label in self.buttons
+
+    def checkbox(self, label, *args, **kwargs):
+        return label in self.checkboxes
+
+    def columns(self, spec, **kwargs):
+        return [FakeElement(self) for _ in range(spec if isinstance(spec, int) else len(spec))]
+
+    def cache_data(self, func=None, **kwargs):
+        # Caching is left to the functions under test
+        return func if func is not None else (lambda func: func)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def record(*args, **kwargs):
+            self.outputs.append((name, args))
+            return FakeElement(self)
+        return record
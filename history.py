@@ -0,0 +1,119 @@
+import re
+from chunking import split_sentences
+from prompts import INSTRUCTIONS, build_prefix, build_question, count_tokens
+from report_index import relevant_rows
+
+# Words that make a turn about health even when no test is named
+HEALTH_WORDS = {
+    'report', 'test', 'tests', 'result', 'results', 'level', 'levels', 'value', 'range',
+    'normal', 'high', 'low', 'abnormal', 'risk', 'dangerous', 'blood', 'doctor', 'medicine',
+    'diet', 'eat', 'food', 'exercise', 'health', 'heart', 'liver', 'kidney', 'sugar',
+}
+
+WORD = re.compile(r'[a-z0-9]{3,}')
+
+
+def report_vocabulary(medical_report):
+    """Lower-case words that appear in the report's test names"""
+    words = set()
+    for row in medical_report or []:
+        if isinstance(row, dict):
+            words.update(WORD.findall(str(row.get('test', '')).lower()))
+    return words
+
+
+class ConversationHistory:
+    """Conversation history for follow-up questions with a bounded prompt footprint
+
+    The last max_turns turns are kept verbatim. Older turns are rolled into a
+    short summary (the question plus the first sentence of its answer). To
+    stay under token_budget the oldest summaries go first, then the oldest
+    verbatim turns are rolled up too, and finally the latest answer is cut
+    short. Turns that have nothing to do with the report are dropped.
+    """
+
+    def __init__(self, max_turns=3, token_budget=600):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.turns = []
+        self.summary = []
+        self.prompt_sizes = []
+
+    def is_relevant(self, question, answer, medical_report):
+        """Whether a turn is about the report's tests or general health topics
+
+        A turn counts if the question names a test or health topic, or the
+        answer names a test. Generic words in the answer are ignored so that
+        refusals such as "I can only answer about the report" are dropped.
+        """
+        vocabulary = report_vocabulary(medical_report)
+        question_words = set(WORD.findall(question.lower()))
+        answer_words = set(WORD.findall(answer.lower()))
+        return bool(question_words & (HEALTH_WORDS | vocabulary) or answer_words & vocabulary)
+
+    def add(self, question, answer, medical_report=None):
+        """Remember a question and its answer"""
+        if medical_report is not None and not self.is_relevant(question, answer, medical_report):
+            return
+        self.turns.append((question, answer))
+        while len(self.turns) > self.max_turns:
+            self._roll_up(*self.turns.pop(0))
+        while self.tokens() > self.token_budget:
+            if self.summary:
+                self.summary.pop(0)
+            elif len(self.turns) > 1:
+                self._roll_up(*self.turns.pop(0))
+            else:
+                self._shorten_last()
+                break
+
+    def _roll_up(self, question, answer):
+        sentences = split_sentences(answer)
+        gist = sentences[0] if sentences else answer
+        self.summary.append(f"{question} -> {gist}")
+
+    def _shorten_last(self):
+        """Cut the one remaining answer, whole sentences first, until the history fits"""
+        question, answer = self.turns[-1]
+        sentences = split_sentences(answer)
+        while len(sentences) > 1 and self.tokens() > self.token_budget:
+            sentences.pop()
+            self.turns[-1] = (question, ' '.join(sentences) + " ...")
+        excess = self.tokens() - self.token_budget
+        if excess > 0:
+            # A single sentence is still too long: drop about four characters per token over
+            answer = self.turns[-1][1]
+            self.turns[-1] = (question, answer[:max(0, len(answer) - excess * 4 - 4)] + " ...")
+
+    def lines(self):
+        """History lines to include in the next prompt"""
+        lines = []
+        if self.summary:
+            lines.append("Summary of earlier questions: " + "; ".join(self.summary))
+        for question, answer in self.turns:
+            lines.append(f"Q: {question}")
+            lines.append(f"A: {answer}")
+        return lines
+
+    def tokens(self):
+        """Approximate tokens the history adds to a prompt"""
+        return count_tokens("\n".join(self.lines()))
+
+    def record_prompt(self, question, medical_report):
+        """Record the size of the prompt for a question asked with the current history"""
+        # Mirrors PrefixCache: with relevance filtering the rows travel with the question
+        report_rows = relevant_rows(medical_report, question)
+        prefix = INSTRUCTIONS if report_rows is not None else build_prefix(medical_report)
+        question_tokens = count_tokens(build_question(question, self.lines(), report_rows))
+        size = {
+            'turn': len(self.prompt_sizes) + 1,
+            'history_tokens': self.tokens(),
+            'question_tokens': question_tokens,
+            'prompt_tokens': count_tokens(prefix) + question_tokens,
+        }
+        self.prompt_sizes.append(size)
+        return size
+
+    def clear(self):
+        self.turns = []
+        self.summary = []
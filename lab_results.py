@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from report_parser import REFERENCE_UNIT, flag_for, normalize_flag, parse_reference, parse_value
+
+
+@dataclass(slots=True)
+class LabResult:
+    """One test result with its value and reference range already parsed"""
+    test: str
+    value: float = None
+    unit: str = None
+    ref_low: float = None
+    ref_high: float = None
+    flag: str = ''
+    raw_value: str = ''
+    reference: str = None
+
+    @classmethod
+    def from_dict(cls, row):
+        """Build from a report row ({'test', 'value', 'reference'} or the parser's full row)"""
+        raw_value = str(row.get('value') or '')
+        reference = row.get('reference')
+        if 'ref_low' in row or 'ref_high' in row:
+            low, high = row.get('ref_low'), row.get('ref_high')
+        else:
+            low, high = parse_reference(reference)
+        unit = row.get('unit')
+        if unit is None and reference:
+            match = REFERENCE_UNIT.search(reference)
+            unit = match.group('unit') if match else None
+        value = parse_value(raw_value)
+        flag = normalize_flag(row.get('flag')) or flag_for(value, low, high)
+        return cls(str(row.get('test', '')), value, unit, low, high, flag, raw_value, reference)
+
+    def to_dict(self, detailed=False):
+        """The row as a dict; detailed adds the parsed fields report_parser produces"""
+        row = {'test': self.test, 'value': self.raw_value, 'reference': self.reference}
+        if detailed:
+            row.update(unit=self.unit, ref_low=self.ref_low, ref_high=self.ref_high, flag=self.flag)
+        return row
+
+    @property
+    def is_abnormal(self):
+        return self.flag in ('H', 'L')
+
+
+class LabReport:
+    """A parsed report as typed LabResult records"""
+
+    __slots__ = ('results',)
+
+    def __init__(self, results):
+        self.results = list(results)
+
+    @classmethod
+    def from_dicts(cls, rows):
+        return cls(LabResult.from_dict(row) for row in rows)
+
+    def to_dicts(self, detailed=False):
+        return [result.to_dict(detailed) for result in self.results]
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+    def abnormal(self):
+        """Results outside their reference range"""
+        return [result for result in self.results if result.is_abnormal]
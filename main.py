@@ -1,35 +1,58 @@
-from elevenlabs.client import ElevenLabs
 import os
-import speech_recognition as sr
-from translate import Translator
-import google.generativeai as genai
+import sys
+import time
+from pipeline import run_streaming_pipeline
+from response_cache import ResponseCache
+from audio_sinks import play_stream, speaker_sink
+from rules import RuleEngine
+from speculative import Speculator
+from services import get_services
+from speech_capture import get_listener
+import tracing
 
-# Get API keys from environment variables
-api_key = os.getenv('ELEVENLABS_API_KEY')
-gemini_api_key = "xxx"
+# Gemini, translation and ElevenLabs clients are shared through the service
+# layer (services.py) and created on first use from GEMINI_API_KEY and
+# ELEVENLABS_API_KEY, so importing this module connects to nothing;
+# set_services() swaps in fakes
 
-if not api_key:
-    raise ValueError("Please set the ELEVENLABS_API_KEY environment variable")
-if not gemini_api_key:
-    raise ValueError("Please set the GEMINI_API_KEY environment variable")
+# Finished answers for repeat questions ('memory' or 'disk')
+response_cache = ResponseCache(backend=os.getenv('RESPONSE_CACHE_BACKEND', 'memory'))
 
-# Initialize ElevenLabs client
-client = ElevenLabs(api_key=api_key)
+# Simple "is X normal?" questions are answered from the report's reference ranges
+rule_engine = RuleEngine()
 
-# Configure Gemini
-genai.configure(api_key=gemini_api_key)
-model = genai.GenerativeModel('gemini-1.5-pro')
+# Likely follow-ups answered in the background while an answer plays (SPECULATE=1)
+speculator = Speculator()
 
-def listen_tamil():
-    """Listen to Tamil speech and convert to text"""
+# 'stream' captures with local endpointing and streams frames to the
+# recognizer (speech_capture.py); 'blocking' records the whole utterance first
+LISTEN_MODE = os.getenv('LISTEN_MODE', 'stream')
+
+# Said instead of an answer when Gemini fails; such answers are never cached
+GEMINI_UNAVAILABLE = "Sorry, I could not get an answer right now, please ask again in a moment."
+
+def listen_tamil(on_partial=None):
+    """Listen to Tamil speech and convert to text
+
+    on_partial is called with partial transcripts while the user is speaking.
+    """
+    if LISTEN_MODE == 'stream':
+        return get_listener().listen(on_partial)
+    
+    # Imported here so text-only sessions never load the speech stack
+    import speech_recognition as sr
     recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening for Tamil speech...")
-        audio = recognizer.listen(source)
+    with tracing.span('listen') as span:
+        with sr.Microphone() as source:
+            print("Listening for Tamil speech...")
+            audio = recognizer.listen(source)
+        span.set(audio_bytes=len(audio.frame_data))
     
     try:
         # Using Google's speech recognition with Tamil language
-        tamil_text = recognizer.recognize_google(audio, language='ta-IN')
+        with tracing.span('recognize') as span:
+            tamil_text = recognizer.recognize_google(audio, language='ta-IN')
+            span.set(chars=len(tamil_text))
         print(f"Recognized Tamil text: {tamil_text}")
         return tamil_text
     except sr.UnknownValueError:
@@ -41,138 +64,114 @@ def listen_tamil():
 
 def translate_tamil_to_english(tamil_text):
     """Translate Tamil text to English while preserving numbers"""
-    # Extract numbers from the text
-    import re
-    numbers = re.findall(r'\d+\.?\d*', tamil_text)
-    
-    # Replace numbers with placeholders
-    for i, num in enumerate(numbers):
-        tamil_text = tamil_text.replace(num, f'__NUM_{i}__')
-    
-    # Split text into chunks of 400 characters (leaving room for placeholders)
-    chunk_size = 400
-    chunks = [tamil_text[i:i+chunk_size] for i in range(0, len(tamil_text), chunk_size)]
-    
-    # Translate each chunk
-    translator = Translator(to_lang="en", from_lang="ta")
-    translated_chunks = []
-    for chunk in chunks:
-        try:
-            # Clean up the chunk before translation
-            chunk = chunk.strip()
-            if not chunk:
-                continue
-                
-            translation = translator.translate(chunk)
-            # Clean up the translation
-            translation = translation.strip()
-            translated_chunks.append(translation)
-        except Exception as e:
-            print(f"Translation error: {e}")
-            translated_chunks.append(chunk)  # Keep original if translation fails
-    
-    # Join translated chunks with proper spacing
-    translation = ' '.join(filter(None, translated_chunks))
-    
-    # Restore numbers
-    for i, num in enumerate(numbers):
-        translation = translation.replace(f'__NUM_{i}__', num)
-    
-    # Clean up any double spaces
-    translation = re.sub(r'\s+', ' ', translation)
-    
-    return translation.strip()
+    return get_services().translate(tamil_text, 'ta', 'en')
 
 def translate_english_to_tamil(english_text):
     """Translate English text to Tamil while preserving numbers"""
-    # Extract numbers from the text
-    import re
-    numbers = re.findall(r'\d+\.?\d*', english_text)
-    
-    # Replace numbers with placeholders
-    for i, num in enumerate(numbers):
-        english_text = english_text.replace(num, f'__NUM_{i}__')
-    
-    # Split text into chunks of 400 characters (leaving room for placeholders)
-    chunk_size = 400
-    chunks = [english_text[i:i+chunk_size] for i in range(0, len(english_text), chunk_size)]
-    
-    # Translate each chunk
-    translator = Translator(to_lang="ta", from_lang="en")
-    translated_chunks = []
-    for chunk in chunks:
-        try:
-            # Clean up the chunk before translation
-            chunk = chunk.strip()
-            if not chunk:
-                continue
-                
-            translation = translator.translate(chunk)
-            # Clean up the translation
-            translation = translation.strip()
-            translated_chunks.append(translation)
-        except Exception as e:
-            print(f"Translation error: {e}")
-            translated_chunks.append(chunk)  # Keep original if translation fails
-    
-    # Join translated chunks with proper spacing
-    translation = ' '.join(filter(None, translated_chunks))
-    
-    # Restore numbers
-    for i, num in enumerate(numbers):
-        translation = translation.replace(f'__NUM_{i}__', num)
-    
-    # Clean up any double spaces
-    translation = re.sub(r'\s+', ' ', translation)
-    
-    return translation.strip()
+    return get_services().translate(english_text, 'en', 'ta')
 
-def process_with_gemini(english_text, medical_summary):
+def process_with_gemini(english_text, medical_summary, conversation_history=None):
     """Process medical report with Gemini model"""
-    prompt = f"""You are a medical assistant. Analyze the medical report and respond to the user's question in Tamil.
+    try:
+        return get_services().ask(english_text, medical_summary, conversation_history)
+    except Exception as e:
+        print(f"Error processing with Gemini: {e}")
+        return GEMINI_UNAVAILABLE
 
-    User's question: {english_text}
-    
-    Requirements:
-    1. Respond only if the question relates to the medical report
-    2. Keep the response under 500 words
-    3. Use simple, non-medical language
-    4. Focus on answering the specific question
-    5. Avoid greetings, signatures, and repetitive headers
-    6. respond in tamil
-    
-    Medical Report:
-    {medical_summary}
-    """
-    
+def stream_with_gemini(english_text, medical_summary, conversation_history=None):
+    """Stream the Gemini answer as text fragments while it is generated"""
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        yield from get_services().ask_stream(english_text, medical_summary, conversation_history)
     except Exception as e:
         print(f"Error processing with Gemini: {e}")
-        return english_text  # Fallback to original text if there's an error
-
-def text_to_speech(tamil_text):
-    """Convert Tamil text to speech using ElevenLabs"""
-    audio = client.generate(
-        text=tamil_text,
-        voice="Kathiravan - Social Media Voice - Youthful & Pleasant",
-        model="eleven_multilingual_v2",
-        voice_settings={
-            "stability": 0.5,
-            "similarity_boost": 0.75
-        }
-    )
+        # A line break ends any partial answer, so the apology is its own sentence
+        yield f"\n{GEMINI_UNAVAILABLE}"
+
+def gemini_failed(english_answer):
+    """True when Gemini failed and the answer is, or ends in, the apology"""
+    return english_answer.endswith(GEMINI_UNAVAILABLE)
+
+def synthesize_speech(tamil_text):
+    """Convert Tamil text to MP3 audio bytes using ElevenLabs"""
+    # Repeat texts are served from the content-addressed audio cache
+    return get_services().synthesize(tamil_text)
+
+def play_audio(audio_bytes, sink=None):
+    """Play MP3 audio bytes through the local speaker (or the given sink)"""
+    print("Playing audio...")
+    play_stream([audio_bytes], sink).join()
+
+def text_to_speech(tamil_text, sink=None):
+    """Convert Tamil text to speech using ElevenLabs, playing chunks as they arrive
+
+    Playback runs on a background thread; join() the returned Playback to wait
+    for it and get the full audio bytes.
+    """
+    return play_stream(get_services().speak_stream(tamil_text), sink)
+
+def find_answer(english_text, medical_summary, conversation_history=None):
+    """An answer that needs no Gemini call, and where it came from
+
+    Returns (answer, source): a cached answer ('cache'), a follow-up the
+    speculator already answered ('speculation', stored in the response cache
+    here) or a rule answer from the reference ranges ('rules', with no audio
+    yet). Returns (None, None) when Gemini has to answer.
+    """
+    cached = response_cache.get(medical_summary, english_text, conversation_history)
+    if cached is not None:
+        return cached, 'cache'
     
-    # Save audio to file
-    with open("output.mp3", "wb") as f:
-        for chunk in audio:
-            f.write(chunk)
-    print("Audio saved as output.mp3")
+    local = rule_engine.answer(english_text, medical_summary)
+    if local is not None:
+        return {'english': local[0], 'tamil': local[1], 'audio': None}, 'rules'
     
-    # Play the generated audio
-    print("Playing audio...")
-    os.system("afplay output.mp3")  # Using afplay for macOS
+    # Follow-ups may have been answered while the previous answer played
+    speculated = speculator.lookup(medical_summary, english_text, conversation_history)
+    if speculated is not None:
+        response_cache.put(medical_summary, english_text, conversation_history,
+                           speculated['english'], speculated['tamil'], speculated['audio'])
+        return speculated, 'speculation'
+    return None, None
+
+def answer_question(english_text, medical_summary, conversation_history=None, sink=None):
+    """Answer a question in English, Tamil and audio, reusing cached answers
+
+    On a response cache hit, or when the speculator already answered a
+    matching follow-up, Gemini, translation and speech synthesis are all
+    skipped; questions the rule engine can answer skip Gemini and translation.
+    If a sink is given the audio is played into it, starting as soon
+    as the first chunk is synthesized. Returns a dict with 'english', 'tamil',
+    'audio' and 'cached'.
+    """
+    found, source = find_answer(english_text, medical_summary, conversation_history)
+    if source in ('cache', 'speculation'):
+        if sink is not None:
+            play_audio(found['audio'], sink)
+        return dict(found, cached=True)
+    
+    local = (found['english'], found['tamil']) if source == 'rules' else None
+    if local is not None:
+        processed_english, final_tamil = local
+    else:
+        started = time.perf_counter()
+        processed_english = process_with_gemini(english_text, medical_summary, conversation_history)
+        final_tamil = translate_english_to_tamil(processed_english)
+        rule_engine.record_llm(time.perf_counter() - started)
+    
+    complete = True
+    if sink is not None:
+        playback = text_to_speech(final_tamil, sink)
+        audio = playback.join()
+        print(f"Speech time to first byte: {playback.ttfb or 0:.2f}s, "
+              f"time to first audio: {playback.ttfa or 0:.2f}s")
+        # Audio cut short by a synthesis or playback error must not be replayed
+        complete = playback.error is None
+    else:
+        audio = synthesize_speech(final_tamil)
+    if complete and not gemini_failed(processed_english):
+        response_cache.put(medical_summary, english_text, conversation_history, processed_english, final_tamil, audio)
+    return {'english': processed_english, 'tamil': final_tamil, 'audio': audio, 'cached': False,
+            'local': local is not None}
 
 def get_medical_report():
     """Get the medical report from the user"""
@@ -221,29 +220,82 @@ def get_medical_report():
   'value': '30.5',
   'reference': '30-100 ng/mL'}]
     return sample_medical_report
-def main():
-    # Step 1: Listen to Tamil speech
-    tamil_text = listen_tamil()
-    if not tamil_text:
-        return
+def main_streaming(english_text, medical_summary, conversation_history=None):
+    """Speak the answer sentence by sentence while Gemini is still generating it"""
+    cached = response_cache.get(medical_summary, english_text, conversation_history)
+    if cached is not None:
+        print("Answer served from the response cache")
+        play_audio(cached['audio'])
+        return cached['english'], cached['tamil']
     
-    # Step 2: Translate Tamil to English
-    english_text = translate_tamil_to_english(tamil_text)
-    print(f"Translated to English: {english_text}")
+    local = rule_engine.answer(english_text, medical_summary)
+    if local is not None:
+        print("Answered from the report's reference ranges")
+        playback = text_to_speech(local[1])
+        audio = playback.join()
+        if playback.error is None:
+            response_cache.put(medical_summary, english_text, conversation_history, local[0], local[1], audio)
+        return local
     
-    #Step 3: Get the medical report
-    medical_summary = get_medical_report()
-
-    # Step 3: Process with Gemini Flash
-    processed_english = process_with_gemini(english_text, medical_summary)
-    print(f"Processed by Gemini: {processed_english}")
+    audio_parts = []
     
-    # Step 4: Translate back to Tamil
-    final_tamil = translate_english_to_tamil(processed_english)
+    def play_and_keep(audio):
+        audio_parts.append(audio)
+        play_audio(audio)
+    
+    processed_english, final_tamil, timer, errors = run_streaming_pipeline(
+        stream_with_gemini(english_text, medical_summary, conversation_history),
+        translate=translate_english_to_tamil,
+        synthesize=synthesize_speech,
+        play=play_and_keep,
+        on_sentence=lambda english, tamil: print(f"Speaking: {tamil}"),
+    )
+    print(f"Processed by Gemini: {processed_english}")
     print(f"Translated back to Tamil: {final_tamil}")
+    timer.report()
+    
+    # MP3 frames can be concatenated, so the sentences replay as one answer;
+    # answers cut short by a translation or speech error are not kept
+    if not errors and not gemini_failed(processed_english):
+        response_cache.put(medical_summary, english_text, conversation_history,
+                           processed_english, final_tamil, b"".join(audio_parts))
+    return processed_english, final_tamil
+
+def main(stream=False):
+    # Connect to Gemini and ElevenLabs first, so missing keys fail before listening
+    get_services().connect()
+    tracing.start_metrics_server()
+    
+    with tracing.trace('voice_request', stream=stream) as request:
+        # Step 1: Listen to Tamil speech, showing what has been heard so far
+        tamil_text = listen_tamil(on_partial=lambda text: print(f"Hearing: {text}"))
+        if not tamil_text:
+            return
+        
+        # Step 2: Translate Tamil to English
+        english_text = translate_tamil_to_english(tamil_text)
+        print(f"Translated to English: {english_text}")
+        
+        #Step 3: Get the medical report
+        medical_summary = get_medical_report()
+        
+        # Steps 3-5 overlapped: speak each sentence as soon as it is ready
+        if stream:
+            main_streaming(english_text, medical_summary)
+        else:
+            # Steps 3-5: Process with Gemini, translate back to Tamil and synthesize,
+            # or reuse the cached answer to a repeat question
+            # The answer is played as it is synthesized
+            answer = answer_question(english_text, medical_summary, sink=speaker_sink())
+            if answer['cached']:
+                print("Answer served from the response cache")
+            elif answer['local']:
+                print("Answered from the report's reference ranges")
+            print(f"Processed by Gemini: {answer['english']}")
+            print(f"Translated back to Tamil: {answer['tamil']}")
     
-    # Step 5: Convert to speech
-    text_to_speech(final_tamil)
+    # Where the time went, stage by stage
+    request.report()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(stream="--stream" in sys.argv)
\ No newline at end of file
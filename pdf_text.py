@@ -0,0 +1,79 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import tracing
+
+# Per-upload limits
+MAX_PAGES = int(os.getenv('PDF_MAX_PAGES', '100'))
+EXTRACT_TIMEOUT = float(os.getenv('PDF_EXTRACT_TIMEOUT', '60'))
+
+# Short reports are faster to read in-process than to ship to workers
+PARALLEL_MIN_PAGES = 8
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor = None
+
+
+def get_executor():
+    """Shared process pool for page extraction"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def _extract_pages(pdf_bytes, start, stop):
+    """Extract the text of pages start..stop-1 (runs in a worker process)"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(pdf_bytes, max_pages=MAX_PAGES, timeout=EXTRACT_TIMEOUT):
+    """Yield the text of each page in order, extracting page ranges in parallel
+
+    At most max_pages pages are read. Raises TimeoutError if extraction takes
+    longer than timeout seconds in total.
+    """
+    # Imported on first use so sessions without uploads never load the PDF stack
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+    if page_count > max_pages:
+        print(f"PDF has {page_count} pages; only the first {max_pages} are read")
+        page_count = max_pages
+
+    deadline = time.monotonic() + timeout
+    if page_count < PARALLEL_MIN_PAGES or MAX_WORKERS < 2:
+        for i in range(page_count):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"PDF extraction took longer than {timeout}s")
+            yield reader.pages[i].extract_text() or ""
+        return
+
+    # A couple of page ranges per worker keeps all cores busy without
+    # re-parsing the document once per page
+    batch = max(1, -(-page_count // (MAX_WORKERS * 2)))
+    executor = get_executor()
+    futures = [executor.submit(_extract_pages, pdf_bytes, start, min(start + batch, page_count))
+               for start in range(0, page_count, batch)]
+    try:
+        for future in futures:
+            yield from future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        raise TimeoutError(f"PDF extraction took longer than {timeout}s")
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def extract_text_from_pdf(pdf_file):
+    """Extract text from PDF file"""
+    # Streamlit uploads are already in memory; getvalue() avoids another copy
+    pdf_bytes = pdf_file.getvalue() if hasattr(pdf_file, 'getvalue') else pdf_file.read()
+    with tracing.span('pdf_extract', bytes=len(pdf_bytes)) as span:
+        pages = list(iter_pdf_pages(pdf_bytes))
+        span.set(pages=len(pages))
+    return "\n".join(pages)
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from chunking import SENTENCE_END
+import tracing
+
+# Marks the end of a stage's output on its queue
+_DONE = object()
+
+
+class StageTimer:
+    """Record per-stage time-to-first-output and busy time for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first = {}
+        self.busy = {}
+        self.counts = {}
+
+    def mark_first(self, stage):
+        """Remember the first time a stage produced output"""
+        if stage not in self.first:
+            self.first[stage] = time.perf_counter() - self.start
+
+    def add(self, stage, seconds):
+        """Add time spent working inside a stage"""
+        self.busy[stage] = self.busy.get(stage, 0.0) + seconds
+        self.count(stage)
+
+    def count(self, stage):
+        """Count one item passing through a stage"""
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def time_to_first_audio(self):
+        """Seconds from the start of the request until playback began"""
+        return self.first.get('playback')
+
+    def report(self):
+        """Print the timing breakdown for every stage"""
+        print("Stage timings (first output / busy time / items):")
+        for stage in ('gemini', 'sentence', 'translate', 'tts', 'playback'):
+            if stage not in self.first:
+                continue
+            print(f"  {stage:<10} first {self.first[stage]:.2f}s  "
+                  f"busy {self.busy.get(stage, 0.0):.2f}s  "
+                  f"items {self.counts.get(stage, 0)}")
+        ttfa = self.time_to_first_audio()
+        if ttfa is not None:
+            print(f"Time to first audio: {ttfa:.2f}s")
+
+
+def split_sentences(text_chunks):
+    """Regroup streamed text chunks into whole sentences"""
+    buffer = ""
+    for chunk in text_chunks:
+        buffer += chunk
+        parts = SENTENCE_END.split(buffer)
+        # The last part may still be an unfinished sentence
+        for sentence in parts[:-1]:
+            sentence = sentence.strip()
+            if sentence:
+                yield sentence
+        buffer = parts[-1]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def _run_stage(name, source, sink, work, timer, errors):
+    """Apply work to every item on the source queue and forward the result"""
+    try:
+        while True:
+            item = source.get()
+            if item is _DONE:
+                break
+            started = time.perf_counter()
+            result = work(item)
+            timer.add(name, time.perf_counter() - started)
+            timer.mark_first(name)
+            sink.put((item, result))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        sink.put(_DONE)
+
+
+def run_streaming_pipeline(text_chunks, translate, synthesize, play, timer=None, on_sentence=None):
+    """Translate, synthesize and play an answer one sentence at a time
+
+    text_chunks is an iterator of English text fragments (e.g. a streamed
+    Gemini response). Translation and speech synthesis run on background
+    threads so the first sentence is being played while later sentences are
+    still being generated. Returns the full English text, the full Tamil
+    text, the StageTimer for the request and the errors that stopped a stage
+    early; when that list is not empty the answer was cut short. The worker
+    threads share the caller's trace, so their spans show up in its timing
+    breakdown.
+    """
+    timer = timer or StageTimer()
+    sentences = queue.Queue()
+    translated = queue.Queue()
+    synthesized = queue.Queue()
+    errors = []
+
+    def tts_work(item):
+        _, tamil = item
+        return synthesize(tamil)
+
+    workers = [
+        threading.Thread(target=tracing.in_context(_run_stage), daemon=True,
+                         args=('translate', sentences, translated, translate, timer, errors)),
+        threading.Thread(target=tracing.in_context(_run_stage), daemon=True,
+                         args=('tts', translated, synthesized, tts_work, timer, errors)),
+    ]
+    for worker in workers:
+        worker.start()
+
+    def produce():
+        try:
+            def timed_chunks():
+                for chunk in text_chunks:
+                    timer.mark_first('gemini')
+                    timer.count('gemini')
+                    yield chunk
+            for sentence in split_sentences(timed_chunks()):
+                timer.mark_first('sentence')
+                timer.count('sentence')
+                sentences.put(sentence)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            sentences.put(_DONE)
+
+    producer = threading.Thread(target=tracing.in_context(produce), daemon=True)
+    producer.start()
+
+    english_parts = []
+    tamil_parts = []
+    # Play audio on the calling thread, in sentence order
+    while True:
+        item = synthesized.get()
+        if item is _DONE:
+            break
+        (english, tamil), audio = item
+        english_parts.append(english)
+        tamil_parts.append(tamil)
+        if on_sentence:
+            on_sentence(english, tamil)
+        started = time.perf_counter()
+        timer.mark_first('playback')
+        play(audio)
+        timer.add('playback', time.perf_counter() - started)
+
+    producer.join()
+    for worker in workers:
+        worker.join()
+    for error in errors:
+        print(f"Streaming pipeline error: {error}")
+
+    return ' '.join(english_parts), ' '.join(tamil_parts), timer, errors
@@ -0,0 +1,41 @@
+import re
+
+# Units that travel with a number, so "176 mg/dL" is never sent to the translator
+UNITS = [
+    'mg/dL', 'mg/L', 'g/dL', 'gm/dL', 'ng/mL', 'pg/mL', 'µg/dL', 'ug/dL',
+    'µmol/L', 'umol/L', 'mmol/L', 'mIU/L', 'µIU/mL', 'uIU/mL', 'IU/L', 'U/L',
+    'mm/hr', 'mm', 'fL', 'pg', '%',
+]
+
+# A number, optionally a range or ratio such as "9.6-15.2", "3 - 5" or
+# "9:1-23:1", optionally followed by a unit. Longest units are tried first.
+NUMBER_TOKEN = re.compile(
+    r'\d+(?:\.\d+)?(?:\s*[-–:]\s*\d+(?:\.\d+)?)*'
+    r'(?:\s?(?:' + '|'.join(re.escape(unit) for unit in sorted(UNITS, key=len, reverse=True)) + r')(?![\w/]))?'
+)
+
+# Translators sometimes add spaces or change case inside a placeholder
+PLACEHOLDER_TOKEN = re.compile(r'__\s*NUM_\s*(\d+)\s*__', re.IGNORECASE)
+
+
+def protect_numbers(text):
+    """Swap every number token for a __NUM_i__ placeholder in one pass
+
+    Returns the protected text and the list of original tokens, indexed by i.
+    """
+    values = []
+
+    def substitute(match):
+        values.append(match.group(0))
+        return f'__NUM_{len(values) - 1}__'
+
+    return NUMBER_TOKEN.sub(substitute, text), values
+
+
+def restore_numbers(text, values):
+    """Put the original number tokens back in place of their placeholders"""
+    def substitute(match):
+        index = int(match.group(1))
+        return values[index] if index < len(values) else match.group(0)
+
+    return PLACEHOLDER_TOKEN.sub(substitute, text)
@@ -0,0 +1,162 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+import tracing
+
+# Fixed instructions; together with the report they form the cacheable prefix
+INSTRUCTIONS = """You are a medical assistant. Analyze the medical report and respond to the user's question in Tamil.
+
+Requirements:
+1. Respond only if the question relates to the medical report
+2. Keep the response under 500 words
+3. Use simple, non-medical language
+4. Focus on answering the specific question
+5. Avoid greetings, signatures, and repetitive headers
+6. respond in tamil
+"""
+
+
+def count_tokens(text):
+    """Rough token count (about four characters per token) for prompt accounting"""
+    return len(text) // 4 + 1
+
+
+def serialize_report(medical_report):
+    """Render the report compactly: one "test: value (reference)" line per row"""
+    if isinstance(medical_report, str):
+        return medical_report.strip()
+    lines = []
+    for row in medical_report:
+        if isinstance(row, dict) and 'test' in row:
+            line = f"{row['test']}: {row.get('value', '')}"
+            if row.get('reference'):
+                line += f" ({row['reference']})"
+            lines.append(line)
+        else:
+            lines.append(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+    return '\n'.join(lines)
+
+
+def build_prefix(medical_report):
+    """Stable part of every prompt: instructions followed by the report"""
+    return f"{INSTRUCTIONS}\nMedical Report:\n{serialize_report(medical_report)}\n"
+
+
+def build_question(english_text, conversation_history=None, report_rows=None):
+    """Per-question part of the prompt: relevant rows, history and the question itself"""
+    rows_text = ""
+    if report_rows is not None:
+        rows_text = f"Medical Report (results relevant to the question):\n{serialize_report(report_rows)}\n\n"
+    history_text = ""
+    if conversation_history:
+        history_text = "Previous conversation:\n" + "\n".join(conversation_history) + "\n\n"
+    return f"{rows_text}{history_text}User's question: {english_text}\n"
+
+
+def fingerprint(text):
+    """Content hash identifying a prompt prefix"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class PrefixCache:
+    """Send the report prefix once per report and only the question afterwards
+
+    The first question about a report stores the prefix with Gemini context
+    caching and keeps a model bound to that cached content; follow-up
+    questions then send just the delta. If the backend refuses to cache the
+    prefix (e.g. it is below the minimum cacheable size) the prefix is sent
+    inline, so answers never depend on caching succeeding.
+
+    Handles are recreated shortly before the cached content expires on the
+    server, or after a call through one fails; a refused create is retried
+    after retry_after seconds. At most max_models handles are kept, the
+    least recently used going first.
+    """
+
+    def __init__(self, genai_module, model_name='gemini-1.5-pro',
+                 cache_model_name='models/gemini-1.5-pro-002', ttl=datetime.timedelta(hours=1),
+                 max_models=64, retry_after=300.0):
+        self.genai = genai_module
+        self.cache_model_name = cache_model_name
+        self.ttl = ttl
+        self.max_models = max_models
+        self.retry_after = retry_after
+        self.model = genai_module.GenerativeModel(model_name)
+        self._prefixes = {}
+        # key -> (model or None, monotonic time after which it is not used)
+        self._cached_models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefix_for(self, medical_report):
+        """Serialize and hash a report once, then reuse the result"""
+        entry = self._prefixes.get(id(medical_report))
+        if entry is None or entry[0] is not medical_report:
+            prefix = build_prefix(medical_report)
+            entry = (medical_report, prefix, fingerprint(prefix))
+            if len(self._prefixes) >= 32:
+                self._prefixes.clear()
+            self._prefixes[id(medical_report)] = entry
+        return entry[1], entry[2]
+
+    def cached_model(self, prefix, key):
+        """Model bound to the cached prefix, or None when caching is unavailable"""
+        with self._lock:
+            entry = self._cached_models.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._cached_models.move_to_end(key)
+                return entry[0]
+        # Created outside the lock so other reports are not held up; a rare
+        # duplicate create for the same report is harmless
+        try:
+            cached = self.genai.caching.CachedContent.create(
+                model=self.cache_model_name,
+                display_name=f"report-{key[:16]}",
+                contents=[prefix],
+                ttl=self.ttl,
+            )
+            model = self.genai.GenerativeModel.from_cached_content(cached_content=cached)
+            # A minute's margin, so a handle is never used as the content expires
+            usable_for = max(self.ttl.total_seconds() - 60, self.ttl.total_seconds() / 2)
+        except Exception as e:
+            print(f"Context caching unavailable, sending report inline: {e}")
+            model, usable_for = None, self.retry_after
+        with self._lock:
+            self._cached_models[key] = (model, time.monotonic() + usable_for)
+            self._cached_models.move_to_end(key)
+            while len(self._cached_models) > self.max_models:
+                self._cached_models.popitem(last=False)
+        return model
+
+    def forget(self, key):
+        """Drop the handle for a prefix, so the next question creates a new one"""
+        with self._lock:
+            self._cached_models.pop(key, None)
+
+    def generate_content(self, medical_report, english_text, conversation_history=None, stream=False,
+                         report_rows=None):
+        """Ask Gemini a question about the report, reusing the cached prefix
+
+        When report_rows is given only those rows are sent, with the question,
+        and the prefix is just the instructions.
+        """
+        if report_rows is not None:
+            prefix = INSTRUCTIONS
+            key = fingerprint(prefix)
+        else:
+            prefix, key = self.prefix_for(medical_report)
+        question = build_question(english_text, conversation_history, report_rows)
+        model = self.cached_model(prefix, key)
+        if model is not None:
+            tracing.annotate(prefix_cached=True, prompt_tokens=count_tokens(question))
+            try:
+                return model.generate_content(question, stream=stream)
+            except Exception as e:
+                # The cached content may have expired or been deleted on the server
+                print(f"Cached prefix failed, sending report inline: {e}")
+                self.forget(key)
+        prompt = f"{prefix}\n{question}"
+        tracing.annotate(prefix_cached=False, prompt_tokens=count_tokens(prompt))
+        return self.model.generate_content(prompt, stream=stream)
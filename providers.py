@@ -0,0 +1,43 @@
+import threading
+
+# name -> function creating the client, and the clients created so far
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+
+def register(name, factory):
+    """Register how to create a client; nothing is imported or connected until get()"""
+    with _lock:
+        _factories[name] = factory
+
+
+def get(name):
+    """The client registered under name, created on first use"""
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"No provider registered for {name!r}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def override(name, instance):
+    """Use instance for name instead of creating it, e.g. a fake in tests and benchmarks"""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(name=None):
+    """Forget created clients (all of them, or one) so the next get() creates them again"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def loaded():
+    """Names of the clients created so far"""
+    with _lock:
+        return sorted(_instances)
@@ -0,0 +1,204 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from prompts import fingerprint
+from report_index import SYNONYMS, tokenize
+
+# Serve paraphrased questions from stored answers (SEMANTIC_CACHE=0 turns it off)
+SEMANTIC_CACHE = os.getenv('SEMANTIC_CACHE', '1') == '1'
+# Cosine similarity a past question needs to count as the same question
+THRESHOLD = float(os.getenv('SEMANTIC_THRESHOLD', '0.8'))
+DIMENSIONS = 1024
+
+# Words that do not change what is being asked
+STOPWORDS = {'a', 'an', 'the', 'is', 'are', 'am', 'was', 'it', 'this', 'that', 'my', 'mine', 'i', 'me',
+             'do', 'does', 'too', 'very', 'really', 'please', 'tell', 'about', 'of', 'in', 'to', 'so',
+             'en', 'ta', 'என்', 'எனது', 'என்னுடைய'}
+# Question words whose direction must agree for two questions to match
+POLARITY = {
+    'high': 'high', 'higher': 'high', 'elevated': 'high', 'increased': 'high', 'excess': 'high',
+    'low': 'low', 'lower': 'low', 'decreased': 'low', 'deficient': 'low', 'deficiency': 'low',
+    'அதிகம்': 'high', 'அதிகமா': 'high', 'அதிகமாக': 'high', 'குறைவு': 'low', 'குறைவா': 'low', 'குறைவாக': 'low',
+}
+# Words that turn a question around ("what should I not eat")
+NEGATIONS = {'not', 'no', 'never', 'avoid', 'without', 'don', 'dont', 'shouldn', 'cannot', 'வேண்டாம்', 'கூடாது'}
+# Terms that name tests; two questions about different tests never match
+TEST_TERMS = {term for terms in SYNONYMS.values() for term in terms}
+
+
+def normalize(question):
+    """Lower-case words of the question without punctuation or filler words"""
+    return ' '.join(token for token in tokenize(question) if token not in STOPWORDS)
+
+
+def test_term(token):
+    """The test a question word names ('கொலஸ்ட்ரால்' and 'cholesterol' both name cholesterol), or None"""
+    synonyms = SYNONYMS.get(token) or (SYNONYMS.get(token[:-1]) if token.endswith('s') else None)
+    if synonyms:
+        return synonyms[0]
+    return token if token in TEST_TERMS else None
+
+
+def test_terms(tokens):
+    """The tests a question names, in order of mention
+
+    "non hdl" (or "non-hdl") names non-HDL, not HDL; words mixing letters and
+    digits (b6, b12, d3, hba1c) and the letter after "vitamin" name their
+    own test.
+    """
+    terms = []
+    for i, token in enumerate(tokens):
+        previous = tokens[i - 1] if i else ''
+        if token == 'non':
+            continue
+        if previous == 'vitamin' or (any(c.isdigit() for c in token) and not token.isdigit()):
+            term = token
+        else:
+            term = test_term(token)
+        if term is None and token.startswith('non') and test_term(token[3:]):
+            term = f"non-{test_term(token[3:])}"
+        elif term is not None and previous == 'non':
+            term = f"non-{term}"
+        if term is not None:
+            terms.append(term)
+    return terms
+
+
+def signature(question):
+    """The tests named, the direction asked about and any negation, which must agree exactly
+
+    For a ratio the order of its operands counts too, so "hdl/ldl ratio"
+    never matches "ldl/hdl ratio".
+    """
+    tokens = tokenize(question)
+    terms = test_terms(tokens)
+    ratio = tuple(terms) if 'ratio' in tokens or 'ratios' in tokens else ()
+    polarity = frozenset(POLARITY[token] for token in tokens if token in POLARITY)
+    return frozenset(terms), ratio, polarity, any(token in NEGATIONS for token in tokens)
+
+
+def embed(question, dimensions=DIMENSIONS):
+    """Unit vector of hashed character 3- and 4-grams and whole words of the normalized question
+
+    Each feature is hashed with CRC32 to a bucket and a sign, so no
+    vocabulary or model is needed and the same question always gets the
+    same vector.
+    """
+    import numpy as np
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in normalize(question).split():
+        padded = f" {word} "
+        features = [word] + [padded[i:i + n] for n in (3, 4) for i in range(len(padded) - n + 1)]
+        for feature in features:
+            h = zlib.crc32(feature.encode('utf-8'))
+            vector[h % dimensions] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def template_key(medical_report):
+    """Reports listing the same tests share a template, whatever their values"""
+    if isinstance(medical_report, str):
+        return fingerprint(medical_report)
+    names = sorted({str(row.get('test', '')).upper() for row in medical_report or [] if isinstance(row, dict)})
+    return fingerprint('\n'.join(names))
+
+
+class _Partition:
+    """Questions of one template with their vectors as rows of a matrix"""
+
+    def __init__(self, dimensions):
+        import numpy as np
+        self.questions = []
+        self.signatures = []
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+
+
+class QuestionIndex:
+    """Past questions per report template, searched by cosine similarity on the CPU
+
+    Questions are embedded with embed() and compared with one NumPy
+    matrix-vector product per search. A past question matches when its
+    similarity is at least threshold and it names the same tests in the
+    same direction ("is my LDL high" never matches "is my HDL low"), with
+    both or neither negated and a ratio's operands in the same order.
+    Insertion is incremental; each template keeps its max_questions most
+    recent questions and only the max_templates most recently used
+    templates stay in memory. With a store (e.g. a SQLiteCache) the
+    questions of a template are saved on every insertion and reloaded on
+    first use; vectors are recomputed rather than stored.
+    """
+
+    def __init__(self, store=None, threshold=THRESHOLD, dimensions=DIMENSIONS, max_questions=256,
+                 max_templates=256):
+        self.store = store
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.max_questions = max_questions
+        self.max_templates = max_templates
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _partition(self, template):
+        import numpy as np
+        partition = self._partitions.get(template)
+        if partition is None:
+            partition = _Partition(self.dimensions)
+            saved = self.store.get(template) if self.store is not None else None
+            if saved:
+                partition.questions = list(saved)
+                partition.signatures = [signature(question) for question in saved]
+                partition.vectors = np.stack([embed(question, self.dimensions) for question in saved])
+            self._partitions[template] = partition
+            while len(self._partitions) > self.max_templates:
+                self._partitions.popitem(last=False)
+        self._partitions.move_to_end(template)
+        return partition
+
+    def add(self, template, question):
+        """Index a question asked about a report with this template
+
+        The question is stored as given, so callers can pass the form they
+        use as a cache key.
+        """
+        import numpy as np
+        if not normalize(question):
+            return
+        with self._lock:
+            partition = self._partition(template)
+            if question in partition.questions:
+                return
+            partition.questions.append(question)
+            partition.signatures.append(signature(question))
+            partition.vectors = np.vstack([partition.vectors, embed(question, self.dimensions)])
+            if len(partition.questions) > self.max_questions:
+                drop = len(partition.questions) - self.max_questions
+                del partition.questions[:drop]
+                del partition.signatures[:drop]
+                partition.vectors = partition.vectors[drop:]
+            if self.store is not None:
+                self.store.put(template, list(partition.questions))
+
+    def search(self, template, question, k=3):
+        """Up to k (past question, similarity) pairs that match, most similar first"""
+        import numpy as np
+        if not normalize(question):
+            return []
+        with self._lock:
+            partition = self._partition(template)
+            if not partition.questions:
+                return []
+            scores = partition.vectors @ embed(question, self.dimensions)
+            wanted = signature(question)
+            matches = []
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold or len(matches) == k:
+                    break
+                if partition.signatures[i] == wanted:
+                    matches.append((partition.questions[i], float(scores[i])))
+            return matches
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(partition.questions) for partition in self._partitions.values())
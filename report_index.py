@@ -0,0 +1,138 @@
+import math
+import os
+import re
+from collections import Counter
+from lab_results import LabResult
+
+# Set RELEVANCE_FILTER=0 to send every row again (for A/B comparison)
+RELEVANCE_FILTER = os.getenv('RELEVANCE_FILTER', '1') == '1'
+# Reports up to this many rows are sent whole, as part of the prefix PrefixCache
+# caches; only larger panels are filtered per question, trading that cached
+# prefix (just the instructions remain, too short to cache) for fewer rows sent
+RELEVANCE_MIN_ROWS = int(os.getenv('RELEVANCE_MIN_ROWS', '50'))
+
+# Question words (English and Tamil) expanded to the terms used in test names
+SYNONYMS = {
+    'cholesterol': ['cholesterol', 'ldl', 'hdl'],
+    'கொலஸ்ட்ரால்': ['cholesterol', 'ldl', 'hdl'],
+    'கொழுப்பு': ['cholesterol', 'triglycerides', 'ldl', 'hdl'],
+    'fat': ['cholesterol', 'triglycerides'],
+    'lipid': ['cholesterol', 'triglycerides', 'ldl', 'hdl'],
+    'heart': ['cholesterol', 'ldl', 'hdl', 'triglycerides', 'crp', 'homocysteine'],
+    'இதயம்': ['cholesterol', 'ldl', 'hdl', 'triglycerides', 'crp', 'homocysteine'],
+    'sugar': ['glucose', 'hba1c'],
+    'diabetes': ['glucose', 'hba1c'],
+    'சர்க்கரை': ['glucose', 'hba1c'],
+    'நீரிழிவு': ['glucose', 'hba1c'],
+    'kidney': ['creatinine', 'urea', 'bun', 'uric'],
+    'சிறுநீரகம்': ['creatinine', 'urea', 'bun', 'uric'],
+    'liver': ['sgot', 'sgpt', 'aspartate', 'alanine', 'bilirubin', 'albumin', 'globulin'],
+    'கல்லீரல்': ['sgot', 'sgpt', 'aspartate', 'alanine', 'bilirubin', 'albumin', 'globulin'],
+    'inflammation': ['crp', 'esr', 'sedimentation'],
+    'வீக்கம்': ['crp', 'esr', 'sedimentation'],
+    'thyroid': ['tsh', 't3', 't4', 'thyroid'],
+    'தைராய்டு': ['tsh', 't3', 't4', 'thyroid'],
+    'vitamin': ['vitamin'],
+    'வைட்டமின்': ['vitamin'],
+    'டி': ['d'],
+    'blood': ['haemoglobin', 'hemoglobin', 'platelet', 'rbc', 'wbc'],
+    'இரத்தம்': ['haemoglobin', 'hemoglobin', 'platelet', 'rbc', 'wbc'],
+    'ரத்த': ['haemoglobin', 'hemoglobin', 'platelet', 'rbc', 'wbc'],
+    'hemoglobin': ['haemoglobin', 'hemoglobin'],
+    'haemoglobin': ['haemoglobin', 'hemoglobin'],
+    'ஹீமோகுளோபின்': ['haemoglobin', 'hemoglobin'],
+    'bone': ['vitamin', 'calcium'],
+    'எலும்பு': ['vitamin', 'calcium'],
+    'platelets': ['platelet'],
+    'triglyceride': ['triglycerides'],
+}
+
+# Tamil vowel signs are not \w, so the Tamil block is matched explicitly
+TOKEN = re.compile(r'[\w\u0B80-\u0BFF]+')
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN.findall(text)]
+
+
+def expand(tokens):
+    """Question tokens plus the test-name terms their synonyms point to"""
+    expanded = list(tokens)
+    for token in tokens:
+        synonyms = SYNONYMS.get(token)
+        # "kidneys", "lipids"
+        if synonyms is None and token.endswith('s'):
+            synonyms = SYNONYMS.get(token[:-1])
+        expanded += synonyms or []
+    return expanded
+
+
+class ReportIndex:
+    """BM25 index over the rows of one report"""
+
+    def __init__(self, medical_report, k1=1.2, b=0.75):
+        self.rows = [row for row in medical_report if isinstance(row, dict)]
+        self.k1 = k1
+        self.b = b
+        self.documents = [Counter(tokenize(str(row.get('test', '')))) for row in self.rows]
+        lengths = [sum(document.values()) for document in self.documents]
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        frequencies = Counter(term for document in self.documents for term in document)
+        count = len(self.documents)
+        self.idf = {term: math.log(1 + (count - n + 0.5) / (n + 0.5)) for term, n in frequencies.items()}
+        self.abnormal = [LabResult.from_dict(row).is_abnormal for row in self.rows]
+
+    def scores(self, question):
+        terms = expand(tokenize(question))
+        scores = []
+        for document, length in zip(self.documents, self.lengths):
+            score = 0.0
+            for term in terms:
+                frequency = document.get(term)
+                if frequency:
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / self.average_length)
+                    score += self.idf[term] * frequency * (self.k1 + 1) / norm
+            scores.append(score)
+        return scores
+
+    def select(self, question, k=5, include_abnormal=True):
+        """Top-k relevant rows plus abnormal rows, in report order
+
+        Returns None when no row matches the question at all (e.g. "explain
+        my report"), meaning the whole report should be sent.
+        """
+        scores = self.scores(question)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        if not ranked:
+            return None
+        chosen = set(ranked[:k])
+        if include_abnormal:
+            chosen.update(i for i, abnormal in enumerate(self.abnormal) if abnormal)
+        return [self.rows[i] for i in sorted(chosen)]
+
+
+_indexes = {}
+
+
+def index_for(medical_report):
+    """Build the index for a report once and reuse it for later questions"""
+    entry = _indexes.get(id(medical_report))
+    if entry is None or entry[0] is not medical_report:
+        if len(_indexes) >= 32:
+            _indexes.clear()
+        entry = (medical_report, ReportIndex(medical_report))
+        _indexes[id(medical_report)] = entry
+    return entry[1]
+
+
+def relevant_rows(medical_report, question, k=5):
+    """Rows to send with a question, or None to send the whole report
+
+    Reports of up to RELEVANCE_MIN_ROWS rows and free-text reports are
+    always sent whole, so they stay in the cached prefix.
+    """
+    if (not RELEVANCE_FILTER or isinstance(medical_report, str)
+            or len(medical_report) <= max(RELEVANCE_MIN_ROWS, 2 * k)):
+        return None
+    return index_for(medical_report).select(question, k)
@@ -0,0 +1,177 @@
+import json
+import re
+
+# Bumped whenever parsing changes, so cached parse results are not reused
+PARSER_VERSION = 3
+
+# A whole number: never the tail or head of a longer one ("40-60" is not 4 and 0-60)
+NUM = r'(?<![\d.])\d+(?:\.\d+)?(?!\d)'
+# "mg/dL", "%", "Ratio", "10^3/µL", "mill/cu.mm"
+UNIT = r'(?:10\^\d+/[\wµ.]+|[A-Za-zµ%][\wµ%]*(?:\.\w+)*(?:/[\wµ.]+)?)(?![\wµ%/])'
+# Units that can open a row, where the unit column comes first ("mm / hr", "Ratio")
+LEADING_UNIT = r'(?:%|Ratio|fL|10\^\d+/[\wµ.]+|[A-Za-zµ]+(?:\.\w+)?[ \t]*/[ \t]*[A-Za-zµ.]+)(?=[ \t])'
+# Qualitative results
+QUALITATIVE = r'(?:Negative|Positive|Nil|Absent|Present|Non[- ]?Reactive|Reactive|Normal|Trace)'
+# A word of a test name: anything but a bare number, a colon or a comparison sign
+WORD = r'(?:[^\s:<>\d][^\s:<>]*|\d[\d.]*[^\s\d.:<>][^\s:<>]*)'
+# Header and patient-detail rows that look like results
+NOISE = (r'(?:age|sex|gender|date|time|page|patient|name|ref(?:erred)?|sample|collected|received|'
+         r'reported|registered|lab|phone|mobile|tel|id|barcode|visit|bill|uhid|mrn)\b')
+
+# A reference range as printed, with an optional label such as "Adult :"
+# and unit; its bounds and unit are captured so rows need no second pass
+REFERENCE = rf'''(?P<reference>(?:[A-Za-z]+[ \t]*:[ \t]*)?
+    (?:(?P<low>{NUM})(?::1)?[ \t]*[-–][ \t]*(?P<high>{NUM})(?::1)?
+      |(?P<op>[<>≤≥]=?|up[ \t]?to|less[ \t]than|more[ \t]than)[ \t]*(?P<limit>{NUM}))
+    (?:[ \t]*(?P<ref_unit>{UNIT}))?)'''
+
+# The result: a number (captured alone in 'number') or a qualitative word
+VALUE = rf'(?P<value>[<>]?[ \t]?(?P<number>{NUM})|{QUALITATIVE})'
+
+# What follows the value: optional flag and unit, optional reference range
+# (bare or in parentheses)
+TAIL = rf'''
+    (?:[ \t]*(?P<flag>\(?(?:H|L|High|Low|\*)\)?)(?=[ \t]|$))?
+    (?:[ \t]+(?P<unit>{UNIT}))?
+    (?:[ \t]*\(?[ \t]*{REFERENCE}[ \t]*\)?)?
+    [ \t]*$'''
+
+# One result row: test name, value, then the tail. Rows may be
+# "Test: Value (Reference)" or whitespace separated columns as in printed
+# lab tables. The test name is whole words up to the first bare number and
+# is never backtracked into, which keeps the common case fast; a unit
+# followed by a number starts a unit-first row instead.
+ROW = re.compile(
+    rf'''[ \t]*
+    (?!{NOISE}|{LEADING_UNIT}[ \t]+{NUM}[ \t])
+    (?P<test>(?>{WORD}(?:[ \t]+{WORD})*))(?<=[A-Za-z)\]])
+    [ \t]*(?::[ \t]*|[ \t]+)
+    {VALUE}
+    {TAIL}''',
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Summary tables printed unit first: "mg/dL 35 HDL CHOLESTEROL - DIRECT 40-60"
+UNIT_FIRST_ROW = re.compile(
+    rf'''[ \t]*
+    (?P<unit>{LEADING_UNIT})[ \t]+
+    {VALUE}[ \t]+
+    (?!{NOISE})(?P<test>[A-Za-z0-9(][^\n]*?[A-Za-z)\]])[ \t]+
+    {REFERENCE}(?P<flag>)
+    [ \t]*$''',
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Test names with numbers of their own ("VITAMIN B 12 250 pg/mL 200-900"),
+# tried last because it backtracks through the whole name
+LOOSE_ROW = re.compile(
+    rf'''[ \t]*
+    (?!{NOISE}|{LEADING_UNIT}[ \t]+{NUM}[ \t])
+    (?P<test>[A-Za-z0-9(][^\n:]*?[A-Za-z)\]])
+    [ \t]*(?::[ \t]*|[ \t]+)
+    {VALUE}
+    {TAIL}''',
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Groups every row pattern fills, in the order parse_report unpacks them
+FIELDS = ('test', 'value', 'number', 'flag', 'unit', 'reference', 'low', 'high', 'op', 'limit', 'ref_unit')
+
+REFERENCE_RANGE = re.compile(rf'(?P<low>{NUM})(?::1)?\s*[-–]\s*(?P<high>{NUM})')
+REFERENCE_BOUND = re.compile(rf'(?P<op>[<>≤≥]=?|up\s?to|less than|more than)\s*(?P<limit>{NUM})', re.IGNORECASE)
+REFERENCE_UNIT = re.compile(rf'(?:{NUM}(?::1)?)\s*(?P<unit>{UNIT})\s*$')
+LEADING_NUMBER = re.compile(NUM)
+
+
+def bounds(op, limit):
+    """(low, high) for a one-sided reference such as < 100 or > 0.40"""
+    limit = float(limit)
+    if op.lower() in ('>', '>=', '≥', 'more than'):
+        return limit, None
+    return None, limit
+
+
+def parse_reference(reference):
+    """Numeric (low, high) bounds of a reference range; either may be None"""
+    if not reference:
+        return None, None
+    match = REFERENCE_RANGE.search(reference)
+    if match:
+        return float(match.group('low')), float(match.group('high'))
+    match = REFERENCE_BOUND.search(reference)
+    if match:
+        return bounds(match.group('op'), match.group('limit'))
+    return None, None
+
+
+def parse_value(value):
+    """Float for a numeric result such as "176" or "< 0.5", else None"""
+    match = LEADING_NUMBER.search(value or "")
+    return float(match.group(0)) if match else None
+
+
+def flag_for(value, low, high):
+    """'H' above the reference range, 'L' below it, '' inside or unknown"""
+    if value is None:
+        return ''
+    if high is not None and value > high:
+        return 'H'
+    if low is not None and value < low:
+        return 'L'
+    return ''
+
+
+def normalize_flag(flag):
+    flag = (flag or '').strip('() ').upper()
+    return {'HIGH': 'H', 'LOW': 'L', '*': 'H'}.get(flag, flag)
+
+
+def parse_report(text):
+    """Parse report text into result rows, one line at a time over all pages
+
+    Each row has 'test', 'value' and 'reference' (as the original parser
+    produced) plus 'unit', 'ref_low', 'ref_high' and 'flag'.
+    """
+    report = []
+    for line in text.splitlines():
+        match = ROW.match(line) or UNIT_FIRST_ROW.match(line) or LOOSE_ROW.match(line)
+        if match is None:
+            continue
+        test, value, number, flag, unit, reference, low, high, op, limit, ref_unit = match.group(*FIELDS)
+        if '  ' in test or '\t' in test:
+            test = ' '.join(test.split())
+        if number is not None:
+            value = ' '.join(value.split()) if value != number else value
+            number = float(number)
+        if reference:
+            reference = ' '.join(reference.split())
+            if low is not None:
+                low, high = float(low), float(high)
+            else:
+                low, high = bounds(op, limit)
+            # A unit printed after the range belongs to the value too
+            if not unit:
+                unit = ref_unit
+            elif not ref_unit:
+                reference = f"{reference} {unit}"
+        report.append({
+            'test': test,
+            'value': value,
+            'reference': reference,
+            'unit': unit,
+            'ref_low': low,
+            'ref_high': high,
+            'flag': normalize_flag(flag) if flag else flag_for(number, low, high),
+        })
+    return report
+
+
+def parse_medical_report(text):
+    """Parse medical report text (JSON or lab report text) into result rows"""
+    stripped = text.strip()
+    if stripped[:1] in ('[', '{'):
+        try:
+            return json.loads(stripped)
+        except json.JSONDecodeError:
+            pass
+    return parse_report(text)
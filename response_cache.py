@@ -0,0 +1,109 @@
+import hashlib
+import os
+import re
+import threading
+from cache import LRUCache, SQLiteCache, cache_dir
+from prompts import fingerprint, serialize_report
+from question_index import SEMANTIC_CACHE, QuestionIndex, template_key
+import tracing
+
+
+def normalize_question(question):
+    """Lower-case the question and drop punctuation and extra whitespace"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', question.lower()).split())
+
+
+def history_digest(conversation_history):
+    """Short hash of the history lines the answer was generated with"""
+    return hashlib.sha256("\n".join(conversation_history or []).encode('utf-8')).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Finished answers (English, Tamil and MP3 audio) for repeat questions
+
+    Entries are keyed by the report fingerprint, the normalized English
+    question and a digest of the conversation history, so structurally
+    identical reports share answers. backend is 'memory' for an in-process
+    LRU or 'disk' for a SQLite store that survives restarts. With semantic
+    matching a question that misses is looked up again under the most
+    similar past questions asked about reports of the same template (see
+    question_index.py), so paraphrases are answered without Gemini. The
+    SQLite files are opened on first use, not when the cache is built.
+    """
+
+    def __init__(self, backend='memory', path=None, max_entries=512, ttl=24 * 3600, semantic=SEMANTIC_CACHE):
+        if backend not in ('memory', 'disk'):
+            raise ValueError(f"Unknown response cache backend: {backend}")
+        self.backend = backend
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic = semantic
+        self._store = None
+        self._index = None
+        self._open_lock = threading.Lock()
+        self.semantic_hits = 0
+
+    def _open(self):
+        """Create the answer store and question index the first time either is needed"""
+        with self._open_lock:
+            if self._store is not None:
+                return
+            path = None
+            if self.backend == 'disk':
+                path = self.path or os.path.join(cache_dir(), 'responses.sqlite3')
+                store = SQLiteCache(path, max_entries=self.max_entries, ttl=self.ttl)
+            else:
+                store = LRUCache(max_entries=self.max_entries, ttl=self.ttl)
+            if self.semantic:
+                # The index is kept next to the answers, so both survive restarts or neither does
+                questions = None
+                if path is not None:
+                    questions = SQLiteCache(os.path.splitext(path)[0] + '-questions.sqlite3', max_entries=1000)
+                self._index = QuestionIndex(questions)
+            self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._open()
+        return self._store
+
+    @property
+    def index(self):
+        if self._store is None:
+            self._open()
+        return self._index
+
+    def key(self, medical_report, english_question, conversation_history=None):
+        report_key = fingerprint(serialize_report(medical_report))
+        return f"{report_key}:{history_digest(conversation_history)}:{normalize_question(english_question)}"
+
+    def get(self, medical_report, english_question, conversation_history=None):
+        """Cached {'english', 'tamil', 'audio'} answer, or None"""
+        with tracing.span('response_cache') as span:
+            answer = self.store.get(self.key(medical_report, english_question, conversation_history))
+            if answer is None and self.index is not None:
+                for question, similarity in self.index.search(template_key(medical_report),
+                                                              normalize_question(english_question)):
+                    answer = self.store.get(self.key(medical_report, question, conversation_history))
+                    if answer is not None:
+                        self.semantic_hits += 1
+                        span.set(matched=question, similarity=round(similarity, 3))
+                        break
+            span.set(hit=answer is not None)
+        return answer
+
+    def put(self, medical_report, english_question, conversation_history, english, tamil, audio):
+        self.store.put(
+            self.key(medical_report, english_question, conversation_history),
+            {'english': english, 'tamil': tamil, 'audio': audio},
+        )
+        if self.index is not None:
+            self.index.add(template_key(medical_report), normalize_question(english_question))
+
+    def stats(self):
+        stats = self.store.stats()
+        if self.index is not None:
+            stats = dict(stats, semantic_hits=self.semantic_hits, questions=len(self.index))
+        return stats
@@ -0,0 +1,254 @@
+import re
+import threading
+import time
+from lab_results import LabReport
+import tracing
+
+# Everyday names for tests, mapped to a pattern over report test names
+ALIASES = {
+    'cholesterol': r'^TOTAL CHOLESTEROL',
+    'total cholesterol': r'^TOTAL CHOLESTEROL',
+    'ldl': r'^LDL CHOLESTEROL',
+    'ldl cholesterol': r'^LDL CHOLESTEROL',
+    'bad cholesterol': r'^LDL CHOLESTEROL',
+    'hdl': r'^HDL CHOLESTEROL',
+    'hdl cholesterol': r'^HDL CHOLESTEROL',
+    'good cholesterol': r'^HDL CHOLESTEROL',
+    'non hdl': r'^NON-HDL',
+    'non hdl cholesterol': r'^NON-HDL',
+    'triglycerides': r'TRIGLYCERIDE',
+    'vitamin d': r'VITAMIN D',
+    'vitamin b12': r'B12',
+    'b12': r'B12',
+    'sugar': r'GLUCOSE',
+    'glucose': r'GLUCOSE',
+    'hba1c': r'HBA1C|GLYCATED',
+    'hemoglobin': r'HA?EMOGLOBIN',
+    'haemoglobin': r'HA?EMOGLOBIN',
+    'crp': r'C-REACTIVE PROTEIN',
+    'esr': r'SEDIMENTATION',
+    'urea': r'^UREA',
+    'bun': r'UREA NITROGEN',
+    'creatinine': r'^(?:SERUM )?CREATININE',
+    'sgot': r'SGOT|ASPARTATE',
+    'ast': r'SGOT|ASPARTATE',
+    'sgpt': r'SGPT|ALANINE',
+    'alt': r'SGPT|ALANINE',
+    'platelet': r'PLATELET COUNT',
+    'homocysteine': r'HOMOCYSTEINE',
+    'globulin': r'GLOBULIN',
+    'tsh': r'TSH|THYROID STIMULATING',
+    'thyroid': r'TSH|THYROID STIMULATING',
+    'uric acid': r'URIC ACID',
+    'iron': r'^(?:SERUM )?IRON',
+}
+ALIAS_PATTERNS = {alias: re.compile(pattern) for alias, pattern in ALIASES.items()}
+
+RANGE_QUESTION = re.compile(
+    r'\b(normal|high|higher|low|lower|ok|okay|fine|within|range|elevated|abnormal|good|bad|'
+    r'increased|decreased|too much|too little)\b'
+)
+ABNORMAL_QUESTION = re.compile(
+    r'\b(which|what|any|list|all)\b.*\b(abnormal|out of range|not normal|high|low|problems?|wrong)\b'
+    r'|\b(abnormal|out of range)\b.*\b(tests?|values?|results?|report)\b'
+    r'|\b(tests?|values?|results?|report)\b.*\b(normal|ok|okay|fine)\b'
+)
+# Anything asking for explanation or advice goes to Gemini
+OPEN_QUESTION = re.compile(
+    r'\b(why|how|should|eat|food|diet|reduce|increase|treat|treatment|medicine|cause|causes|'
+    r'dangerous|danger|risk|mean|means|explain|do i|can i|symptoms?)\b'
+)
+# Organs and panels ("kidney", "lipid profile") cover several rows the report does not group
+PANEL_QUESTION = re.compile(
+    r'\b(kidneys?|renal|liver|hepatic|heart|cardiac|lipids?|cbc|blood count|panel|profile|function|organs?)\b'
+)
+ABBREVIATION = re.compile(r'\(([A-Z0-9-]{2,})\s*\)')
+# Words of a ratio's operands that do not tell ratios apart
+RATIO_FILLER = {'cholesterol', 'sr', 'serum', 'direct', 'ratio'}
+
+UNIT_FREE = {'Ratio', None}
+
+
+def normalize(text):
+    return ' '.join(re.sub(r'[^\w\s-]', ' ', text.lower()).split())
+
+
+def name_words(text):
+    """Normalized text with hyphens as spaces, so "non-hdl" and "non hdl" read the same"""
+    return ' '.join(normalize(text).replace('-', ' ').split())
+
+
+def mentions(name, question):
+    """Spans where the question names name, except right after "non" ("non hdl" is not HDL)"""
+    return [match.span() for match in re.finditer(rf'\b{re.escape(name)}\b', question)
+            if not question[:match.start()].endswith('non ')]
+
+
+def find_ratio(question, report):
+    """The one ratio row whose two operands the question names in order, else []
+
+    "hdl to ldl ratio" is the HDL / LDL row and never the LDL / HDL one; an
+    operand is named by one of its words or a word it abbreviates ("trig"
+    for "triglycerides").
+    """
+    words = question.split()
+
+    def position(side):
+        keys = [key for key in normalize(side).split() if len(key) > 1 and key not in RATIO_FILLER]
+        return min((i for i, word in enumerate(words) if any(word.startswith(key) for key in keys)), default=None)
+
+    found = []
+    for result in report:
+        left, slash, right = result.test.upper().partition('/')
+        if not slash or 'RATIO' not in right:
+            continue
+        start, end = position(left), position(right)
+        if start is not None and end is not None and start < end:
+            found.append(result)
+    return found if len(found) == 1 else []
+
+
+def find_tests(question, report):
+    """Results the question names, by test name, abbreviation or everyday alias
+
+    Longer mentions win over shorter ones inside them, so "ldl cholesterol"
+    means the LDL row and not also total cholesterol, and a name right after
+    "non" does not count, so "non-HDL" is never the HDL row. A question about
+    a ratio gets only the matching ratio row, never its operands' own rows.
+    """
+    question = name_words(question)
+    if 'ratio' in question:
+        return find_ratio(question, report)
+    results = [r for r in report if 'RATIO' not in r.test.upper()]
+    candidates = []
+    for result in results:
+        names = [name_words(result.test)]
+        names += [name_words(abbreviation) for abbreviation in ABBREVIATION.findall(result.test)]
+        for name in names:
+            for span in mentions(name, question):
+                candidates.append((span, [result]))
+    for alias, pattern in ALIAS_PATTERNS.items():
+        matched = None
+        for span in mentions(alias, question):
+            if matched is None:
+                matched = [r for r in results if pattern.search(r.test.upper())]
+            if matched:
+                candidates.append((span, matched))
+
+    taken = []
+    found = []
+    for (start, end), matched in sorted(candidates, key=lambda c: c[0][0] - c[0][1]):
+        if any(start < taken_end and taken_start < end for taken_start, taken_end in taken):
+            continue
+        taken.append((start, end))
+        found += [r for r in matched if r not in found]
+    return found
+
+
+def describe(result):
+    unit = '' if result.unit in UNIT_FREE else f" {result.unit}"
+    return f"{result.raw_value}{unit}"
+
+
+def range_answer(result):
+    """English and Tamil sentences comparing one result with its reference range"""
+    value = describe(result)
+    reference = result.reference
+    if result.flag == 'H':
+        return (f"Your {result.test} is {value}, which is higher than the normal range ({reference}).",
+                f"உங்கள் {result.test} அளவு {value}. இது இயல்பான வரம்பை ({reference}) விட அதிகமாக உள்ளது.")
+    if result.flag == 'L':
+        return (f"Your {result.test} is {value}, which is lower than the normal range ({reference}).",
+                f"உங்கள் {result.test} அளவு {value}. இது இயல்பான வரம்பை ({reference}) விட குறைவாக உள்ளது.")
+    return (f"Your {result.test} is {value}, which is within the normal range ({reference}).",
+            f"உங்கள் {result.test} அளவு {value}. இது இயல்பான வரம்பிற்குள் ({reference}) உள்ளது.")
+
+
+def abnormal_answer(report):
+    abnormal = report.abnormal()
+    if not abnormal:
+        return ("All your results are within the normal range.",
+                "உங்கள் அனைத்து முடிவுகளும் இயல்பான வரம்பிற்குள் உள்ளன.")
+    english = [f"{r.test} ({describe(r)}, {'high' if r.flag == 'H' else 'low'})" for r in abnormal]
+    tamil = [f"{r.test} ({describe(r)}, {'அதிகம்' if r.flag == 'H' else 'குறைவு'})" for r in abnormal]
+    return ("These results are outside the normal range: " + "; ".join(english) + ".",
+            "இயல்பான வரம்பிற்கு வெளியே உள்ள முடிவுகள்: " + "; ".join(tamil) + ".")
+
+
+class RuleEngine:
+    """Deterministic answers to simple range questions, so Gemini is not called
+
+    answer() returns (english, tamil) when the question is a plain "is X
+    normal?" about tests with a parsed reference range, or asks which results
+    are abnormal; otherwise None. Call record_llm() with the time the Gemini
+    path took so the latency saved by local answers can be estimated.
+    """
+
+    DOCTOR = ("Please discuss these results with your doctor.",
+              "மேலும் விவரங்களுக்கு உங்கள் மருத்துவரை அணுகவும்.")
+
+    def __init__(self):
+        self.questions = 0
+        self.hits = 0
+        self.rule_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def answer(self, english_question, medical_report):
+        started = time.perf_counter()
+        with tracing.span('rules') as span:
+            result = self._answer(english_question, medical_report)
+            span.set(hit=result is not None)
+        with self._lock:
+            self.questions += 1
+            if result is not None:
+                self.hits += 1
+                self.rule_seconds += time.perf_counter() - started
+        return result
+
+    def _answer(self, english_question, medical_report):
+        if not medical_report or isinstance(medical_report, str):
+            return None
+        question = normalize(english_question)
+        # Without a map from organs to their tests, Gemini picks the rows
+        if OPEN_QUESTION.search(question) or PANEL_QUESTION.search(question):
+            return None
+        report = LabReport.from_dicts(row for row in medical_report if isinstance(row, dict))
+
+        tests = find_tests(question, report)
+        # A ratio question is answered from that ratio's row or not at all
+        if 'ratio' in question and not tests:
+            return None
+        if ABNORMAL_QUESTION.search(question) and not tests:
+            sentences = [abnormal_answer(report)]
+        elif RANGE_QUESTION.search(question):
+            # Only answer when every matched test has a value and a parsed range
+            if not tests or any(t.value is None or (t.ref_low is None and t.ref_high is None) for t in tests):
+                return None
+            sentences = [range_answer(t) for t in tests]
+        else:
+            return None
+
+        sentences.append(self.DOCTOR)
+        return (' '.join(english for english, _ in sentences),
+                ' '.join(tamil for _, tamil in sentences))
+
+    def record_llm(self, seconds):
+        """Record how long a question answered by Gemini took"""
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def stats(self):
+        """Hit rate and estimated latency saved by answering locally"""
+        with self._lock:
+            llm_average = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+            rule_average = self.rule_seconds / self.hits if self.hits else 0.0
+            return {
+                'questions': self.questions,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.questions if self.questions else 0.0,
+                'llm_average_seconds': llm_average,
+                'seconds_saved': self.hits * max(0.0, llm_average - rule_average),
+            }
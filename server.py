@@ -0,0 +1,677 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from cache import SQLiteCache, cache_dir
+from history import ConversationHistory
+from lab_results import LabReport
+from main import (find_answer, gemini_failed, translate_tamil_to_english, translate_english_to_tamil,
+                  stream_with_gemini, synthesize_speech, response_cache, rule_engine, speculator)
+from pdf_text import extract_text_from_pdf
+from pipeline import run_streaming_pipeline
+from prompts import fingerprint, serialize_report
+import providers
+from report_parser import PARSER_VERSION, parse_medical_report
+from services import Services, get_services, set_services
+import tracing
+
+# Where the processing server listens
+HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+PORT = int(os.getenv('SERVER_PORT', '8600'))
+# Worker threads answering questions, and jobs allowed to wait for one before clients get 503
+WORKERS = int(os.getenv('SERVER_WORKERS', '32'))
+MAX_PENDING = int(os.getenv('SERVER_MAX_PENDING', '64'))
+# Sessions idle this many seconds are dropped; the oldest go first beyond MAX_SESSIONS
+SESSION_TTL = float(os.getenv('SESSION_TTL', '1800'))
+MAX_SESSIONS = int(os.getenv('MAX_SESSIONS', '1000'))
+MAX_BODY = int(os.getenv('SERVER_MAX_BODY', str(20 * 1024 * 1024)))
+
+
+def open_report_store():
+    """Parsed reports by content hash, kept across restarts unless REPORT_DISK_CACHE=0"""
+    if os.getenv('REPORT_DISK_CACHE', '1') != '1':
+        return None
+    return SQLiteCache(os.path.join(cache_dir(), 'reports.sqlite3'), max_entries=1000)
+
+
+providers.register('report_store', open_report_store)
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+_DONE = object()
+
+
+class HTTPError(Exception):
+    """Ends a request with this status and a JSON error message"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ServerBusy(HTTPError):
+    """Raised when the job queue is full; the client should retry shortly"""
+
+    def __init__(self):
+        super().__init__(503, "server busy, retry shortly")
+
+
+def load_report(data, content_type):
+    """Parsed rows of an uploaded PDF, or of report text or JSON, once per content hash"""
+    key = f"report:v{PARSER_VERSION}:{hashlib.sha256(data).hexdigest()}"
+    report_store = providers.get('report_store')
+    if report_store is not None:
+        medical_report = report_store.get(key)
+        if medical_report is not None:
+            return medical_report
+
+    if content_type == 'application/pdf' or data.startswith(b'%PDF'):
+        text = extract_text_from_pdf(io.BytesIO(data))
+    else:
+        text = data.decode('utf-8')
+    with tracing.span('parse') as span:
+        medical_report = parse_medical_report(text)
+        span.set(rows=len(medical_report))
+
+    if report_store is not None:
+        report_store.put(key, medical_report)
+    return medical_report
+
+
+class Session:
+    """One user's report and conversation; its questions are answered one at a time"""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.report = None
+        self.report_key = None
+        self.history = ConversationHistory()
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """Sessions by id, dropped after ttl idle seconds or, oldest first, beyond max_sessions
+
+    Only used from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self.expired = 0
+
+    def create(self):
+        self.expire()
+        session = Session(uuid.uuid4().hex)
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.expired += 1
+        return session
+
+    def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, f"unknown or expired session {session_id}")
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def remove(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    def expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class JobQueue:
+    """Blocking jobs run by a fixed pool of worker threads, fed from a bounded queue
+
+    submit() queues fn(emit, *args) and returns an async iterator over
+    everything the job passes to emit(), ending when the job returns. A job
+    that raises ends with an {'type': 'error'} event. When max_pending jobs
+    are already waiting for a worker, submit() raises ServerBusy instead of
+    queueing more, so overload shows up as fast 503s rather than timeouts.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+
+    def start(self):
+        self._queue = asyncio.Queue(self.max_pending)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='job')
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    def submit(self, fn, *args):
+        if self._queue.full():
+            self.rejected += 1
+            raise ServerBusy()
+        events = asyncio.Queue()
+        self._queue.put_nowait((fn, args, events, time.perf_counter()))
+        return self._events(events)
+
+    @staticmethod
+    async def _events(events):
+        while True:
+            event = await events.get()
+            if event is _DONE:
+                return
+            yield event
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args, events, queued = await self._queue.get()
+            tracing.metrics.record('queue_wait', time.perf_counter() - queued)
+
+            def emit(event, events=events):
+                loop.call_soon_threadsafe(events.put_nowait, event)
+
+            self.running += 1
+            try:
+                await loop.run_in_executor(self._executor, fn, emit, *args)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Job failed: {e}")
+                events.put_nowait({'type': 'error', 'error': str(e)})
+            finally:
+                self.running -= 1
+                events.put_nowait(_DONE)
+
+    def stats(self):
+        return {'workers': self.workers, 'running': self.running, 'waiting': self._queue.qsize(),
+                'completed': self.completed, 'failed': self.failed, 'rejected': self.rejected}
+
+
+# Jobs: run on the worker threads, reporting progress through emit()
+
+def report_job(emit, session, data, content_type):
+    """Parse an upload and make it the session's report"""
+    with tracing.trace('server_report', bytes=len(data)):
+        medical_report = load_report(data, content_type)
+    if not medical_report:
+        raise ValueError("no results found in the report")
+    with session.lock:
+        key = fingerprint(serialize_report(medical_report))
+        # The same report uploaded again keeps the conversation going
+        if key != session.report_key:
+            session.report, session.report_key = medical_report, key
+            session.history.clear()
+    rows = [row for row in medical_report if isinstance(row, dict)]
+    emit({'type': 'report', 'report': medical_report, 'rows': len(medical_report),
+          'abnormal': [result.test for result in LabReport.from_dicts(rows).abnormal()]})
+
+
+def ask_job(emit, session, question, language='en', speak=True):
+    """Answer a question about the session's report
+
+    Emits the English question (for Tamil questions), then {'type': 'text'}
+    per sentence as soon as it is translated and, with speak, the MP3 bytes
+    of each sentence, then a 'done' event with the full answer, where it
+    came from and the timing breakdown. When Gemini fails an apology is
+    spoken instead, with source 'unavailable'; an answer cut short by a
+    translation or speech error has source 'incomplete'. Neither is cached
+    or added to the history.
+    """
+    with session.lock:
+        with tracing.trace('server_ask', language=language, speak=speak) as request:
+            if language == 'ta':
+                question = translate_tamil_to_english(question)
+                emit({'type': 'question', 'english': question})
+            medical_report = session.report
+            history_lines = session.history.lines()
+
+            # Cached, precomputed and rule answers skip Gemini
+            found, source = find_answer(question, medical_report, history_lines)
+            if found is not None:
+                english, tamil, audio = found['english'], found['tamil'], found['audio']
+                emit({'type': 'text', 'english': english, 'tamil': tamil})
+                if speak:
+                    audio = audio or synthesize_speech(tamil)
+                    emit(audio)
+                if source == 'rules' and audio:
+                    response_cache.put(medical_report, question, history_lines, english, tamil, audio)
+            else:
+                source = 'gemini'
+                audio_parts = []
+
+                def play(audio):
+                    if audio:
+                        audio_parts.append(audio)
+                        emit(audio)
+
+                # Gemini, translation and speech overlapped, one sentence at a time
+                started = time.perf_counter()
+                english, tamil, timer, errors = run_streaming_pipeline(
+                    stream_with_gemini(question, medical_report, history_lines),
+                    translate=translate_english_to_tamil,
+                    synthesize=synthesize_speech if speak else (lambda tamil: b""),
+                    play=play,
+                    on_sentence=lambda english, tamil: emit({'type': 'text', 'english': english, 'tamil': tamil}),
+                )
+                rule_engine.record_llm(time.perf_counter() - started)
+                if gemini_failed(english):
+                    source = 'unavailable'
+                elif errors:
+                    # A translation or speech stage failed part way through the answer
+                    source = 'incomplete'
+                # Answers are cached with their audio, so text-only answers are not
+                elif audio_parts:
+                    response_cache.put(medical_report, question, history_lines, english, tamil,
+                                       b"".join(audio_parts))
+
+            size = session.history.record_prompt(question, medical_report)
+            # An apology or a cut-short answer is not one the next question could follow up on
+            if source not in ('unavailable', 'incomplete'):
+                session.history.add(question, english, medical_report)
+                speculator.speculate(medical_report, session.history.lines(), session=session.id)
+    emit({'type': 'done', 'question': question, 'english': english, 'tamil': tamil, 'source': source,
+          'prompt_tokens': size['prompt_tokens'], 'question_tokens': size['question_tokens'],
+          'timing': request.breakdown()})
+
+
+def speak_job(emit, text):
+    """MP3 chunks for the text as they are synthesized"""
+    with tracing.trace('server_speak', chars=len(text)):
+        for chunk in get_services().speak_stream(text):
+            emit(chunk)
+
+
+# HTTP and WebSocket plumbing
+
+class Request:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b'{}')
+        except ValueError:
+            raise HTTPError(400, "request body is not valid JSON")
+
+
+async def read_request(reader):
+    """The next request on the connection, or None once the client has gone"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY:
+        raise HTTPError(413, f"request body over {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), urlsplit(target).path.rstrip('/') or '/', headers, body)
+
+
+def write_head(writer, status, content_type, length=None, headers=()):
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+             "Connection: close"]
+    lines.append(f"Content-Length: {length}" if length is not None else "Transfer-Encoding: chunked")
+    lines += [f"{name}: {value}" for name, value in headers]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+
+async def send_json(writer, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    write_head(writer, status, 'application/json', len(body), headers)
+    writer.write(body)
+    await writer.drain()
+
+
+async def send_stream(writer, content_type, chunks):
+    """Send each chunk as it is produced, with chunked transfer encoding"""
+    write_head(writer, 200, content_type)
+    async for chunk in chunks:
+        if chunk:
+            writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b"\r\n")
+            await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def websocket_accept(key):
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('latin-1')).digest()).decode('latin-1')
+
+
+async def read_frame(reader):
+    """(opcode, payload) of the next WebSocket message, joining fragmented frames"""
+    message_opcode, parts = None, []
+    while True:
+        first, second = await reader.readexactly(2)
+        opcode, length = first & 0x0F, second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await reader.readexactly(8))
+        if length > MAX_BODY:
+            raise HTTPError(413, f"message over {MAX_BODY} bytes")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        # Control frames may arrive between the fragments of a message
+        if opcode >= OP_CLOSE:
+            return opcode, payload
+        if opcode != OP_CONTINUATION:
+            message_opcode = opcode
+        parts.append(payload)
+        if first & 0x80:
+            return message_opcode, b"".join(parts)
+
+
+def write_frame(writer, opcode, payload, mask=False):
+    """Write one unfragmented WebSocket frame; clients must mask theirs"""
+    length = len(payload)
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header += bytes([mask_bit | length])
+    elif length < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack('!H', length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack('!Q', length)
+    if mask:
+        key = os.urandom(4)
+        payload = bytes(byte ^ key[i % 4] for i, byte in enumerate(payload))
+        header += key
+    writer.write(header + payload)
+
+
+class AssistantServer:
+    """HTTP and WebSocket front end to the answering pipeline, shared by many sessions
+
+    Endpoints:
+      POST   /sessions                 -> {"session": id}
+      POST   /sessions/{id}/report     body: PDF, report text or JSON -> parsed rows
+      POST   /sessions/{id}/ask        {"question", "language": "en"|"ta", "speak"}
+                                       -> NDJSON events, audio base64-encoded
+      GET    /sessions/{id}/ws         WebSocket: send {"question", ...} messages, get
+                                       JSON events and the MP3 of each sentence as binary messages
+      DELETE /sessions/{id}
+      POST   /speak                    {"text"} -> streamed audio/mpeg
+      GET    /health, /stats, /metrics
+    The event loop only parses requests and moves bytes; parsing, Gemini,
+    translation and speech run as jobs on the worker pool.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, sessions=None):
+        self.sessions = sessions or SessionStore()
+        self.jobs = JobQueue(workers, max_pending)
+        self.routes = [
+            ('POST', r'/sessions', self.create_session),
+            ('POST', r'/sessions/(\w+)/report', self.upload_report),
+            ('POST', r'/sessions/(\w+)/ask', self.ask),
+            ('GET', r'/sessions/(\w+)/ws', self.websocket),
+            ('DELETE', r'/sessions/(\w+)', self.end_session),
+            ('POST', r'/speak', self.speak),
+            ('GET', r'/health', self.health),
+            ('GET', r'/stats', self.stats),
+            ('GET', r'/metrics', self.metrics),
+        ]
+        self.server = None
+
+    async def start(self, host=HOST, port=PORT):
+        self.jobs.start()
+        self.server = await asyncio.start_server(self.handle, host, port, limit=1 << 16)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.jobs.stop()
+
+    async def handle(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is not None:
+                await self.dispatch(request, reader, writer)
+        except HTTPError as e:
+            await send_json(writer, e.status, {'error': str(e)},
+                            [('Retry-After', '1')] if isinstance(e, ServerBusy) else ())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # The client went away
+        except Exception as e:
+            print(f"Request failed: {e}")
+            await send_json(writer, 500, {'error': str(e)})
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, reader, writer):
+        allowed = False
+        for method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, request.path)
+            if match:
+                allowed = True
+                if method == request.method:
+                    return await handler(request, reader, writer, *match.groups())
+        raise HTTPError(405 if allowed else 404, f"{request.method} {request.path} is not supported")
+
+    def session_with_report(self, session_id):
+        session = self.sessions.get(session_id)
+        if session.report is None:
+            raise HTTPError(409, "upload a report first")
+        return session
+
+    @staticmethod
+    def question_args(payload):
+        question = str(payload.get('question') or '').strip()
+        if not question:
+            raise HTTPError(400, "question is required")
+        language = payload.get('language', 'en')
+        if language not in ('en', 'ta'):
+            raise HTTPError(400, "language must be 'en' or 'ta'")
+        return question, language, bool(payload.get('speak', True))
+
+    async def create_session(self, request, reader, writer):
+        await send_json(writer, 201, {'session': self.sessions.create().id})
+
+    async def end_session(self, request, reader, writer, session_id):
+        self.sessions.remove(session_id)
+        await send_json(writer, 200, {'session': session_id})
+
+    async def upload_report(self, request, reader, writer, session_id):
+        session = self.sessions.get(session_id)
+        if not request.body:
+            raise HTTPError(400, "report body is empty")
+        content_type = request.headers.get('content-type', '').split(';')[0].strip()
+        async for event in self.jobs.submit(report_job, session, request.body, content_type):
+            if event['type'] == 'error':
+                raise HTTPError(422, f"could not read the report: {event['error']}")
+            await send_json(writer, 200, event)
+
+    async def ask(self, request, reader, writer, session_id):
+        session = self.session_with_report(session_id)
+        events = self.jobs.submit(ask_job, session, *self.question_args(request.json()))
+
+        async def lines():
+            async for event in events:
+                if isinstance(event, bytes):
+                    event = {'type': 'audio', 'data': base64.b64encode(event).decode('ascii')}
+                yield (json.dumps(event, ensure_ascii=False) + "\n").encode('utf-8')
+
+        await send_stream(writer, 'application/x-ndjson', lines())
+
+    async def speak(self, request, reader, writer):
+        text = str(request.json().get('text') or '').strip()
+        if not text:
+            raise HTTPError(400, "text is required")
+        events = self.jobs.submit(speak_job, text)
+
+        async def audio():
+            async for chunk in events:
+                if isinstance(chunk, dict):
+                    # Closing without the final chunk tells the client the audio is incomplete
+                    raise ConnectionAbortedError(chunk['error'])
+                yield chunk
+
+        await send_stream(writer, 'audio/mpeg', audio())
+
+    async def websocket(self, request, reader, writer, session_id):
+        session = self.sessions.get(session_id)
+        key = request.headers.get('sec-websocket-key')
+        if request.headers.get('upgrade', '').lower() != 'websocket' or not key:
+            raise HTTPError(400, "WebSocket upgrade expected")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+        def send(payload):
+            if isinstance(payload, bytes):
+                write_frame(writer, OP_BINARY, payload)
+            else:
+                write_frame(writer, OP_TEXT, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+        # One question at a time per connection, like the session itself
+        while True:
+            opcode, payload = await read_frame(reader)
+            if opcode == OP_CLOSE:
+                write_frame(writer, OP_CLOSE, payload[:2])
+                await writer.drain()
+                return
+            if opcode == OP_PING:
+                write_frame(writer, OP_PONG, payload)
+            elif opcode == OP_TEXT:
+                try:
+                    session = self.session_with_report(session.id)
+                    async for event in self.jobs.submit(ask_job, session, *self.question_args(json.loads(payload))):
+                        send(event)
+                        await writer.drain()
+                except (HTTPError, ValueError) as e:
+                    send({'type': 'error', 'status': getattr(e, 'status', 400), 'error': str(e)})
+            await writer.drain()
+
+    async def health(self, request, reader, writer):
+        await send_json(writer, 200, {'status': 'ok'})
+
+    async def stats(self, request, reader, writer):
+        percentiles = tracing.metrics.percentiles()
+        await send_json(writer, 200, {
+            'sessions': len(self.sessions),
+            'expired_sessions': self.sessions.expired,
+            'jobs': self.jobs.stats(),
+            'rules': rule_engine.stats(),
+            'speculation': speculator.stats(),
+            'response_cache': response_cache.stats(),
+            'services': get_services().stats(),
+            'latency': {stage: {key: row[key] for key in ('count', 'p50', 'p95', 'p99')}
+                        for stage, row in percentiles.items()},
+        })
+
+    async def metrics(self, request, reader, writer):
+        body = tracing.metrics.prometheus().encode('utf-8')
+        write_head(writer, 200, 'text/plain; version=0.0.4', len(body))
+        writer.write(body)
+        await writer.drain()
+
+
+def start_in_thread(host='127.0.0.1', port=0, **options):
+    """Run an AssistantServer on its own event loop thread; returns (server, base URL)
+
+    Port 0 picks a free port. Used to embed a server in a Streamlit process
+    when no HEALTHASSIST_SERVER is configured, and by the load test.
+    """
+    server = AssistantServer(**options)
+    started = threading.Event()
+    bound = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        bound['port'] = loop.run_until_complete(server.start(host, port))
+        server.loop = loop
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True, name='assistant-server').start()
+    started.wait()
+    return server, f"http://{host}:{bound['port']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve report upload, questions and speech to many sessions")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS, help="questions answered at once")
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help="jobs allowed to wait for a worker before requests get 503")
+    parser.add_argument('--mock', action='store_true', help="use offline fake Gemini, translation and speech")
+    args = parser.parse_args(argv)
+
+    if args.mock:
+        # A throwaway cache directory, so fake translations, speech and answers
+        # never reach the shared cache; the caches open on first use, after this
+        os.environ['HEALTHASSIST_CACHE_DIR'] = tempfile.mkdtemp(prefix='healthassist-mock-')
+        set_services(Services.fake(latency=0.2))
+    else:
+        # Connect to Gemini and ElevenLabs first, so missing keys fail at startup
+        get_services().connect()
+
+    async def serve():
+        server = AssistantServer(args.workers, args.max_pending)
+        port = await server.start(args.host, args.port)
+        print(f"Serving on http://{args.host}:{port} with {args.workers} workers")
+        async with server.server:
+            await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
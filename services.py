@@ -0,0 +1,362 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import providers
+import tracing
+from prompts import PrefixCache
+from report_index import relevant_rows
+import translation
+import tts
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend that has been failing"""
+
+
+class CircuitBreaker:
+    """Stops calls to a backend after repeated failures, then lets one through to probe it
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast with CircuitOpenError. Once reset_after seconds have passed a
+    single call is let through as a probe while the others keep failing fast;
+    its success closes the circuit, its failure reopens it. A probe that never
+    reports back is given up on after another reset_after seconds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_after:
+            return 'open'
+        return 'half-open'
+
+    def check(self, name):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            now = time.monotonic()
+            if state == 'half-open' and (self.probe_started is None
+                                         or now - self.probe_started >= self.reset_after):
+                self.probe_started = now
+                return
+            raise CircuitOpenError(f"{name} is unavailable after {self.failures} failures")
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probe_started = None
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_DONE = object()
+
+
+class Backend:
+    """Call policy for one remote service
+
+    Calls run on the backend's own bounded thread pool, so at most
+    concurrency requests are in flight and the underlying HTTP connections
+    are reused by those threads. Each attempt is limited to timeout seconds,
+    failures are retried with exponential backoff, and a circuit breaker
+    fails fast while the service is down. A timed-out attempt is abandoned,
+    not interrupted, so its thread stays busy until the call returns.
+    """
+
+    def __init__(self, name, concurrency=4, timeout=30.0, retries=2, backoff=0.5,
+                 failure_threshold=5, reset_after=30.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_after)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name)
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls, name, concurrency=4, timeout=30.0, retries=2):
+        """Backend with limits overridable as <NAME>_CONCURRENCY, <NAME>_TIMEOUT and <NAME>_RETRIES"""
+        prefix = name.upper()
+        return cls(
+            name,
+            concurrency=int(os.getenv(f'{prefix}_CONCURRENCY', concurrency)),
+            timeout=float(os.getenv(f'{prefix}_TIMEOUT', timeout)),
+            retries=int(os.getenv(f'{prefix}_RETRIES', retries)),
+        )
+
+    def _failed(self, error, attempt, retryable=True):
+        """Record a failed attempt; True when it should be retried"""
+        self.failures += 1
+        self.breaker.failure()
+        if attempt == self.retries or not retryable:
+            return False
+        print(f"{self.name} call failed ({error!r}), retrying")
+        return True
+
+    def call_sync(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) under the policy and return its result"""
+        with tracing.span(self.name) as span:
+            for attempt in range(self.retries + 1):
+                self.breaker.check(self.name)
+                self.calls += 1
+                span.set(attempts=attempt + 1)
+                future = self.executor.submit(tracing.in_context(fn), *args, **kwargs)
+                try:
+                    result = future.result(timeout=self.timeout)
+                except Exception as e:
+                    future.cancel()
+                    if not self._failed(e, attempt):
+                        raise
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+                self.breaker.success()
+                return result
+
+    async def call(self, fn, *args, **kwargs):
+        """Async version of call_sync; the event loop is never blocked"""
+        with tracing.span(self.name) as span:
+            for attempt in range(self.retries + 1):
+                self.breaker.check(self.name)
+                self.calls += 1
+                span.set(attempts=attempt + 1)
+                future = self.executor.submit(tracing.in_context(fn), *args, **kwargs)
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+                except Exception as e:
+                    future.cancel()
+                    if not self._failed(e, attempt):
+                        raise
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+                    continue
+                self.breaker.success()
+                return result
+
+    def stream_sync(self, fn, *args, **kwargs):
+        """Yield the items of a streaming call produced on the backend's pool
+
+        timeout applies to each item. The call is only retried if it fails
+        before its first item, so callers never see an item twice.
+        """
+        # The consumer may be another thread, so the span is not made current here
+        span = tracing.start_span(self.name, stream=True)
+        try:
+            for attempt in range(self.retries + 1):
+                self.breaker.check(self.name)
+                self.calls += 1
+                span.set(attempts=attempt + 1)
+                items = queue.Queue()
+
+                def produce():
+                    try:
+                        for item in fn(*args, **kwargs):
+                            items.put((item, None))
+                        items.put((_DONE, None))
+                    except Exception as e:
+                        items.put((None, e))
+
+                self.executor.submit(tracing.in_context(produce, span))
+                count = 0
+                try:
+                    while True:
+                        try:
+                            item, error = items.get(timeout=self.timeout)
+                        except queue.Empty:
+                            raise TimeoutError(f"{self.name} sent nothing for {self.timeout}s")
+                        if error is not None:
+                            raise error
+                        if item is _DONE:
+                            break
+                        if not count:
+                            span.set(first_item_ms=round((time.perf_counter() - span.start) * 1000, 1))
+                        count += 1
+                        span.set(items=count)
+                        yield item
+                except Exception as e:
+                    if not self._failed(e, attempt, retryable=not count):
+                        raise
+                    time.sleep(self.backoff * 2 ** attempt)
+                    continue
+                self.breaker.success()
+                return
+        except Exception as e:
+            span.end(e)
+            raise
+        finally:
+            span.end()
+
+    def stats(self):
+        return {'calls': self.calls, 'failures': self.failures, 'circuit': self.breaker.state}
+
+
+def connect_gemini():
+    """The google.generativeai module configured with GEMINI_API_KEY"""
+    import google.generativeai as genai
+    gemini_api_key = os.getenv('GEMINI_API_KEY')
+    if not gemini_api_key:
+        raise ValueError("Please set the GEMINI_API_KEY environment variable")
+    # The Gemini client keeps one channel for every request
+    genai.configure(api_key=gemini_api_key)
+    return genai
+
+
+def connect_elevenlabs():
+    """ElevenLabs client for ELEVENLABS_API_KEY with pooled keep-alive connections"""
+    import httpx
+    from elevenlabs.client import ElevenLabs
+    api_key = os.getenv('ELEVENLABS_API_KEY')
+    if not api_key:
+        raise ValueError("Please set the ELEVENLABS_API_KEY environment variable")
+    # One keep-alive connection per concurrent TTS request
+    connections = int(os.getenv('TTS_CONCURRENCY', '4'))
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        timeout=float(os.getenv('TTS_TIMEOUT', '60')),
+    )
+    return ElevenLabs(api_key=api_key, httpx_client=http_client)
+
+
+class Services:
+    """Shared Gemini, translation and ElevenLabs clients used by every entry point
+
+    Each service has its own Backend (pool size, timeout, retries and
+    circuit breaker). Methods come in a blocking form for the scripts and
+    Streamlit apps and an *_async form for asyncio callers. Clients not
+    passed in come from the provider registry on first use, so a session
+    that never speaks never imports or connects to ElevenLabs. Use fake()
+    for offline in-process fakes.
+    """
+
+    def __init__(self, genai_module=None, speech_client=None, gemini=None, translator=None, speech=None):
+        self._genai = genai_module
+        self._speech_client = speech_client
+        self._prefix_cache = None
+        self._lock = threading.Lock()
+        self.gemini = gemini or Backend.from_env('gemini', concurrency=8, timeout=60.0)
+        # Chunks are already retried inside translation.translate_text, whose
+        # TRANSLATION_* settings apply per chunk; TRANSLATOR_* apply per text
+        self.translator = translator or Backend.from_env('translator', concurrency=8, timeout=60.0, retries=0)
+        self.speech = speech or Backend.from_env('tts', concurrency=4, timeout=60.0)
+
+    @classmethod
+    def live(cls):
+        """Services backed by the real APIs, connected on first use"""
+        return cls()
+
+    @classmethod
+    def fake(cls, latency=0.0, reply=None, jitter=0.0, seed=0):
+        """Offline services: FakeGenai, StubTranslator and FakeSpeechClient
+
+        latency is the delay in seconds added to every remote call, varied by
+        up to jitter seconds with generators seeded from seed. The stub
+        translator replaces the translation module's backend.
+        """
+        from fakes import FakeGenai, FakeSpeechClient
+        options = dict(latency=latency, jitter=jitter, seed=seed)
+        genai = FakeGenai(**options) if reply is None else FakeGenai(reply, **options)
+        translation.set_translator_backend(translation.StubTranslator(**options))
+        return cls(genai, FakeSpeechClient(**options))
+
+    # Clients are resolved on the caller's thread, before a Backend call, so a
+    # missing key or SDK fails once instead of being retried
+
+    @property
+    def prefix_cache(self):
+        # Report and instructions are sent once per report, then only the question
+        with self._lock:
+            if self._prefix_cache is None:
+                self._prefix_cache = PrefixCache(self._genai or providers.get('gemini'), 'gemini-1.5-pro')
+            return self._prefix_cache
+
+    @property
+    def speech_client(self):
+        return self._speech_client or providers.get('elevenlabs')
+
+    def connect(self):
+        """Create the Gemini and ElevenLabs clients now, so missing keys fail early"""
+        self.prefix_cache
+        self.speech_client
+
+    @staticmethod
+    def _ask(prefix_cache, english_text, medical_report, conversation_history=None, stream=False):
+        # For large panels only the rows relevant to the question (plus abnormal ones) are sent
+        report_rows = relevant_rows(medical_report, english_text)
+        tracing.annotate(report_rows=len(report_rows) if report_rows is not None else 'all')
+        response = prefix_cache.generate_content(medical_report, english_text, conversation_history, stream=stream,
+                                                 report_rows=report_rows)
+        return response if stream else response.text
+
+    @classmethod
+    def _ask_stream(cls, prefix_cache, english_text, medical_report, conversation_history=None):
+        for chunk in cls._ask(prefix_cache, english_text, medical_report, conversation_history, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    def ask(self, english_text, medical_report, conversation_history=None):
+        """Gemini's answer to a question about the report"""
+        return self.gemini.call_sync(self._ask, self.prefix_cache, english_text, medical_report, conversation_history)
+
+    def ask_stream(self, english_text, medical_report, conversation_history=None):
+        """Yield Gemini's answer as text fragments while it is generated"""
+        return self.gemini.stream_sync(self._ask_stream, self.prefix_cache, english_text, medical_report,
+                                       conversation_history)
+
+    def translate(self, text, from_lang, to_lang):
+        """Translate text, preserving numbers"""
+        return self.translator.call_sync(translation.translate_text, text, from_lang, to_lang)
+
+    def synthesize(self, tamil_text):
+        """MP3 bytes for the text, served from the audio cache when possible"""
+        return self.speech.call_sync(tts.synthesize, self.speech_client, tamil_text)
+
+    def speak_stream(self, tamil_text):
+        """Yield MP3 chunks for the text as they are synthesized"""
+        return self.speech.stream_sync(tts.stream_speech, self.speech_client, tamil_text)
+
+    async def ask_async(self, english_text, medical_report, conversation_history=None):
+        return await self.gemini.call(self._ask, self.prefix_cache, english_text, medical_report, conversation_history)
+
+    async def translate_async(self, text, from_lang, to_lang):
+        return await self.translator.call(translation.translate_text, text, from_lang, to_lang)
+
+    async def synthesize_async(self, tamil_text):
+        return await self.speech.call(tts.synthesize, self.speech_client, tamil_text)
+
+    def stats(self):
+        """Call and failure counts and circuit state per backend"""
+        return {backend.name: backend.stats() for backend in (self.gemini, self.translator, self.speech)}
+
+
+providers.register('gemini', connect_gemini)
+providers.register('elevenlabs', connect_elevenlabs)
+providers.register('services', Services.live)
+
+
+def get_services():
+    """The shared services; clients connect to the real APIs on first use"""
+    return providers.get('services')
+
+
+def set_services(services):
+    """Swap the shared services, e.g. for Services.fake() in tests and benchmarks"""
+    providers.override('services', services)
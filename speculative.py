@@ -0,0 +1,235 @@
+import os
+import queue
+import re
+import threading
+from collections import OrderedDict
+from lab_results import LabReport
+from prompts import fingerprint, serialize_report
+from question_index import THRESHOLD, QuestionIndex
+from report_index import tokenize
+from response_cache import history_digest, normalize_question
+from services import get_services
+import tracing
+
+# Precompute likely follow-up answers in the background (off by default: it spends API quota)
+SPECULATE = os.getenv('SPECULATE', '0') == '1'
+# Spend limits per process: speculative Gemini calls and characters sent to ElevenLabs
+MAX_CALLS = int(os.getenv('SPECULATION_MAX_CALLS', '30'))
+MAX_TTS_CHARS = int(os.getenv('SPECULATION_MAX_TTS_CHARS', '5000'))
+
+# What people ask next, in order of how often they ask it
+GENERIC_FOLLOWUPS = ["What should I eat?", "Is it dangerous?"]
+TEST_FOLLOWUPS = [
+    "What should I eat to {direction} my {test}?",
+    "Is my {level} {test} dangerous?",
+]
+
+def plain_name(test):
+    """'LDL CHOLESTEROL - DIRECT' -> 'ldl cholesterol', for use in a question"""
+    return re.sub(r'\s*\(.*?\)|\s+-\s+.*$', '', test).strip().lower() or test.lower()
+
+
+def deviation(result):
+    """How far a result is outside its range, relative to the range limit"""
+    if result.value is None:
+        return 0.0
+    if result.flag == 'H' and result.ref_high:
+        return result.value / result.ref_high - 1
+    if result.flag == 'L' and result.value:
+        return (result.ref_low or 0) / result.value - 1
+    return 0.0
+
+
+def predict_followups(medical_report, conversation_history=None, k=3):
+    """The k most likely next questions, about the report's abnormal results
+
+    Generic follow-ups come first, then questions about the abnormal tests,
+    those sharing the most words with the conversation and the furthest out
+    of range first. Questions already asked are left out.
+    """
+    if not medical_report or isinstance(medical_report, str):
+        return []
+    report = LabReport.from_dicts(row for row in medical_report if isinstance(row, dict))
+    # People ask about tests, rarely about the derived ratios
+    abnormal = [r for r in report.abnormal() if 'RATIO' not in r.test.upper()] or report.abnormal()
+    if not abnormal:
+        return []
+    conversation = set(tokenize(' '.join(conversation_history or [])))
+    asked = {normalize_question(line[3:]) for line in conversation_history or [] if line.startswith('Q: ')}
+    abnormal = sorted(abnormal, key=lambda r: (-len(conversation & set(tokenize(plain_name(r.test)))),
+                                               -deviation(r)))
+
+    candidates = list(GENERIC_FOLLOWUPS)
+    for result in abnormal:
+        high = result.flag == 'H'
+        candidates += [template.format(test=plain_name(result.test), level='high' if high else 'low',
+                                       direction='lower' if high else 'raise')
+                       for template in TEST_FOLLOWUPS]
+    predictions = []
+    for question in candidates:
+        if normalize_question(question) not in asked and question not in predictions:
+            predictions.append(question)
+    return predictions[:k]
+
+
+class SpeculativeCache:
+    """Precomputed answers, keyed by report and conversation state, with a bounded size
+
+    get() matches a question exactly after normalization, or failing that
+    the most similar speculated question in a QuestionIndex (same tests,
+    same direction, similarity at least threshold). The least recently
+    stored contexts are evicted beyond max_entries answers.
+    """
+
+    def __init__(self, max_entries=64, threshold=THRESHOLD):
+        self.max_entries = max_entries
+        self.index = QuestionIndex(threshold=threshold, max_templates=max_entries)
+        self._contexts = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def context(medical_report, conversation_history=None):
+        return f"{fingerprint(serialize_report(medical_report))}:{history_digest(conversation_history)}"
+
+    def put(self, context, question, answer):
+        key = normalize_question(question)
+        with self._lock:
+            answers = self._contexts.setdefault(context, {})
+            self._contexts.move_to_end(context)
+            self._size += key not in answers
+            answers[key] = answer
+            while self._size > self.max_entries and self._contexts:
+                _, evicted = self._contexts.popitem(last=False)
+                self._size -= len(evicted)
+        self.index.add(context, key)
+
+    def get(self, context, question):
+        """(answer, matched question) or (None, None)"""
+        key = normalize_question(question)
+        with self._lock:
+            answers = self._contexts.get(context)
+            if not answers:
+                return None, None
+            if key in answers:
+                return answers[key], key
+        for matched, _ in self.index.search(context, key, k=1):
+            with self._lock:
+                if matched in answers:
+                    return answers[matched], matched
+        return None, None
+
+    def __len__(self):
+        return self._size
+
+
+class Speculator:
+    """Answers likely follow-up questions in the background while the current answer plays
+
+    speculate() predicts the next questions for the report and conversation
+    and a worker thread answers them through the shared services (Gemini,
+    translation and speech), one at a time so live requests keep most of
+    each backend's capacity. A new speculate() call drops the predictions
+    still queued for that session's previous turn; sessions default to one
+    per report. Speculation stops once max_calls
+    Gemini calls or max_tts_chars characters of speech have been spent;
+    the budget is checked before each answer, so the last one may overshoot
+    it. lookup() serves a precomputed answer for an exact or similar question.
+    """
+
+    def __init__(self, enabled=SPECULATE, cache=None, max_calls=MAX_CALLS, max_tts_chars=MAX_TTS_CHARS,
+                 per_turn=3, max_sessions=1024):
+        self.enabled = enabled
+        self.cache = cache or SpeculativeCache()
+        self.max_calls = max_calls
+        self.max_tts_chars = max_tts_chars
+        self.per_turn = per_turn
+        self.max_sessions = max_sessions
+        self.calls = 0
+        self.tts_chars = 0
+        self.speculated = 0
+        self.lookups = 0
+        self.hits = 0
+        self.over_budget = 0
+        self._used = set()
+        # Latest turn per session; the oldest sessions are forgotten beyond max_sessions
+        self._turns = OrderedDict()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def speculate(self, medical_report, conversation_history=None, session=None):
+        """Queue the likely next questions for this report and conversation"""
+        if not self.enabled:
+            return
+        if session is None:
+            session = self.cache.context(medical_report)
+        with self._lock:
+            turn = self._turns.pop(session, 0) + 1
+            self._turns[session] = turn
+            while len(self._turns) > self.max_sessions:
+                self._turns.popitem(last=False)
+            for question in predict_followups(medical_report, conversation_history, self.per_turn):
+                self._queue.put((session, turn, medical_report, list(conversation_history or []), question))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True, name='speculator')
+                self._worker.start()
+
+    def lookup(self, medical_report, english_question, conversation_history=None):
+        """Precomputed {'english', 'tamil', 'audio'} answer for the question, or None"""
+        if not self.enabled:
+            return None
+        context = self.cache.context(medical_report, conversation_history)
+        answer, matched = self.cache.get(context, english_question)
+        with self._lock:
+            self.lookups += 1
+            if answer is not None:
+                self.hits += 1
+                self._used.add((context, matched))
+        return answer
+
+    def within_budget(self):
+        return self.calls < self.max_calls and self.tts_chars < self.max_tts_chars
+
+    def _run(self):
+        while True:
+            session, turn, medical_report, conversation_history, question = self._queue.get()
+            with self._lock:
+                stale = self._turns.get(session) != turn
+            if stale:
+                continue
+            if not self.within_budget():
+                self.over_budget += 1
+                continue
+            context = self.cache.context(medical_report, conversation_history)
+            if self.cache.get(context, question)[0] is not None:
+                continue
+            try:
+                self.cache.put(context, question, self._answer(question, medical_report, conversation_history))
+                self.speculated += 1
+            except Exception as e:
+                print(f"Speculative answer failed: {e}")
+
+    def _answer(self, question, medical_report, conversation_history):
+        services = get_services()
+        with tracing.span('speculate', question=question):
+            self.calls += 1
+            english = services.ask(question, medical_report, conversation_history)
+            tamil = services.translate(english, 'en', 'ta')
+            self.tts_chars += len(tamil)
+            audio = services.synthesize(tamil)
+        return {'english': english, 'tamil': tamil, 'audio': audio}
+
+    def stats(self):
+        """Hit rate of lookups, answers never used, and the budget spent"""
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'speculated': self.speculated,
+                'unused': self.speculated - len(self._used),
+                'calls': self.calls,
+                'tts_chars': self.tts_chars,
+                'over_budget': self.over_budget,
+            }
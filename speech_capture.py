@@ -0,0 +1,373 @@
+import math
+import os
+import threading
+import time
+import wave
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import providers
+import tracing
+
+# Capture settings: 16 kHz 16-bit mono in 30 ms frames, as speech recognizers expect
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Trailing silence that ends an utterance, and how long to wait for speech to start
+SILENCE_MS = int(os.getenv('LISTEN_SILENCE_MS', '600'))
+NO_SPEECH_TIMEOUT = float(os.getenv('LISTEN_TIMEOUT', '8'))
+MAX_SPEECH_SECONDS = float(os.getenv('LISTEN_MAX_SECONDS', '15'))
+# Seconds of new speech between partial transcripts (0 turns them off)
+PARTIAL_INTERVAL = float(os.getenv('LISTEN_PARTIAL_INTERVAL', '1.0'))
+# Retries of a failed recognition request, and utterances to capture when nothing was understood
+RECOGNITION_RETRIES = int(os.getenv('LISTEN_RETRIES', '2'))
+LISTEN_ATTEMPTS = int(os.getenv('LISTEN_ATTEMPTS', '2'))
+
+
+class MicrophoneSource:
+    """Frames from the default microphone, via speech_recognition's PyAudio wrapper"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.sample_width = 2
+        self._microphone = None
+
+    def __enter__(self):
+        # Imported here so text-only sessions never load the speech stack
+        import speech_recognition as sr
+        self._microphone = sr.Microphone(sample_rate=self.sample_rate, chunk_size=self.frame_samples)
+        self._microphone.__enter__()
+        self.sample_width = self._microphone.SAMPLE_WIDTH
+        return self
+
+    def __exit__(self, *exc_info):
+        self._microphone.__exit__(*exc_info)
+
+    def frames(self):
+        while True:
+            yield self._microphone.stream.read(self.frame_samples)
+
+
+class WavSource:
+    """Frames from a 16-bit mono WAV file, to test capture without a microphone
+
+    With realtime each frame is delivered at the pace it would be spoken.
+    The file ending counts as the end of the utterance.
+    """
+
+    def __init__(self, path, frame_ms=FRAME_MS, realtime=False):
+        self.path = path
+        self.frame_ms = frame_ms
+        self.realtime = realtime
+        self._wav = None
+
+    def __enter__(self):
+        self._wav = wave.open(self.path, 'rb')
+        if self._wav.getnchannels() != 1 or self._wav.getsampwidth() != 2:
+            self._wav.close()
+            raise ValueError(f"{self.path} must be 16-bit mono audio")
+        self.sample_rate = self._wav.getframerate()
+        self.sample_width = 2
+        self.frame_samples = self.sample_rate * self.frame_ms // 1000
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wav.close()
+
+    def frames(self):
+        started = time.perf_counter()
+        sent = 0
+        while True:
+            frame = self._wav.readframes(self.frame_samples)
+            if not frame:
+                return
+            if self.realtime:
+                sent += len(frame) // self.sample_width
+                time.sleep(max(0.0, started + sent / self.sample_rate - time.perf_counter()))
+            yield frame
+
+
+def frame_energy(frame):
+    """RMS amplitude of a frame of 16-bit little-endian samples"""
+    samples = array('h', frame[:len(frame) - len(frame) % 2])
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+class EnergyVAD:
+    """Voice activity detection by frame energy against a calibrated noise floor
+
+    calibrate() sets the threshold to ratio times the ambient level, taken
+    from the quieter frames so speech during calibration does not raise it.
+    min_threshold matches speech_recognition's default energy_threshold.
+    """
+
+    def __init__(self, ratio=2.5, min_threshold=300.0):
+        self.ratio = ratio
+        self.min_threshold = min_threshold
+        self.threshold = None
+
+    def calibrate(self, frames):
+        energies = sorted(frame_energy(frame) for frame in frames)
+        ambient = energies[len(energies) // 5] if energies else 0.0
+        self.threshold = max(self.min_threshold, ambient * self.ratio)
+        return self.threshold
+
+    def is_speech(self, frame):
+        return frame_energy(frame) >= (self.threshold or self.min_threshold)
+
+
+class Recognizer:
+    """Speech recognizer fed audio frames while the user is still speaking
+
+    Subclasses implement recognize(audio) for the raw audio of an utterance
+    and return the text, or None when nothing was understood, raising
+    ConnectionError when the service could not be reached. This base class
+    asks for a partial transcript every partial_interval seconds of speech,
+    and starts recognizing once speech has paused for pause seconds, so the
+    final transcript is often ready by the time the endpoint is confirmed.
+    A backend that streams natively overrides feed() and finish() instead.
+    """
+
+    def __init__(self, partial_interval=PARTIAL_INTERVAL, pause=0.2, retries=RECOGNITION_RETRIES, backoff=0.5):
+        self.partial_interval = partial_interval
+        self.pause = pause
+        self.retries = retries
+        self.backoff = backoff
+        self.sample_rate = SAMPLE_RATE
+        self.sample_width = 2
+        self.partials = 0
+        self._frames = []
+        self._length = 0
+        self._speech_length = 0
+        self._next_partial = partial_interval
+        self._partial = None
+        self._partial_job = None
+        self._reported = None
+        self._pending = None
+        self._executor = None
+
+    def start(self, sample_rate, sample_width):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+
+    def recognize(self, audio):
+        raise NotImplementedError
+
+    def seconds(self, length):
+        return length / (self.sample_rate * self.sample_width)
+
+    def _submit(self, fn, *args):
+        if self._executor is None:
+            # One thread for partials, one for the recognition started at a pause
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='recognizer')
+        return self._executor.submit(tracing.in_context(fn), *args)
+
+    def _recognize_partial(self, audio):
+        try:
+            self._partial = self.recognize(audio)
+        except Exception:
+            pass
+
+    def feed(self, frame, is_speech):
+        """Add a frame; returns a new partial transcript, if one has arrived"""
+        self._frames.append(frame)
+        self._length += len(frame)
+        if is_speech:
+            self._speech_length = self._length
+        elif (self._speech_length and (self._pending is None or self._pending[0] < self._speech_length)
+              and self.seconds(self._length - self._speech_length) >= self.pause):
+            # Speech has paused: recognize what has been said in case this is the end
+            self._pending = (self._length, self._submit(self._recognize_with_retries, b''.join(self._frames)))
+        if (self.partial_interval and is_speech and self.seconds(self._length) >= self._next_partial
+                and (self._partial_job is None or self._partial_job.done())):
+            self._next_partial = self.seconds(self._length) + self.partial_interval
+            self._partial_job = self._submit(self._recognize_partial, b''.join(self._frames))
+        if self._partial and self._partial != self._reported:
+            self._reported = self._partial
+            self.partials += 1
+            return self._partial
+        return None
+
+    def _recognize_with_retries(self, audio):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.recognize(audio)
+            except ConnectionError as e:
+                if attempt == self.retries:
+                    raise
+                print(f"Speech recognition failed ({e}), retrying")
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def finish(self):
+        """Final transcript of everything fed, or None when nothing was understood"""
+        try:
+            # Reuse the recognition started at the last pause if no speech came after it
+            if self._pending is not None and self._pending[0] >= self._speech_length:
+                return self._pending[1].result()
+            return self._recognize_with_retries(b''.join(self._frames))
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+
+
+class GoogleRecognizer(Recognizer):
+    """Google Web Speech recognition through speech_recognition"""
+
+    def __init__(self, language='ta-IN', **kwargs):
+        super().__init__(**kwargs)
+        self.language = language
+        self._recognizer = None
+
+    def recognize(self, audio):
+        import speech_recognition as sr
+        if self._recognizer is None:
+            self._recognizer = sr.Recognizer()
+        try:
+            return self._recognizer.recognize_google(sr.AudioData(audio, self.sample_rate, self.sample_width),
+                                                     language=self.language)
+        except sr.UnknownValueError:
+            return None
+        except sr.RequestError as e:
+            raise ConnectionError(str(e)) from e
+
+
+# Recognizer backends by name, for LISTEN_RECOGNIZER
+RECOGNIZERS = {'google': GoogleRecognizer}
+
+
+class CaptureSession:
+    """Listens for one utterance at a time with local endpointing
+
+    The noise floor is calibrated on the first listen() and reused for the
+    rest of the session. Frames are streamed to a new recognizer from
+    recognizer_factory from the moment speech starts (with a little audio
+    from before, so the first syllable is not cut), and capture stops after
+    silence_ms of silence instead of waiting for the recognizer.
+    """
+
+    def __init__(self, source_factory, recognizer_factory, vad=None, calibration_ms=500, start_ms=90,
+                 preroll_ms=300, silence_ms=SILENCE_MS, no_speech_timeout=NO_SPEECH_TIMEOUT,
+                 max_speech_seconds=MAX_SPEECH_SECONDS, attempts=LISTEN_ATTEMPTS):
+        self.source_factory = source_factory
+        self.recognizer_factory = recognizer_factory
+        self.vad = vad or EnergyVAD()
+        self.calibration_ms = calibration_ms
+        self.start_ms = start_ms
+        self.preroll_ms = preroll_ms
+        self.silence_ms = silence_ms
+        self.no_speech_timeout = no_speech_timeout
+        self.max_speech_seconds = max_speech_seconds
+        self.attempts = attempts
+        self._lock = threading.Lock()
+
+    def recalibrate(self):
+        """Measure the ambient noise again on the next listen()"""
+        self.vad.threshold = None
+
+    def listen(self, on_partial=None):
+        """Tamil text of the next utterance, or None
+
+        on_partial is called with partial transcripts on the calling thread.
+        When nothing was understood the user is asked to repeat, up to
+        attempts utterances in all.
+        """
+        # One microphone, so one utterance at a time
+        with self._lock:
+            for attempt in range(self.attempts):
+                if attempt:
+                    print("Could not understand audio, please say that again")
+                text = self._listen_once(on_partial)
+                if text:
+                    return text
+            return None
+
+    def _listen_once(self, on_partial):
+        recognizer = self.recognizer_factory()
+        with tracing.span('listen') as span:
+            with self.source_factory() as source:
+                print("Listening for Tamil speech...")
+                recognizer.start(source.sample_rate, source.sample_width)
+                frame_ms = 1000 * source.frame_samples / source.sample_rate
+                captured = self._capture(source.frames(), recognizer, frame_ms, on_partial)
+            span.set(threshold=round(self.vad.threshold), **captured)
+        if not captured['speech_ms']:
+            print("No speech detected")
+            return None
+        with tracing.span('recognize') as span:
+            try:
+                text = recognizer.finish()
+            except ConnectionError as e:
+                print(f"Could not request results; {e}")
+                return None
+            span.set(chars=len(text or ''), partials=recognizer.partials)
+        if text:
+            print(f"Recognized Tamil text: {text}")
+        return text
+
+    def _capture(self, frames, recognizer, frame_ms, on_partial):
+        """Read frames until the end of the utterance, feeding speech to the recognizer"""
+        frames = iter(frames)
+        preroll = deque(maxlen=max(1, round(self.preroll_ms / frame_ms)))
+        if self.vad.threshold is None:
+            calibration = [frame for frame, _ in zip(frames, range(max(1, round(self.calibration_ms / frame_ms))))]
+            self.vad.calibrate(calibration)
+            preroll.extend(calibration)
+
+        def feed(frame, is_speech):
+            partial = recognizer.feed(frame, is_speech)
+            if partial and on_partial:
+                on_partial(partial)
+
+        start_frames = max(1, round(self.start_ms / frame_ms))
+        end_frames = max(1, round(self.silence_ms / frame_ms))
+        waited = speech = silence = run = 0
+        audio_bytes = 0
+        started = False
+        for frame in frames:
+            audio_bytes += len(frame)
+            is_speech = self.vad.is_speech(frame)
+            if not started:
+                preroll.append(frame)
+                waited += 1
+                run = run + 1 if is_speech else 0
+                if run >= start_frames:
+                    # Speech started: send it with the audio just before it
+                    started = True
+                    for earlier in preroll:
+                        feed(earlier, True)
+                    speech = run
+                elif waited * frame_ms / 1000 >= self.no_speech_timeout:
+                    break
+                continue
+            feed(frame, is_speech)
+            if is_speech:
+                speech += 1
+                silence = 0
+            else:
+                silence += 1
+                if silence >= end_frames:
+                    break
+            if (speech + silence) * frame_ms / 1000 >= self.max_speech_seconds:
+                break
+        return {'audio_bytes': audio_bytes, 'speech_ms': round(speech * frame_ms) if started else 0}
+
+
+def from_env():
+    """Capture session from the LISTEN_* settings
+
+    LISTEN_WAV reads utterances from a WAV file instead of the microphone;
+    LISTEN_RECOGNIZER picks a backend from RECOGNIZERS.
+    """
+    wav = os.getenv('LISTEN_WAV')
+    recognizer = RECOGNIZERS[os.getenv('LISTEN_RECOGNIZER', 'google')]
+    return CaptureSession(lambda: WavSource(wav) if wav else MicrophoneSource(), recognizer)
+
+
+providers.register('listener', from_env)
+
+
+def get_listener():
+    """The shared capture session, created on first use"""
+    return providers.get('listener')
@@ -0,0 +1,275 @@
+import contextvars
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Structured span logs: unset for none, 'stderr', or a file path to append JSON lines to
+TRACE_LOG = os.getenv('TRACE_LOG')
+# Serve Prometheus-style metrics on this port when set
+METRICS_PORT = os.getenv('METRICS_PORT')
+# Recent durations kept per stage for the percentiles
+WINDOW = 1000
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+logger = logging.getLogger('healthassist.trace')
+logger.propagate = False
+if TRACE_LOG:
+    _handler = logging.StreamHandler(sys.stderr) if TRACE_LOG == 'stderr' else logging.FileHandler(TRACE_LOG)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+
+class Span:
+    """One timed stage or external call, with attributes such as bytes, tokens or cache hits"""
+
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'attributes', 'start', 'duration', 'error')
+
+    def __init__(self, name, parent=None, trace=None, **attributes):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error=None):
+        """Finish the span and record it; only the first call counts"""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.error = repr(error)
+        metrics.record(self.name, self.duration, self.error is not None)
+        if self.trace is not None:
+            self.trace.add(self)
+        if logger.handlers:
+            logger.info(json.dumps(self.to_dict(), ensure_ascii=False, default=str))
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id if self.trace is not None else None,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    """Every span finished while handling one request"""
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self):
+        """One row per span in start order: stage, offset and duration in ms, attributes"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return [{
+            'stage': span.name,
+            'start_ms': round((span.start - self.start) * 1000, 1),
+            'duration_ms': round(span.duration * 1000, 1),
+            'error': span.error or '',
+            'attributes': json.dumps(span.attributes, ensure_ascii=False, default=str),
+        } for span in spans]
+
+    def report(self):
+        """Print the timing breakdown"""
+        print(f"Timing breakdown for {self.name}:")
+        for row in self.breakdown():
+            print(f"  {row['start_ms']:>8.0f}ms +{row['duration_ms']:>7.0f}ms  {row['stage']:<16} "
+                  f"{row['attributes']}{'  ' + row['error'] if row['error'] else ''}")
+
+
+def start_span(name, **attributes):
+    """Begin a span without making it current; call end() on it when done
+
+    For work whose lifetime does not follow a with block, such as a stream
+    consumed by another thread.
+    """
+    return Span(name, _current_span.get(), _current_trace.get(), **attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span"""
+    current = start_span(name, **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Collect every span of one request, including those run on other threads
+    by in_context(); yields the Trace"""
+    collected = Trace(name)
+    token = _current_trace.set(collected)
+    try:
+        with span(name, **attributes):
+            yield collected
+    finally:
+        _current_trace.reset(token)
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def in_context(fn, current=None):
+    """fn bound to a copy of the caller's trace context, to run on another thread
+
+    With current, spans started by fn become children of that span.
+    """
+    context = contextvars.copy_context()
+    if current is not None:
+        context.run(_current_span.set, current)
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def _quantile(ordered, q):
+    """Nearest-rank quantile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class StageMetrics:
+    """Counts, totals and recent durations per stage, for percentiles"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.durations = defaultdict(lambda: deque(maxlen=self.window))
+        self.counts = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, error=False):
+        with self._lock:
+            self.durations[stage].append(seconds)
+            self.counts[stage] += 1
+            self.totals[stage] += seconds
+            if error:
+                self.errors[stage] += 1
+
+    def clear(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.durations.clear()
+            self.counts.clear()
+            self.errors.clear()
+            self.totals.clear()
+
+    def percentiles(self):
+        """{stage: {'count', 'errors', 'p50', 'p95', 'p99'}} with durations in seconds"""
+        with self._lock:
+            stages = {stage: sorted(values) for stage, values in self.durations.items()}
+            counts = dict(self.counts)
+            errors = dict(self.errors)
+        return {stage: {
+            'count': counts[stage],
+            'errors': errors.get(stage, 0),
+            **{f'p{int(q * 100)}': _quantile(ordered, q) for q in self.QUANTILES},
+        } for stage, ordered in sorted(stages.items())}
+
+    def report(self):
+        """Print p50/p95/p99 per stage"""
+        print(f"{'stage':<18} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for stage, row in self.percentiles().items():
+            print(f"{stage:<18} {row['count']:>6} {row['p50'] * 1000:>6.0f}ms "
+                  f"{row['p95'] * 1000:>6.0f}ms {row['p99'] * 1000:>6.0f}ms")
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = ['# TYPE healthassist_stage_seconds summary']
+        percentiles = self.percentiles()
+        with self._lock:
+            totals = dict(self.totals)
+        for stage, row in percentiles.items():
+            for q in self.QUANTILES:
+                lines.append(f'healthassist_stage_seconds{{stage="{stage}",quantile="{q}"}} '
+                             f'{row[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'healthassist_stage_seconds_sum{{stage="{stage}"}} {totals[stage]:.6f}')
+            lines.append(f'healthassist_stage_seconds_count{{stage="{stage}"}} {row["count"]}')
+        lines.append('# TYPE healthassist_stage_errors_total counter')
+        for stage, row in percentiles.items():
+            lines.append(f'healthassist_stage_errors_total{{stage="{stage}"}} {row["errors"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = StageMetrics()
+
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_server(port=None):
+    """Serve /metrics on localhost from a background thread (once per process)
+
+    Uses METRICS_PORT when no port is given; does nothing if neither is set.
+    """
+    global _metrics_server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _metrics_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer(('127.0.0.1', int(port)), MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            print(f"Metrics at http://127.0.0.1:{port}/metrics")
+        return _metrics_server
@@ -0,0 +1,217 @@
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from chunking import chunk_text
+from placeholders import protect_numbers, restore_numbers
+from cache import LRUCache, SQLiteCache, TieredCache, cache_dir
+import providers
+import tracing
+
+# Concurrency, per-chunk timeout (seconds) and retry policy for chunk translation
+MAX_WORKERS = int(os.getenv('TRANSLATION_CONCURRENCY', '4'))
+CHUNK_TIMEOUT = float(os.getenv('TRANSLATION_TIMEOUT', '10'))
+MAX_RETRIES = int(os.getenv('TRANSLATION_RETRIES', '2'))
+RETRY_BACKOFF = float(os.getenv('TRANSLATION_BACKOFF', '0.5'))
+
+
+def open_translation_cache():
+    """Translated chunks in memory and on disk, opened on first use
+
+    Chunks are keyed by direction and the chunk text with numbers already
+    swapped for __NUM_i__ placeholders, so "my LDL is 176" and "my LDL is
+    180" share one entry.
+    """
+    return TieredCache(
+        LRUCache(max_entries=2048),
+        SQLiteCache(os.path.join(cache_dir(), 'translations.sqlite3'),
+                    max_entries=50000, ttl=30 * 24 * 3600),
+    )
+
+
+providers.register('translation_cache', open_translation_cache)
+
+
+class TranslatorBackend:
+    """Interface for the service that translates a single chunk"""
+
+    def translate(self, chunk, from_lang, to_lang):
+        raise NotImplementedError
+
+
+class TranslateBackend(TranslatorBackend):
+    """Backend using the translate package, one Translator per direction"""
+
+    def __init__(self):
+        self._translators = {}
+
+    def translate(self, chunk, from_lang, to_lang):
+        key = (from_lang, to_lang)
+        if key not in self._translators:
+            # Imported on first use; the stub backend never needs it
+            from translate import Translator
+            self._translators[key] = Translator(to_lang=to_lang, from_lang=from_lang)
+        return self._translators[key].translate(chunk)
+
+
+class StubTranslator(TranslatorBackend):
+    """Local stand-in for tests and benchmarks that tags chunks instead of translating
+
+    latency adds a delay per call to mimic a network round trip, varied by
+    up to jitter seconds either way with a seeded generator.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def translate(self, chunk, from_lang, to_lang):
+        self.calls += 1
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+        return f"[{to_lang}] {chunk}"
+
+
+translator_backend = TranslateBackend()
+_executor = None
+# Timed-out calls still running on the pool; their workers are not free for retries
+_abandoned = 0
+_abandoned_lock = threading.Lock()
+
+
+def set_translator_backend(backend):
+    """Swap the chunk translator, e.g. for a StubTranslator in benchmarks"""
+    global translator_backend
+    translator_backend = backend
+
+
+def configure(max_workers=None, chunk_timeout=None, max_retries=None, retry_backoff=None):
+    """Change the concurrency limit, per-chunk timeout or retry policy"""
+    global MAX_WORKERS, CHUNK_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF, _executor
+    if max_workers is not None and max_workers != MAX_WORKERS:
+        MAX_WORKERS = max_workers
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+    if chunk_timeout is not None:
+        CHUNK_TIMEOUT = chunk_timeout
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if retry_backoff is not None:
+        RETRY_BACKOFF = retry_backoff
+
+
+def get_executor():
+    """Shared bounded worker pool for chunk translation"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='translate')
+    return _executor
+
+
+def cache_key(from_lang, to_lang, chunk):
+    """Cache key for a placeholder-normalized chunk"""
+    return f"{from_lang}>{to_lang}:{' '.join(chunk.split())}"
+
+
+def translate_chunk(chunk, from_lang, to_lang):
+    """Translate one chunk, serving repeats from the translation cache"""
+    key = cache_key(from_lang, to_lang, chunk)
+    translation_cache = providers.get('translation_cache')
+    with tracing.span('translate.chunk', chars=len(chunk)) as span:
+        translation = translation_cache.get(key)
+        span.set(cache_hit=translation is not None)
+        if translation is None:
+            translation = translator_backend.translate(chunk, from_lang, to_lang).strip()
+            translation_cache.put(key, translation)
+    return translation
+
+
+def _release(future):
+    global _abandoned
+    with _abandoned_lock:
+        _abandoned -= 1
+
+
+def _abandon(future):
+    """Give up on a timed-out call; one already running keeps its worker until it returns"""
+    global _abandoned
+    if future.cancel():
+        return
+    with _abandoned_lock:
+        _abandoned += 1
+    future.add_done_callback(_release)
+
+
+def _pool_has_room():
+    """Whether at least half the pool's workers are not tied up by abandoned calls"""
+    with _abandoned_lock:
+        return _abandoned * 2 < MAX_WORKERS
+
+
+def _wait_for_chunk(future, chunk, from_lang, to_lang):
+    """Collect one chunk's translation, retrying with backoff on errors or timeouts
+
+    A timed-out call is cancelled, or left to finish if it already started,
+    and is only retried while the pool still has room, so a slow translator
+    cannot fill every worker with abandoned calls.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return future.result(timeout=CHUNK_TIMEOUT)
+        except TimeoutError as e:
+            _abandon(future)
+            error, retry = e, _pool_has_room()
+        except Exception as e:
+            error, retry = e, True
+        if attempt == MAX_RETRIES or not retry:
+            print(f"Translation error: {error!r}")
+            return chunk  # Keep original if translation fails
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        future = get_executor().submit(tracing.in_context(translate_chunk), chunk, from_lang, to_lang)
+
+
+def translate_chunks(chunks, from_lang, to_lang):
+    """Translate chunks concurrently and return the results in order"""
+    executor = get_executor()
+    futures = [executor.submit(tracing.in_context(translate_chunk), chunk, from_lang, to_lang) for chunk in chunks]
+    return [_wait_for_chunk(future, chunk, from_lang, to_lang)
+            for chunk, future in zip(chunks, futures)]
+
+
+def translate_text(text, from_lang, to_lang):
+    """Translate text between languages while preserving numbers"""
+    # Replace numbers (with their ranges and units) by placeholders
+    text, numbers = protect_numbers(text)
+
+    # Pack whole sentences into chunks of up to 400 characters
+    chunks = chunk_text(text, max_chars=400)
+    tracing.annotate(chars=len(text), chunks=len(chunks), direction=f"{from_lang}>{to_lang}")
+
+    # Translate the chunks concurrently, reassembled in their original order
+    translated_chunks = translate_chunks(chunks, from_lang, to_lang)
+
+    # Join translated chunks with proper spacing
+    translation = ' '.join(filter(None, translated_chunks))
+
+    # Restore numbers
+    translation = restore_numbers(translation, numbers)
+
+    # Clean up any double spaces
+    translation = re.sub(r'\s+', ' ', translation)
+
+    return translation.strip()
+
+
+def translate_tamil_to_english(tamil_text):
+    """Translate Tamil text to English while preserving numbers"""
+    return translate_text(tamil_text, 'ta', 'en')
+
+
+def translate_english_to_tamil(english_text):
+    """Translate English text to Tamil while preserving numbers"""
+    return translate_text(english_text, 'en', 'ta')
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from cache import cache_dir
+import providers
+import tracing
+
+VOICE = "Kathiravan - Social Media Voice - Youthful & Pleasant"
+MODEL = "eleven_multilingual_v2"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75
+}
+
+
+def audio_key(text, voice=VOICE, model=MODEL, voice_settings=VOICE_SETTINGS):
+    """Content address of the audio for a text and synthesis settings"""
+    payload = json.dumps([text, voice, model, voice_settings], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Synthesized MP3 files stored by content hash, with a size cap and LRU eviction
+
+    Each entry is one file named after its key. Reading an entry refreshes
+    its modification time, and when the directory grows beyond max_bytes the
+    least recently used files are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(directory)
+                         if entry.name.endswith('.mp3'))
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, key):
+        """Cached audio bytes for key, or None"""
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                audio = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return audio
+
+    def put(self, key, audio):
+        """Store audio bytes under key, evicting old files beyond the size cap"""
+        path = self.path_for(key)
+        # Write to a temporary file first so readers never see a partial MP3
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(audio)
+        with self._lock:
+            if os.path.exists(path):
+                self._size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._size += len(audio)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.mp3')),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Hit/miss counters and bytes on disk"""
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self._size}
+
+
+def open_audio_cache():
+    """The shared audio cache, opened on first use"""
+    return AudioCache(
+        os.path.join(cache_dir(), 'audio'),
+        max_bytes=int(os.getenv('TTS_CACHE_MAX_MB', '200')) * 1024 * 1024,
+    )
+
+
+providers.register('audio_cache', open_audio_cache)
+
+
+def synthesize(client, text, voice=VOICE, model=MODEL, voice_settings=VOICE_SETTINGS):
+    """MP3 bytes for text, synthesized with ElevenLabs only on a cache miss"""
+    key = audio_key(text, voice, model, voice_settings)
+    audio_cache = providers.get('audio_cache')
+    audio = audio_cache.get(key)
+    tracing.annotate(chars=len(text), cache_hit=audio is not None)
+    if audio is None:
+        audio = b"".join(client.generate(
+            text=text,
+            voice=voice,
+            model=model,
+            voice_settings=voice_settings
+        ))
+        audio_cache.put(key, audio)
+    tracing.annotate(bytes=len(audio))
+    return audio
+
+
+def stream_speech(client, text, voice=VOICE, model=MODEL, voice_settings=VOICE_SETTINGS):
+    """Yield MP3 chunks for text as ElevenLabs produces them, caching the result"""
+    key = audio_key(text, voice, model, voice_settings)
+    audio_cache = providers.get('audio_cache')
+    audio = audio_cache.get(key)
+    tracing.annotate(chars=len(text), cache_hit=audio is not None)
+    if audio is not None:
+        tracing.annotate(bytes=len(audio))
+        yield audio
+        return
+    chunks = []
+    for chunk in client.generate(
+        text=text,
+        voice=voice,
+        model=model,
+        voice_settings=voice_settings,
+        stream=True
+    ):
+        chunks.append(chunk)
+        yield chunk
+    audio = b"".join(chunks)
+    tracing.annotate(chunks=len(chunks), bytes=len(audio))
+    audio_cache.put(key, audio)